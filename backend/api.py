@@ -0,0 +1,113 @@
+import gzip
+import hashlib
+import json
+from datetime import date, timedelta
+
+from .reports.consultas import CAMPOS_LISTADO
+
+try:
+    import brotli
+except ImportError:  # opcional: sin el paquete se comprime con gzip
+    brotli = None
+
+# =========================
+# API JSON (v1)
+# =========================
+# Las mismas consultas que las pantallas, pero en JSON compacto para que la
+# PWA actualice datos sin pedir el HTML entero:
+#   - ?campos=id,total elige qué campos viajan (y cuáles se consultan)
+#   - el cuerpo va sin espacios y comprimido (br si el cliente lo acepta y
+#     está instalado el paquete brotli, si no gzip) cuando pasa MIN_COMPRIMIR
+#   - ETag débil (el mismo para cualquier compresión): con If-None-Match
+#     igual se responde 304 sin cuerpo
+
+MIN_COMPRIMIR = 1024
+
+AGRUPACIONES = ("dia", "semana", "mes")
+
+
+class ParametroInvalido(Exception):
+    pass
+
+
+# =========================
+# PARÁMETROS
+# =========================
+def leer_campos(texto, tipo):
+    # "id,total" → ("id", "total"); vacío → todos los campos del tipo
+    disponibles = CAMPOS_LISTADO[tipo]
+    if not texto:
+        return tuple(disponibles)
+    campos = tuple(dict.fromkeys(c.strip() for c in texto.split(",") if c.strip()))
+    desconocidos = [c for c in campos if c not in disponibles]
+    if desconocidos or not campos:
+        raise ParametroInvalido(
+            "campos válidos: " + ", ".join(disponibles)
+        )
+    return campos
+
+
+def leer_fecha(texto, nombre):
+    try:
+        return date.fromisoformat(texto).isoformat()
+    except (TypeError, ValueError):
+        raise ParametroInvalido(f"{nombre} debe ser YYYY-MM-DD")
+
+
+# =========================
+# AGREGADOS
+# =========================
+def clave_periodo(dia, por):
+    # semana = su lunes, como los cierres semanales
+    if por == "mes":
+        return dia[:7]
+    if por == "semana":
+        fecha = date.fromisoformat(dia)
+        return (fecha - timedelta(days=fecha.weekday())).isoformat()
+    return dia
+
+
+def agrupar(por_dia, por):
+    # {dia: (ventas, gastos)} → [{periodo, ventas, gastos, ganancia}] en orden
+    grupos = {}
+    for dia, (ventas, gastos) in por_dia.items():
+        clave = clave_periodo(dia, por)
+        v, g = grupos.get(clave, (0.0, 0.0))
+        grupos[clave] = (v + ventas, g + gastos)
+
+    return [
+        {
+            "periodo": clave,
+            "ventas": round(ventas, 2),
+            "gastos": round(gastos, 2),
+            "ganancia": round(ventas - gastos, 2),
+        }
+        for clave, (ventas, gastos) in sorted(grupos.items())
+    ]
+
+
+# =========================
+# CUERPO, ETAG Y COMPRESIÓN
+# =========================
+def serializar(datos):
+    return json.dumps(datos, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def etag_de(*partes):
+    texto = ":".join(str(p) for p in partes)
+    return hashlib.sha256(texto.encode()).hexdigest()[:32]
+
+
+def etag_cuerpo(cuerpo):
+    return hashlib.sha256(cuerpo).hexdigest()[:32]
+
+
+def comprimir_cuerpo(cuerpo, aceptadas):
+    # (cuerpo, Content-Encoding o None) según Accept-Encoding
+    if len(cuerpo) < MIN_COMPRIMIR:
+        return cuerpo, None
+    if brotli is not None and aceptadas["br"]:
+        return brotli.compress(cuerpo, quality=5), "br"
+    if aceptadas["gzip"]:
+        return gzip.compress(cuerpo, compresslevel=6), "gzip"
+    return cuerpo, None
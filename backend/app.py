@@ -1,17 +1,106 @@
-from flask import Flask, render_template, request, redirect, session, send_file
-import sqlite3
+from flask import (
+    Flask, render_template, request, redirect, session, send_file, send_from_directory, g,
+    stream_with_context,
+)
+import click
+import io
 import os
+import queue
+from concurrent.futures import TimeoutError as FuturoDemorado
 from datetime import datetime, timedelta
+from time import perf_counter
 from .reports.pdf_report import generate_pdf
 from .reports.excel_report import generate_excel
 from werkzeug.security import generate_password_hash, check_password_hash
 from .reports.routes import reports_bp
+from .database import (
+    EscritorAgrupado, EscrituraDemorada, PoolAgotado, PoolConexiones, ProgramadorCheckpoint,
+    aplicar_perfil_wal, en_transaccion,
+)
+from .resumen import crear_resumen_diario, reconstruir_resumen_diario, dashboard_totals
+from .reports.cache import CacheReportes, crear_versiones, version_datos
+from .reports.trabajos import ColaExportaciones, crear_tabla_trabajos, LISTO
+from .busqueda import crear_indices_busqueda
+from .paginacion import leer_pagina
+from .perfil import ConexionPerfilada, PerfilSQL, explicar, muestrear
+from . import metricas
+from .reports.consultas import ReporteConsulta
+from .reports.texto import comprimir, lineas_csv, lineas_ndjson
+from .cierres import (
+    CierreDuplicado, crear_detalle_cierres, periodos_cerrados, registrar_cierre,
+    verificar_cierres
+)
+from .calendario import MES, CacheCalendario, mes_cerrado
+from .importacion import ArchivoInvalido, importar_csv
+from .ventas import (
+    VentaRechazada, aplicar_gasto, aplicar_ticket, aplicar_venta, crear_tabla_tickets,
+)
+from . import api
+from .sincronizacion import (
+    RECHAZADA, OperacionInvalida, aplicar_idempotente, clave_valida, crear_tabla_operaciones,
+    leer_operacion,
+)
 
 # =========================
 # CONFIG
 # =========================
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(BASE_DIR, "database.db")
+DB_PATH = os.environ.get("CONTROL_SIMPLE_DB", os.path.join(BASE_DIR, "database.db"))
+
+# conexiones libres que conserva cada worker, y tope de abiertas a la vez
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 8))
+DB_POOL_MAX = int(os.environ.get("DB_POOL_MAX", 2 * DB_POOL_SIZE))
+DB_POOL_ESPERA = float(os.environ.get("DB_POOL_ESPERA", 10))
+
+# se aplican una vez por conexión, al abrirla
+DB_PRAGMAS = {
+    "busy_timeout": int(os.environ.get("DB_BUSY_TIMEOUT_MS", 5000)),
+    "synchronous": "NORMAL",  # seguro en WAL: solo se arriesga el último commit ante un corte de luz
+    "cache_size": -int(os.environ.get("DB_CACHE_KB", 16384)),  # negativo = KiB
+    "mmap_size": int(os.environ.get("DB_MMAP_BYTES", 128 * 1024 * 1024)),
+    "temp_store": "MEMORY",
+    "wal_autocheckpoint": int(os.environ.get("DB_WAL_AUTOCHECKPOINT", 1000)),  # páginas
+}
+
+# reportes PDF/Excel ya generados
+REPORTES_CACHE_DIR = os.environ.get(
+    "REPORTES_CACHE_DIR", os.path.join(BASE_DIR, "cache_reportes")
+)
+REPORTES_CACHE_MB = int(os.environ.get("REPORTES_CACHE_MB", 256))
+
+# exportaciones en segundo plano
+EXPORT_DIR = os.environ.get("EXPORT_DIR", os.path.join(BASE_DIR, "exportaciones"))
+EXPORT_PROCESOS = int(os.environ.get("EXPORT_PROCESOS", 2))
+EXPORT_MAX_POR_USUARIO = int(os.environ.get("EXPORT_MAX_POR_USUARIO", 2))
+EXPORT_TTL_MINUTOS = int(os.environ.get("EXPORT_TTL_MINUTOS", 60))
+
+# listados paginados (/ventas, /gastos, historial)
+PAGINA_TAMANO = int(os.environ.get("PAGINA_TAMANO", 50))
+PAGINA_MAXIMO = 500
+
+# filas de detalle (ventas / gastos del período) que muestra /reportes; el
+# resto se descarga con los exports
+REPORTES_DETALLE_MAX = int(os.environ.get("REPORTES_DETALLE_MAX", 200))
+
+# operaciones por request al reenviar la cola del modo sin conexión
+SINCRONIZAR_LOTE_MAX = 100
+
+# perfil de SQL: fracción de requests medidos (0 = apagado, 1 = todos)
+SQL_PERFIL_MUESTREO = float(os.environ.get("SQL_PERFIL_MUESTREO", 0.01))
+SQL_LENTA_MS = float(os.environ.get("SQL_LENTA_MS", 200))
+
+# checkpoint del WAL en segundo plano (0 = desactivado)
+WAL_CHECKPOINT_INTERVALO = int(os.environ.get("WAL_CHECKPOINT_INTERVALO", 60))
+WAL_CHECKPOINT_MAX_MB = int(os.environ.get("WAL_CHECKPOINT_MAX_MB", 64))
+
+# escrituras agrupadas (group commit) de ventas y gastos; apagado = cada
+# request hace su propio commit. _MS es la espera extra para llenar un lote
+# (0 = juntar solo lo que ya está en cola mientras se escribía el anterior)
+ESCRITURA_AGRUPADA = os.environ.get("ESCRITURA_AGRUPADA", "0") == "1"
+ESCRITURA_AGRUPADA_MS = float(os.environ.get("ESCRITURA_AGRUPADA_MS", 0))
+ESCRITURA_LOTE_MAX = int(os.environ.get("ESCRITURA_LOTE_MAX", 200))
+# segundos que un request espera el COMMIT de su lote antes de escribir solo
+ESCRITURA_AGRUPADA_ESPERA = float(os.environ.get("ESCRITURA_AGRUPADA_ESPERA", 10))
 
 app = Flask(
     __name__,
@@ -26,117 +115,182 @@ app.register_blueprint(reports_bp)
 # =========================
 # DATABASE
 # =========================
+pool = PoolConexiones(
+    DB_PATH,
+    tamano=DB_POOL_SIZE,
+    maximo=DB_POOL_MAX,
+    espera=DB_POOL_ESPERA,
+    pragmas=DB_PRAGMAS,
+    factory=ConexionPerfilada,
+    al_conectar=metricas.instrumentar_conexion,
+    al_obtener=metricas.contar_conexion,
+)
+checkpoint = ProgramadorCheckpoint(
+    pool,
+    intervalo=WAL_CHECKPOINT_INTERVALO,
+    max_bytes=WAL_CHECKPOINT_MAX_MB * 1024 * 1024,
+)
+cache_calendario = CacheCalendario()
+cache_reportes = CacheReportes(
+    REPORTES_CACHE_DIR, max_bytes=REPORTES_CACHE_MB * 1024 * 1024
+)
+cola_exportaciones = ColaExportaciones(
+    pool,
+    EXPORT_DIR,
+    procesos=EXPORT_PROCESOS,
+    max_por_usuario=EXPORT_MAX_POR_USUARIO,
+    ttl_minutos=EXPORT_TTL_MINUTOS,
+)
+# los archivos vencidos se borran aunque nadie pida otra exportación
+checkpoint.tareas.append(cola_exportaciones.limpiar_vencidos)
+escritor = EscritorAgrupado(
+    pool,
+    intervalo_ms=ESCRITURA_AGRUPADA_MS,
+    max_operaciones=ESCRITURA_LOTE_MAX,
+    al_confirmar=metricas.medir_lote,
+)
+
+
 def conectar():
-    return sqlite3.connect(DB_PATH)
+    # una conexión por request: los helpers anidados reutilizan la misma
+    if "db" not in g:
+        g.db = pool.obtener()
+        g.db.perfil = g.get("perfil_sql")
+    return g.db
 
-def buscar_historial(desde=None, hasta=None, producto=None, usuario=None):
-    conn = conectar()
-    cursor = conn.cursor()
 
-    query = """
-        SELECT v.fecha, p.nombre, v.cantidad, v.total, u.nombre
-        FROM ventas v
-        JOIN productos p ON p.id = v.producto_id
-        JOIN usuarios u ON u.id = v.usuario_id
-        WHERE 1=1
-    """
-    params = []
+@app.before_request
+def iniciar_checkpoint():
+    checkpoint.iniciar()
 
-    if desde and hasta:
-        query += " AND date(v.fecha) BETWEEN ? AND ?"
-        params.extend([desde, hasta])
 
-    if producto:
-        query += " AND p.nombre LIKE ?"
-        params.append(f"%{producto}%")
+@app.before_request
+def iniciar_escritor():
+    if ESCRITURA_AGRUPADA:
+        escritor.iniciar()
 
-    if usuario:
-        query += " AND u.nombre LIKE ?"
-        params.append(f"%{usuario}%")
 
-    query += " ORDER BY v.fecha DESC"
+@app.before_request
+def iniciar_cronometro():
+    g.inicio_request = perf_counter()
 
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
-    conn.close()
 
-    return [
-        {
-            "fecha": r[0],
-            "producto": r[1],
-            "cantidad": r[2],
-            "total": r[3],
-            "usuario": r[4]
-        }
-        for r in rows
-    ]
+@app.after_request
+def medir_request(response):
+    inicio = g.get("inicio_request")
+    if inicio is not None:
+        metricas.LATENCIA_REQUEST.labels(
+            request.endpoint or "sin_endpoint",
+            request.method,
+            response.status_code
+        ).observe(perf_counter() - inicio)
+    return response
 
 
-def get_report_data(desde, hasta):
-    conn = conectar()
-    cursor = conn.cursor()
+@app.before_request
+def iniciar_perfil_sql():
+    if muestrear(SQL_PERFIL_MUESTREO):
+        g.perfil_sql = PerfilSQL()
 
-    cursor.execute("""
-        SELECT IFNULL(SUM(total), 0)
-        FROM ventas
-        WHERE date(fecha) BETWEEN ? AND ?
-    """, (desde, hasta))
-    ventas_total = float(cursor.fetchone()[0])
 
-    cursor.execute("""
-        SELECT IFNULL(SUM(monto), 0)
-        FROM gastos
-        WHERE date(fecha) BETWEEN ? AND ?
-    """, (desde, hasta))
-    gastos_total = float(cursor.fetchone()[0])
+@app.after_request
+def reportar_perfil_sql(response):
+    perfil = g.get("perfil_sql")
+    if perfil is None:
+        return response
 
-    cursor.execute("""
-        SELECT p.nombre, v.cantidad, v.total, v.fecha, u.nombre
-        FROM ventas v
-        JOIN productos p ON p.id = v.producto_id
-        JOIN usuarios u ON u.id = v.usuario_id
-        WHERE date(v.fecha) BETWEEN ? AND ?
-        ORDER BY v.fecha DESC
-    """, (desde, hasta))
-    ventas_rows = cursor.fetchall()
+    response.headers["Server-Timing"] = perfil.server_timing()
 
-    cursor.execute("""
-        SELECT g.descripcion, g.monto, g.fecha, u.nombre
-        FROM gastos g
-        JOIN usuarios u ON u.id = g.usuario_id
-        WHERE date(g.fecha) BETWEEN ? AND ?
-        ORDER BY g.fecha DESC
-    """, (desde, hasta))
-    gastos_rows = cursor.fetchall()
+    conn = g.get("db")
+    for registro in perfil.lentas(SQL_LENTA_MS / 1000):
+        app.logger.warning(
+            "SQL lenta en %s: %.1f ms, %d filas\n%s\nplan: %s",
+            request.endpoint,
+            registro["segundos"] * 1000,
+            registro["filas"],
+            registro["sql"].strip(),
+            " | ".join(explicar(conn, registro)) if conn is not None else "-"
+        )
+    return response
+
+
+@app.teardown_appcontext
+def liberar_conexion(error):
+    conn = g.pop("db", None)
+    if conn is not None:
+        conn.perfil = None
+        pool.devolver(conn, descartar=error is not None)
+
+
+@app.errorhandler(PoolAgotado)
+@app.errorhandler(EscrituraDemorada)
+def pool_agotado(error):
+    # todas las conexiones prestadas más de DB_POOL_ESPERA, o un lote de
+    # escritura trabado: mejor cortar que encolar sin fin
+    app.logger.warning("pool agotado en %s: %s", request.endpoint, error)
+    return "Servidor ocupado, probá de nuevo en unos segundos", 503, {"Retry-After": "2"}
+
+def escribir(aplicar, *args):
+    # con el escritor agrupado activo la operación viaja en el próximo lote y
+    # se espera su COMMIT; si no (desactivado, cola llena, el hilo no la tomó
+    # a tiempo) va sincrónica en una transacción propia sobre la conexión del
+    # request
+    if escritor.activo:
+        try:
+            futuro = escritor.enviar(aplicar, *args)
+        except queue.Full:
+            pass
+        else:
+            try:
+                return futuro.result(timeout=ESCRITURA_AGRUPADA_ESPERA)
+            except FuturoDemorado:
+                # ya está dentro de un lote: no se puede escribir de nuevo
+                # sin duplicarla, solo esperar otro poco a que termine
+                if not futuro.cancel():
+                    try:
+                        return futuro.result(timeout=ESCRITURA_AGRUPADA_ESPERA)
+                    except FuturoDemorado:
+                        raise EscrituraDemorada("el lote de escritura no terminó a tiempo")
+    return en_transaccion(conectar(), aplicar, *args)
+
+
+def escribir_operacion(tipo, aplicar, *args):
+    # con Idempotency-Key (la pone el service worker) un reintento devuelve el
+    # resultado del primer envío en vez de escribir otra vez
+    clave = request.headers.get("Idempotency-Key")
+    if not clave_valida(clave):
+        return escribir(aplicar, *args)
+
+    resultado = escribir(
+        aplicar_idempotente, clave, tipo, session.get("usuario_id"), aplicar, *args
+    )
+    if resultado.estado == RECHAZADA:
+        raise VentaRechazada(resultado.respuesta["error"])
+    return resultado.respuesta["resultado"]
+
+
+def buscar_historial(desde=None, hasta=None, producto=None, usuario=None,
+                     antes=None, despues=None, tamano=None):
+    return ReporteConsulta(conectar(), desde, hasta).historial(
+        producto=producto,
+        usuario=usuario,
+        antes=antes,
+        despues=despues,
+        tamano=tamano or tamano_pagina()
+    )
 
-    conn.close()
 
-    return {
-    "desde": desde,
-    "hasta": hasta,
-    "ventas": ventas_total,
-    "gastos": gastos_total,
-    "ganancia": ventas_total - gastos_total,
-    "ventas_detalle": [
-        {
-            "producto": r[0],
-            "cantidad": r[1],
-            "total": r[2],
-            "fecha": r[3],
-            "usuario": r[4],
-        }
-        for r in ventas_rows
-    ],
-    "gastos_detalle": [
-        {
-            "descripcion": r[0],
-            "monto": r[1],
-            "fecha": r[2],
-            "usuario": r[3],
-        }
-        for r in gastos_rows
-    ]
-}
+def tamano_pagina():
+    # ?por_pagina=N en la URL, acotado; si no, el valor de configuración
+    try:
+        tamano = int(request.args.get("por_pagina", PAGINA_TAMANO))
+    except ValueError:
+        tamano = PAGINA_TAMANO
+    return max(1, min(tamano, PAGINA_MAXIMO))
+
+
+def get_report_data(desde, hasta):
+    return ReporteConsulta(conectar(), desde, hasta).como_dict()
 
 def requiere_login():
     return "usuario_id" in session
@@ -162,26 +316,17 @@ def requiere_operadora():
         return False
     return True
 
-def esta_en_semana_cerrada(fecha_str):
-    conn = conectar()
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        SELECT COUNT(*)
-        FROM cierres_semanales
-        WHERE date(?) BETWEEN fecha_inicio AND fecha_fin
-    """, (fecha_str,))
-
-    cerrado = cursor.fetchone()[0] > 0
-    conn.close()
-
-    return cerrado
+def esta_en_semana_cerrada(fecha_str, conn=None):
+    return periodos_cerrados.cerrada(conn or conectar(), fecha_str)
 
 
 def crear_tablas():
     conn = conectar()
     cursor = conn.cursor()
 
+    # lectores (reportes, calendario) ya no se bloquean con cada venta
+    aplicar_perfil_wal(conn)
+
     # PRODUCTOS
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS productos (
@@ -221,12 +366,59 @@ def crear_tablas():
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         nombre TEXT NOT NULL,
         rol TEXT NOT NULL CHECK (rol IN ('dueno','operadora')),
-        activo INTEGER NOT NULL DEFAULT 1
+        activo INTEGER NOT NULL DEFAULT 1,
+        password_hash TEXT
     )
     """)
 
+    # CIERRES SEMANALES
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS cierres_semanales (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        fecha_inicio TEXT NOT NULL,
+        fecha_fin TEXT NOT NULL,
+        total_ventas REAL NOT NULL,
+        total_gastos REAL NOT NULL,
+        ganancia REAL NOT NULL,
+        cerrado_por INTEGER NOT NULL,
+        fecha_cierre TEXT NOT NULL
+    )
+    """)
+
+    # ÍNDICES DE FECHA
+    # fecha se guarda como texto ISO ('YYYY-MM-DD[ HH:MM]'), así que los
+    # filtros por rango se escriben como fecha >= desde AND fecha < hasta+1
+    # (sin envolver la columna en date()) y pueden usar estos índices
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ventas_fecha ON ventas (fecha)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_gastos_fecha ON gastos (fecha)")
+
+    # ÍNDICES POR PRODUCTO / USUARIO (búsqueda en el historial)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ventas_producto ON ventas (producto_id, fecha)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ventas_usuario ON ventas (usuario_id, fecha)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_gastos_usuario ON gastos (usuario_id)")
+
     conn.commit()
-    conn.close()
+
+    # RESUMEN DIARIO (tablas + triggers)
+    crear_resumen_diario(conn)
+
+    # VERSIÓN DE DATOS POR DÍA (cache de reportes)
+    crear_versiones(conn)
+
+    # EXPORTACIONES EN SEGUNDO PLANO
+    crear_tabla_trabajos(conn)
+
+    # TICKETS (ventas de varias líneas)
+    crear_tabla_tickets(conn)
+
+    # DESGLOSE CONGELADO DE LOS CIERRES SEMANALES
+    crear_detalle_cierres(conn)
+
+    # BÚSQUEDA POR NOMBRE (FTS5 trigram)
+    crear_indices_busqueda(conn)
+
+    # CLAVES DE IDEMPOTENCIA (cola del modo sin conexión)
+    crear_tabla_operaciones(conn)
 
 
 def crear_dueno_si_no_existe():
@@ -244,11 +436,60 @@ def crear_dueno_si_no_existe():
         """, ("admin", "dueno", password))
 
     conn.commit()
-    conn.close()
 
 
-crear_tablas()
-crear_dueno_si_no_existe()
+with app.app_context():
+    crear_tablas()
+    crear_dueno_si_no_existe()
+
+
+@app.cli.command("reconstruir-resumen")
+def reconstruir_resumen():
+    # flask --app backend.app reconstruir-resumen
+    reconstruir_resumen_diario(conectar())
+    click.echo("resumen_diario reconstruido")
+
+@app.cli.command("verificar-cierres")
+def verificar_cierres_cli():
+    # flask --app backend.app verificar-cierres
+    diferencias = verificar_cierres(conectar())
+    for cierre_id, que, guardado, real in diferencias:
+        click.echo(f"cierre {cierre_id}: {que} guardado={guardado} real={real}")
+    if diferencias:
+        raise click.ClickException(f"{len(diferencias)} diferencias")
+    click.echo("cierres consistentes con ventas y gastos")
+
+
+@app.cli.command("importar")
+@click.argument("tipo", type=click.Choice(["productos", "ventas", "gastos"]))
+@click.argument("archivo", type=click.Path(exists=True, dir_okay=False))
+@click.option("--usuario", default="admin", help="usuario al que se asignan las filas sin usuario")
+@click.option("--lote", default=5000, help="filas por transacción")
+@click.option("--diferir", is_flag=True, help="quitar índices y triggers durante la carga (app detenida)")
+def importar(tipo, archivo, usuario, lote, diferir):
+    # flask --app backend.app importar ventas historial.csv
+    conn = conectar()
+    fila = conn.execute("SELECT id FROM usuarios WHERE nombre = ?", (usuario,)).fetchone()
+    if fila is None:
+        raise click.ClickException(f"no existe el usuario {usuario}")
+
+    def avanzar(leidas, insertadas, errores):
+        click.echo(f"\r{leidas} filas leídas, {insertadas} insertadas, {errores} con error", nl=False)
+
+    with open(archivo, encoding="utf-8-sig", newline="") as f:
+        try:
+            resultado = importar_csv(
+                conn, tipo, f, fila[0], tamano_lote=lote, al_avanzar=avanzar,
+                diferir=diferir, periodos=periodos_cerrados
+            )
+        except ArchivoInvalido as e:
+            raise click.ClickException(str(e))
+
+    click.echo()
+    for linea, mensaje in resultado.errores:
+        click.echo(f"línea {linea}: {mensaje}")
+    if resultado.cantidad_errores > len(resultado.errores):
+        click.echo(f"... y {resultado.cantidad_errores - len(resultado.errores)} errores más")
 
 # =========================
 # LOGIN
@@ -265,7 +506,6 @@ def login():
         )
 
         user = cursor.fetchone()
-        conn.close()
 
         if user and check_password_hash(
             user[2],
@@ -287,6 +527,59 @@ def logout():
     session.clear()
     return redirect("/login")
 
+# =========================
+# MODO SIN CONEXIÓN
+# =========================
+@app.route("/sw.js")
+def service_worker():
+    # desde la raíz para que su alcance sea todo el sitio; siempre revalidado
+    respuesta = send_from_directory(app.static_folder, "sw.js", max_age=0)
+    respuesta.headers["Cache-Control"] = "no-cache"
+    return respuesta
+
+
+@app.route("/sincronizar", methods=["POST"])
+def sincronizar():
+    # la cola de IndexedDB reenviada por el service worker, en lotes:
+    # {"operaciones": [{"clave", "tipo", "fecha", "datos"}, ...]}
+    if not requiere_operadora():
+        return {"error": "sesión vencida"}, 401
+
+    datos = request.get_json(silent=True)
+    operaciones = datos.get("operaciones") if isinstance(datos, dict) else None
+    if not isinstance(operaciones, list):
+        return {"error": "falta la lista de operaciones"}, 400
+    if len(operaciones) > SINCRONIZAR_LOTE_MAX:
+        return {"error": f"a lo sumo {SINCRONIZAR_LOTE_MAX} operaciones por envío"}, 413
+
+    usuario_id = session.get("usuario_id")
+    ahora = datetime.now()
+    resultados = []
+
+    # cada operación se confirma por separado: si el lote se corta a la mitad,
+    # el reenvío completo encuentra las ya hechas por su clave
+    for operacion in operaciones:
+        clave = operacion.get("clave") if isinstance(operacion, dict) else None
+        try:
+            clave, tipo, fecha, aplicar, args = leer_operacion(operacion, usuario_id, ahora)
+        except OperacionInvalida as e:
+            resultados.append({"clave": clave, "estado": "invalida", "error": str(e)})
+            continue
+
+        # una semana cerrada la rechaza aplicar_* (queda guardado como
+        # cualquier rechazo); una clave aplicada antes del cierre sigue
+        # respondiendo su resultado original
+        resultado = escribir(aplicar_idempotente, clave, tipo, usuario_id, aplicar, *args)
+        resultados.append({
+            "clave": clave,
+            "estado": resultado.estado,
+            "repetida": resultado.repetida,
+            **resultado.respuesta,
+        })
+
+    return {"resultados": resultados}
+
+
 # =========================
 # HOME
 # =========================
@@ -295,75 +588,19 @@ def home():
     if "negocio" not in session:
         return redirect("/login")
 
-    conn = conectar()
-    cursor = conn.cursor()
-
-    cursor.execute("SELECT IFNULL(SUM(total),0) FROM ventas")
-    total_ventas = cursor.fetchone()[0]
-
-    cursor.execute("SELECT IFNULL(SUM(monto),0) FROM gastos")
-    total_gastos = cursor.fetchone()[0]
-
-    # HOY
-    cursor.execute("""
-        SELECT IFNULL(SUM(total), 0)
-        FROM ventas
-        WHERE date(fecha) = date('now')
-    """)
-    ventas_hoy = cursor.fetchone()[0]
-
-    cursor.execute("""
-        SELECT IFNULL(SUM(monto), 0)
-        FROM gastos
-        WHERE date(fecha) = date('now')
-    """)
-    gastos_hoy = cursor.fetchone()[0]
-
-    # SEMANA (últimos 7 días)
-    cursor.execute("""
-        SELECT IFNULL(SUM(total), 0)
-        FROM ventas
-        WHERE date(fecha) >= date('now', '-7 day')
-    """)
-    ventas_semana = cursor.fetchone()[0]
-
-    cursor.execute("""
-        SELECT IFNULL(SUM(monto), 0)
-        FROM gastos
-        WHERE date(fecha) >= date('now', '-7 day')
-    """)
-    gastos_semana = cursor.fetchone()[0]
-
-    # MES (últimos 30 días)
-    cursor.execute("""
-        SELECT IFNULL(SUM(total), 0)
-        FROM ventas
-        WHERE date(fecha) >= date('now', '-30 day')
-    """)
-    ventas_mes = cursor.fetchone()[0]
-
-    cursor.execute("""
-        SELECT IFNULL(SUM(monto), 0)
-        FROM gastos
-        WHERE date(fecha) >= date('now', '-30 day')
-    """)
-    gastos_mes = cursor.fetchone()[0]
-
-    conn.close()
-    ganancia = total_ventas - total_gastos
-
+    totales = dashboard_totals(conectar())
 
     return render_template(
     "index.html",
-    total_ventas=total_ventas,
-    total_gastos=total_gastos,
-    ganancia=ganancia,
-    ventas_hoy=ventas_hoy,
-    gastos_hoy=gastos_hoy,
-    ventas_semana=ventas_semana,
-    gastos_semana=gastos_semana,
-    ventas_mes=ventas_mes,
-    gastos_mes=gastos_mes
+    total_ventas=totales.ventas,
+    total_gastos=totales.gastos,
+    ganancia=totales.ganancia,
+    ventas_hoy=totales.ventas_hoy,
+    gastos_hoy=totales.gastos_hoy,
+    ventas_semana=totales.ventas_semana,
+    gastos_semana=totales.gastos_semana,
+    ventas_mes=totales.ventas_mes,
+    gastos_mes=totales.gastos_mes
 )
 
 # =========================
@@ -390,7 +627,6 @@ def productos():
 
     cursor.execute("SELECT id, nombre, precio, stock FROM productos")
     productos = cursor.fetchall()
-    conn.close()
 
     return render_template("productos.html", productos=productos)
 
@@ -403,7 +639,6 @@ def eliminar_producto(id):
     cursor = conn.cursor()
     cursor.execute("DELETE FROM productos WHERE id = ?", (id,))
     conn.commit()
-    conn.close()
     return redirect("/productos")
 
 @app.route("/productos/editar/<int:id>", methods=["GET", "POST"])
@@ -424,12 +659,10 @@ def editar_producto(id):
             id
         ))
         conn.commit()
-        conn.close()
         return redirect("/productos")
 
     cursor.execute("SELECT * FROM productos WHERE id = ?", (id,))
     producto = cursor.fetchone()
-    conn.close()
     return render_template("editar_producto.html", producto=producto)
 
 # =========================
@@ -446,76 +679,105 @@ def nueva_venta():
     conn = conectar()
     cursor = conn.cursor()
 
+    error = None
     if request.method == "POST":
         producto_id = int(request.form["producto_id"])
         cantidad = int(request.form["cantidad"])
-
-        # Obtener precio del producto
-        cursor.execute(
-            "SELECT precio FROM productos WHERE id = ?",
-            (producto_id,)
-        )
-        precio = cursor.fetchone()[0]
-
-        total = precio * cantidad
         fecha = datetime.now().strftime("%Y-%m-%d %H:%M")
 
-        cursor.execute(
-            """
-            INSERT INTO ventas (producto_id, cantidad, total, fecha, usuario_id)
-            VALUES (?, ?, ?, ?, ?)
-            """,
-            (
-                producto_id,
-                cantidad,
-                total,
-                fecha,
-                session.get("usuario_id")
+        # precio, total y descuento de stock en una sola transacción
+        try:
+            escribir_operacion(
+                "venta", aplicar_venta, producto_id, cantidad, session.get("usuario_id"), fecha
             )
-        )
+        except VentaRechazada as e:
+            error = str(e)
+        else:
+            return redirect("/ventas")
 
+    # GET (o venta rechazada) → mostrar formulario
+    cursor.execute("SELECT id, nombre FROM productos")
+    productos = cursor.fetchall()
 
-        conn.commit()
-        conn.close()
+    return render_template(
+        "venta.html", productos=productos, error=error
+    ), 409 if error else 200
+
+
+def leer_lineas_ticket():
+    # JSON: {"lineas": [{"producto_id": 1, "cantidad": 2}, ...]}
+    # form: campos producto_id / cantidad repetidos, uno por línea
+    datos = request.get_json(silent=True)
+    if datos is not None:
+        return [
+            (int(l["producto_id"]), int(l["cantidad"]))
+            for l in datos.get("lineas", [])
+        ]
+    return [
+        (int(p), int(c))
+        for p, c in zip(request.form.getlist("producto_id"), request.form.getlist("cantidad"))
+        if p and c
+    ]
 
-        return redirect("/ventas")
 
-    # GET → mostrar formulario
-    cursor.execute("SELECT id, nombre FROM productos")
-    productos = cursor.fetchall()
-    conn.close()
+@app.route("/ventas/ticket", methods=["GET", "POST"])
+def nuevo_ticket():
+    if not requiere_operadora():
+        return redirect("/login")
 
-    return render_template("venta.html", productos=productos)
+    conn = conectar()
+    error, estado = None, 200
+
+    if request.method == "POST":
+        fecha = datetime.now().strftime("%Y-%m-%d %H:%M")
+        try:
+            ticket_id, total = escribir_operacion(
+                "ticket", aplicar_ticket, leer_lineas_ticket(), session.get("usuario_id"), fecha
+            )
+        except (KeyError, TypeError, ValueError, AttributeError):
+            error, estado = "líneas inválidas", 400
+        except VentaRechazada as e:
+            error, estado = str(e), 409
+        else:
+            if request.is_json:
+                return {"ticket_id": ticket_id, "total": total}, 201
+            return redirect("/ventas")
+
+        if request.is_json:
+            return {"error": error}, estado
+
+    productos = conn.execute("SELECT id, nombre, precio FROM productos").fetchall()
+
+    return render_template("ticket.html", productos=productos, error=error), estado
 
 
 @app.route("/ventas")
 def ventas():
     if not requiere_operadora():
         return redirect("/login")
-    conn = conectar()
-    cursor = conn.cursor()
-    if session.get("rol") == "dueno":
-        cursor.execute("""
-            SELECT v.id, p.nombre, v.cantidad, v.total, v.fecha, u.nombre
-            FROM ventas v
-            JOIN productos p ON p.id = v.producto_id
-            JOIN usuarios u ON u.id = v.usuario_id
-            ORDER BY v.id DESC
-        """)
-    else:
-        cursor.execute("""
+    condiciones, params = [], []
+    if session.get("rol") != "dueno":
+        condiciones.append("v.usuario_id = ?")
+        params.append(session.get("usuario_id"))
+
+    pagina = leer_pagina(
+        conectar(),
+        """
             SELECT v.id, p.nombre, v.cantidad, v.total, v.fecha, u.nombre
             FROM ventas v
             JOIN productos p ON p.id = v.producto_id
             JOIN usuarios u ON u.id = v.usuario_id
-            WHERE v.usuario_id = ?
-            ORDER BY v.id DESC
-        """, (session.get("usuario_id"),))
-
-    ventas = cursor.fetchall()
-    conn.close()
+        """,
+        condiciones,
+        params,
+        claves=("v.id",),
+        posiciones=(0,),
+        antes=request.args.get("antes"),
+        despues=request.args.get("despues"),
+        tamano=tamano_pagina()
+    )
 
-    return render_template("ventas.html", ventas=ventas)
+    return render_template("ventas.html", ventas=pagina.filas, pagina=pagina)
 
 # =========================
 # GASTOS
@@ -524,58 +786,52 @@ def ventas():
 def nuevo_gasto():
     if not requiere_operadora():
         return redirect("/login")
+    error, estado = None, 200
     if request.method == "POST":
-        conn = conectar()
-        cursor = conn.cursor()
         descripcion = request.form.get("descripcion")
-        monto = float(request.form.get("monto"))
         fecha = datetime.now().strftime("%Y-%m-%d")
 
-        cursor.execute(
-            """
-            INSERT INTO gastos (descripcion, monto, fecha, usuario_id)
-            VALUES (?, ?, ?, ?)
-            """,
-            (
-                descripcion,
-                monto,
-                fecha,
+        try:
+            escribir_operacion(
+                "gasto", aplicar_gasto, descripcion, float(request.form.get("monto")), fecha,
                 session.get("usuario_id")
             )
-        )
+        except (TypeError, ValueError):
+            error, estado = "monto inválido", 400
+        except VentaRechazada as e:
+            # p. ej. la misma Idempotency-Key ya se había rechazado
+            error, estado = str(e), 409
+        else:
+            return redirect("/gastos")
 
-        conn.commit()
-        conn.close()
-        return redirect("/gastos")
-
-    return render_template("gasto.html")
+    return render_template("gasto.html", error=error), estado
 
 @app.route("/gastos")
 def gastos():
     if not requiere_operadora():
         return redirect("/login")
-    conn = conectar()
-    cursor = conn.cursor()
-    if session.get("rol") == "dueno":
-        cursor.execute("""
-            SELECT g.id, g.descripcion, g.monto, g.fecha, u.nombre
-            FROM gastos g
-            JOIN usuarios u ON u.id = g.usuario_id
-            ORDER BY g.id DESC
-        """)
-    else:
-        cursor.execute("""
+    condiciones, params = [], []
+    if session.get("rol") != "dueno":
+        condiciones.append("g.usuario_id = ?")
+        params.append(session.get("usuario_id"))
+
+    pagina = leer_pagina(
+        conectar(),
+        """
             SELECT g.id, g.descripcion, g.monto, g.fecha, u.nombre
             FROM gastos g
             JOIN usuarios u ON u.id = g.usuario_id
-            WHERE g.usuario_id = ?
-            ORDER BY g.id DESC
-        """, (session.get("usuario_id"),))
-
-    gastos = cursor.fetchall()
-    conn.close()
+        """,
+        condiciones,
+        params,
+        claves=("g.id",),
+        posiciones=(0,),
+        antes=request.args.get("antes"),
+        despues=request.args.get("despues"),
+        tamano=tamano_pagina()
+    )
 
-    return render_template("gastos.html", gastos=gastos)
+    return render_template("gastos.html", gastos=pagina.filas, pagina=pagina)
 
 # =========================
 # ELIMINAR VENTA (SOLO DUEÑO)
@@ -591,31 +847,17 @@ def eliminar_venta(id):
     venta = cursor.fetchone()
 
     if not venta:
-        conn.close()
         return redirect("/ventas")
 
     fecha_venta = venta[0]  # YYYY-MM-DD HH:MM
 
-    # obtener último cierre semanal
-    cursor.execute("""
-        SELECT fecha_cierre
-        FROM cierres_semanales
-        ORDER BY fecha_cierre DESC
-        LIMIT 1
-    """)
-    ultimo_cierre = cursor.fetchone()
-
-    # 🔒 si existe un cierre y la venta es anterior o igual → NO borrar
-    if ultimo_cierre:
-        fecha_ultimo_cierre = ultimo_cierre[0]
-        if fecha_venta <= fecha_ultimo_cierre:
-            conn.close()
-            return redirect("/ventas")
+    # 🔒 si la venta cae en una semana cerrada → NO borrar
+    if esta_en_semana_cerrada(fecha_venta, conn):
+        return redirect("/ventas")
 
     # 🧹 borrar venta
     cursor.execute("DELETE FROM ventas WHERE id = ?", (id,))
     conn.commit()
-    conn.close()
 
     return redirect("/ventas")
 
@@ -631,13 +873,11 @@ def eliminar_gasto(id):
     cursor.execute("SELECT fecha FROM gastos WHERE id = ?", (id,))
     fila = cursor.fetchone()
 
-    if fila and esta_en_semana_cerrada(fila[0]):
-        conn.close()
+    if fila and esta_en_semana_cerrada(fila[0], conn):
         return redirect("/gastos")
 
     cursor.execute("DELETE FROM gastos WHERE id = ?", (id,))
     conn.commit()
-    conn.close()
     return redirect("/gastos")
 
 # =========================
@@ -648,50 +888,26 @@ def eliminar_gasto(id):
 def cerrar_semana():
     hoy = datetime.now()
 
-    # lunes de la semana actual
-    inicio_semana = hoy - timedelta(days=hoy.weekday())
+    # lunes de la semana pasada: solo se cierran semanas terminadas, si no
+    # el resto de la semana en curso quedaría rechazando ventas y gastos
+    inicio_semana = hoy - timedelta(days=hoy.weekday() + 7)
     fin_semana = inicio_semana + timedelta(days=6)
 
     inicio = inicio_semana.strftime("%Y-%m-%d")
     fin = fin_semana.strftime("%Y-%m-%d")
 
-    conn = conectar()
-    cursor = conn.cursor()
-
-    # total ventas de la semana
-    cursor.execute("""
-        SELECT IFNULL(SUM(total), 0)
-        FROM ventas
-        WHERE date(fecha) BETWEEN ? AND ?
-    """, (inicio, fin))
-    total_ventas = cursor.fetchone()[0]
-
-    # total gastos de la semana
-    cursor.execute("""
-        SELECT IFNULL(SUM(monto), 0)
-        FROM gastos
-        WHERE date(fecha) BETWEEN ? AND ?
-    """, (inicio, fin))
-    total_gastos = cursor.fetchone()[0]
-
-    ganancia = total_ventas - total_gastos
-
-    cursor.execute("""
-        INSERT INTO cierres_semanales
-        (fecha_inicio, fecha_fin, total_ventas, total_gastos, ganancia, cerrado_por, fecha_cierre)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, (
-        inicio,
-        fin,
-        total_ventas,
-        total_gastos,
-        ganancia,
-        session.get("usuario_id"),
-        datetime.now().strftime("%Y-%m-%d %H:%M")
-    ))
-
-    conn.commit()
-    conn.close()
+    # totales + desglose por día y producto, congelados en una transacción
+    try:
+        registrar_cierre(
+            conectar(),
+            inicio,
+            fin,
+            session.get("usuario_id"),
+            hoy.strftime("%Y-%m-%d %H:%M")
+        )
+    except CierreDuplicado as e:
+        return {"error": str(e)}, 409
+    periodos_cerrados.invalidar()
 
     return redirect("/")
 
@@ -704,8 +920,6 @@ from flask import request
 @app.route("/reportes", methods=["GET", "POST"])
 @solo_dueno
 def reportes():
-    conn = conectar()
-    cursor = conn.cursor()
     # 🔑 valores por defecto (SIEMPRE definidos)
     from datetime import date
     hoy = date.today().strftime("%Y-%m-%d")
@@ -736,9 +950,9 @@ def reportes():
         hasta = hoy
 
     else:
-        # filtro manual
-        desde = request.form.get("desde")
-        hasta = request.form.get("hasta")
+        # filtro manual (en GET se conservan los valores de la URL)
+        desde = request.form.get("desde", desde)
+        hasta = request.form.get("hasta", hasta)
 
         if not desde or not hasta:
             desde = hasta = hoy
@@ -749,186 +963,461 @@ def reportes():
     if isinstance(hasta, date):
         hasta = hasta.strftime("%Y-%m-%d")
 
-    # 3️⃣ Totales de ventas
-    cursor.execute("""
-        SELECT IFNULL(SUM(total), 0)
-        FROM ventas
-        WHERE date(fecha) BETWEEN ? AND ?
-    """, (desde, hasta))
-    ventas_total = float(cursor.fetchone()[0])
-
-    # 4️⃣ Totales de gastos
-    cursor.execute("""
-        SELECT IFNULL(SUM(monto), 0)
-        FROM gastos
-        WHERE date(fecha) BETWEEN ? AND ?
-    """, (desde, hasta))
-    gastos_total = float(cursor.fetchone()[0])
-
-    ganancia = ventas_total - gastos_total
-
-    cursor.execute("""
-        SELECT p.nombre, v.cantidad, v.total, v.fecha, u.nombre
-        FROM ventas v
-        JOIN productos p ON p.id = v.producto_id
-        JOIN usuarios u ON u.id = v.usuario_id
-        WHERE date(v.fecha) BETWEEN ? AND ?
-        ORDER BY v.fecha DESC
-    """, (desde, hasta))
-
-    ventas = cursor.fetchall()
-
-    ventas = [
-        {
-            "producto": r[0],
-            "cantidad": r[1],
-            "total": r[2],
-            "fecha": r[3],
-            "usuario": r[4]
-        }
-        for r in cursor.fetchall()
-    ]
-
-    cursor.execute("""
-        SELECT g.descripcion, g.monto, g.fecha, u.nombre
-        FROM gastos g
-        JOIN usuarios u ON u.id = g.usuario_id
-        WHERE date(g.fecha) BETWEEN ? AND ?
-        ORDER BY g.fecha DESC
-    """, (desde, hasta))
-
-    gastos = cursor.fetchall()
-
-
-    gastos = [
-        {
-            "descripcion": r[0],
-            "monto": r[1],
-            "fecha": r[2],
-            "usuario": r[3]
-        }
-        for r in cursor.fetchall()
-    ]
+    # 3️⃣ Totales y detalle: una consulta cada uno, el detalle se recorre
+    # directamente desde el cursor al renderizar
+    reporte = ReporteConsulta(conectar(), desde, hasta)
 
     producto = request.args.get("producto")
     usuario = request.args.get("usuario")
 
     historial = None
+    historial_pagina = None
     if request.method == "GET":
-        historial = buscar_historial(
-            desde=desde,
-            hasta=hasta,
+        historial_pagina = reporte.historial(
             producto=producto,
-            usuario=usuario
+            usuario=usuario,
+            antes=request.args.get("antes"),
+            despues=request.args.get("despues"),
+            tamano=tamano_pagina()
         )
+        historial = historial_pagina.filas
 
-
-    conn.close()
+    # una fila de más avisa que el período tiene más de las que se muestran
+    ventas = list(reporte.ventas_detalle(limite=REPORTES_DETALLE_MAX + 1))
+    gastos = list(reporte.gastos_detalle(limite=REPORTES_DETALLE_MAX + 1))
 
     return render_template(
     "reportes.html",
-    total_ventas=ventas_total,
-    total_gastos=gastos_total,
-    ganancia=ventas_total - gastos_total,
-    ventas=ventas,
-    gastos=gastos,
+    total_ventas=reporte.ventas,
+    total_gastos=reporte.gastos,
+    ganancia=reporte.ganancia,
+    ventas=ventas[:REPORTES_DETALLE_MAX],
+    gastos=gastos[:REPORTES_DETALLE_MAX],
+    ventas_recortadas=len(ventas) > REPORTES_DETALLE_MAX,
+    gastos_recortados=len(gastos) > REPORTES_DETALLE_MAX,
+    detalle_maximo=REPORTES_DETALLE_MAX,
+    productos=reporte.por_producto(),
     desde=desde,
     hasta=hasta,
-    historial=historial
+    historial=historial,
+    historial_pagina=historial_pagina
 )
 
-@app.route("/export/pdf")
-@solo_dueno
-def export_pdf():
+def exportar_reporte(formato, generador, mimetype):
     desde = request.args.get("from")
     hasta = request.args.get("to")
 
     if not desde or not hasta:
         return redirect("/reportes")
 
-    data = get_report_data(desde, hasta)
-    file_path = generate_pdf(data)
+    # la clave incluye la versión de datos del rango: si nada cambió en esas
+    # fechas se reutiliza el archivo (o se responde 304 al navegador)
+    version = version_datos(conectar(), desde, hasta)
+    etag = cache_reportes.clave(formato, desde, hasta, version)
+
+    if request.if_none_match.contains(etag):
+        respuesta = app.response_class(status=304)
+        respuesta.set_etag(etag)
+        return respuesta
+
+    archivo = cache_reportes.abrir(etag)
+    metricas.contar_cache(archivo is not None)
+    if archivo is None:
+        archivo = metricas.generar_reporte_medido(
+            formato, generador, get_report_data(desde, hasta)
+        )
+        cache_reportes.guardar(etag, archivo)
+
+    # werkzeug cierra (y así borra) el archivo al terminar la respuesta
+    return send_file(
+        archivo,
+        as_attachment=True,
+        download_name=f"reporte_{desde}_{hasta}.{formato}",
+        mimetype=mimetype,
+        etag=etag
+    )
 
-    return send_file(file_path, as_attachment=True)
 
+@app.route("/export/pdf")
+@solo_dueno
+def export_pdf():
+    return exportar_reporte("pdf", generate_pdf, "application/pdf")
 
 
 @app.route("/export/excel")
+@solo_dueno
 def export_excel():
+    return exportar_reporte(
+        "xlsx",
+        generate_excel,
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    )
+
+# =========================
+# EXPORTACIONES EN SEGUNDO PLANO (SOLO DUEÑO)
+# =========================
+MIMETYPES_EXPORTACION = {
+    "pdf": "application/pdf",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+FORMATOS_TEXTO = {
+    "csv": (lineas_csv, "text/csv; charset=utf-8"),
+    "ndjson": (lineas_ndjson, "application/x-ndjson"),
+}
+
+
+def exportar_texto(formato):
+    # mismo rango y filtros que el historial; tipo=ventas|gastos, gzip=1
     desde = request.args.get("from")
     hasta = request.args.get("to")
+    tipo = request.args.get("tipo", "ventas")
+    if tipo not in ("ventas", "gastos"):
+        return {"error": "tipo debe ser ventas o gastos"}, 400
+
+    columnas, cursor = ReporteConsulta(conectar(), desde, hasta).exportar(
+        tipo,
+        producto=request.args.get("producto"),
+        usuario=request.args.get("usuario"),
+    )
 
-    if not desde or not hasta:
-        return redirect("/reportes")
+    generador, mimetype = FORMATOS_TEXTO[formato]
+    cuerpo = generador(columnas, cursor)
+    nombre = f"{tipo}_{desde or 'inicio'}_{hasta or 'hoy'}.{formato}"
+    if request.args.get("gzip") == "1":
+        cuerpo = comprimir(cuerpo)
+        nombre += ".gz"
+        mimetype = "application/gzip"
+
+    # stream_with_context: la conexión del request sigue abierta mientras
+    # se recorre el cursor
+    return app.response_class(
+        stream_with_context(cuerpo),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f'attachment; filename="{nombre}"'},
+    )
+
+
+@app.route("/export/csv")
+@solo_dueno
+def export_csv():
+    return exportar_texto("csv")
+
+
+@app.route("/export/ndjson")
+@solo_dueno
+def export_ndjson():
+    return exportar_texto("ndjson")
+
+
+def trabajo_json(trabajo):
+    return {
+        "id": trabajo["id"],
+        "formato": trabajo["formato"],
+        "desde": trabajo["desde"],
+        "hasta": trabajo["hasta"],
+        "estado": trabajo["estado"],
+        "error": trabajo["error"],
+        "creado": trabajo["creado"],
+        "terminado": trabajo["terminado"],
+    }
+
+
+@app.route("/export/trabajos", methods=["POST"])
+@solo_dueno
+def crear_trabajo_exportacion():
+    datos = request.get_json(silent=True) or request.form
+    formato = datos.get("formato")
+    desde = datos.get("from")
+    hasta = datos.get("to")
+
+    if formato not in MIMETYPES_EXPORTACION or not desde or not hasta:
+        return {"error": "formato (pdf|xlsx), from y to son obligatorios"}, 400
+
+    trabajo_id = cola_exportaciones.crear(
+        conectar(), session.get("usuario_id"), formato, desde, hasta
+    )
+    if trabajo_id is None:
+        return {"error": "demasiadas exportaciones en curso"}, 429
+
+    return {"id": trabajo_id, "estado": "pendiente"}, 202
+
+
+@app.route("/export/trabajos/<trabajo_id>")
+@solo_dueno
+def estado_trabajo_exportacion(trabajo_id):
+    trabajo = cola_exportaciones.consultar(conectar(), trabajo_id, session.get("usuario_id"))
+    if trabajo is None:
+        return {"error": "no existe"}, 404
+
+    return trabajo_json(trabajo)
+
+
+@app.route("/export/trabajos/<trabajo_id>/descarga")
+@solo_dueno
+def descargar_trabajo_exportacion(trabajo_id):
+    trabajo = cola_exportaciones.consultar(conectar(), trabajo_id, session.get("usuario_id"))
+    if trabajo is None:
+        return {"error": "no existe"}, 404
+    if trabajo["estado"] != LISTO or not os.path.exists(trabajo["ruta"]):
+        return trabajo_json(trabajo), 409
+
+    return send_file(
+        trabajo["ruta"],
+        as_attachment=True,
+        download_name=f"reporte_{trabajo['desde']}_{trabajo['hasta']}.{trabajo['formato']}",
+        mimetype=MIMETYPES_EXPORTACION[trabajo["formato"]]
+    )
+
+
+@app.route("/export/trabajos/<trabajo_id>/cancelar", methods=["POST"])
+@solo_dueno
+def cancelar_trabajo_exportacion(trabajo_id):
+    if not cola_exportaciones.cancelar(conectar(), trabajo_id, session.get("usuario_id")):
+        return {"error": "no existe o ya terminó"}, 409
 
-    data = get_report_data(desde, hasta)
-    file_path = generate_excel(data)
+    return {"id": trabajo_id, "estado": "cancelado"}
 
-    return send_file(file_path, as_attachment=True)
 
+# =========================
+# IMPORTAR CSV (SOLO DUEÑO)
+# =========================
+@app.route("/importar", methods=["GET", "POST"])
+@solo_dueno
+def importar_archivo():
+    resultado = None
+    error = None
+
+    if request.method == "POST":
+        tipo = request.form.get("tipo")
+        archivo = request.files.get("archivo")
+        if tipo not in ("productos", "ventas", "gastos") or not archivo:
+            error = "elegí el tipo y el archivo CSV"
+        else:
+            # el upload ya está en un archivo temporal: se lee por streaming
+            texto = io.TextIOWrapper(archivo.stream, encoding="utf-8-sig", newline="")
+            try:
+                resultado = importar_csv(
+                    conectar(), tipo, texto, session.get("usuario_id"),
+                    periodos=periodos_cerrados
+                )
+            except ArchivoInvalido as e:
+                error = str(e)
+            except UnicodeDecodeError:
+                error = "el archivo no está en UTF-8"
+
+    return render_template("importar.html", resultado=resultado, error=error), 400 if error else 200
+
+
+# =========================
+# MÉTRICAS
+# =========================
+@app.route("/metrics")
+def metrics():
+    cuerpo, content_type = metricas.exponer()
+    return app.response_class(cuerpo, content_type=content_type)
+
+
+# =========================
+# CALENDARIO
+# =========================
 @app.route("/calendar/data")
 @solo_dueno
 def calendar_data():
     month = request.args.get("month")  # YYYY-MM
-    if not month:
+    if not month or not MES.match(month):
         return {}
 
     conn = conectar()
-    cursor = conn.cursor()
 
-    # Ventas por día
-    cursor.execute("""
-        SELECT date(fecha) as dia, IFNULL(SUM(total), 0)
-        FROM ventas
-        WHERE strftime('%Y-%m', fecha) = ?
-        GROUP BY dia
-    """, (month,))
-    ventas = dict(cursor.fetchall())
-
-    # Gastos por día
-    cursor.execute("""
-        SELECT date(fecha) as dia, IFNULL(SUM(monto), 0)
-        FROM gastos
-        WHERE strftime('%Y-%m', fecha) = ?
-        GROUP BY dia
-    """, (month,))
-    gastos = dict(cursor.fetchall())
+    # la versión del mes es una lectura de índice: si el navegador ya tiene
+    # esa versión no se toca resumen_diario
+    version = cache_calendario.version(conn, month)
+    etag = cache_calendario.etag(month, version)
 
-    conn.close()
+    if mes_cerrado(conn, month, periodos_cerrados):
+        cache_control = "private, max-age=31536000, immutable"
+    else:
+        cache_control = "private, no-cache"
 
-    # Unificar
-    data = {}
-    for dia in set(ventas) | set(gastos):
-        data[dia] = {
-            "ventas": ventas.get(dia, 0),
-            "gastos": gastos.get(dia, 0)
-        }
+    if request.if_none_match.contains(etag):
+        respuesta = app.response_class(status=304)
+    else:
+        respuesta = app.json.response(cache_calendario.obtener(conn, month, version))
 
-    return data
+    respuesta.set_etag(etag)
+    respuesta.headers["Cache-Control"] = cache_control
+    return respuesta
 
-@reports_bp.route("/")
-def reports():
-    if "usuario_id" not in session:
-        return redirect(url_for("auth.login"))
+# =========================
+# API JSON (v1)
+# =========================
+def respuesta_api(datos, etag=None, estado=200):
+    # JSON compacto, comprimido si conviene, con ETag débil; sin etag
+    # calculado antes (p. ej. por versión de datos) se usa el hash del cuerpo
+    cuerpo = api.serializar(datos)
+    etag = etag or api.etag_cuerpo(cuerpo)
+
+    if estado == 200 and request.if_none_match.contains_weak(etag):
+        respuesta = app.response_class(status=304)
+    else:
+        cuerpo, codificacion = api.comprimir_cuerpo(cuerpo, request.accept_encodings)
+        respuesta = app.response_class(cuerpo, status=estado, mimetype="application/json")
+        if codificacion:
+            respuesta.headers["Content-Encoding"] = codificacion
 
-    return render_template("reports/reports.html")
+    respuesta.set_etag(etag, weak=True)
+    respuesta.headers["Cache-Control"] = "private, no-cache"
+    respuesta.vary.add("Accept-Encoding")
+    return respuesta
 
-@reports_bp.route("/pdf")
-def report_pdf():
-    if "usuario_id" not in session:
-        return redirect(url_for("auth.login"))
 
-    return generate_pdf()
+def error_api(mensaje, estado):
+    return {"error": mensaje}, estado
 
-@reports_bp.route("/excel")
-def report_excel():
-    if "usuario_id" not in session:
-        return redirect(url_for("auth.login"))
 
-    return generate_excel()
+def listado_api(tipo):
+    if not requiere_operadora():
+        return error_api("sesión vencida", 401)
+
+    try:
+        campos = api.leer_campos(request.args.get("campos"), tipo)
+        desde = request.args.get("desde")
+        hasta = request.args.get("hasta")
+        if desde or hasta:
+            desde = api.leer_fecha(desde, "desde")
+            hasta = api.leer_fecha(hasta, "hasta")
+    except api.ParametroInvalido as e:
+        return error_api(str(e), 400)
+
+    # como en /ventas y /gastos: la operadora solo ve lo suyo
+    usuario_id = None if session.get("rol") == "dueno" else session.get("usuario_id")
+
+    pagina = ReporteConsulta(conectar(), desde, hasta).listar(
+        tipo,
+        campos,
+        producto=request.args.get("producto"),
+        usuario=request.args.get("usuario"),
+        usuario_id=usuario_id,
+        antes=request.args.get("antes"),
+        despues=request.args.get("despues"),
+        tamano=tamano_pagina()
+    )
 
+    return respuesta_api({
+        "datos": pagina.filas,
+        "siguiente": pagina.siguiente,
+        "anterior": pagina.anterior,
+    })
 
 
+@app.route("/api/v1/ventas", methods=["GET", "POST"])
+def api_ventas():
+    if request.method == "GET":
+        return listado_api("ventas")
+    if not requiere_operadora():
+        return error_api("sesión vencida", 401)
+
+    # {"producto_id", "cantidad"} o, para un ticket, {"lineas": [...]}
+    datos = request.get_json(silent=True)
+    fecha = datetime.now().strftime("%Y-%m-%d %H:%M")
+    usuario_id = session.get("usuario_id")
+    try:
+        if isinstance(datos, dict) and "lineas" in datos:
+            ticket_id, total = escribir_operacion(
+                "ticket", aplicar_ticket, leer_lineas_ticket(), usuario_id, fecha
+            )
+            return respuesta_api({"ticket_id": ticket_id, "total": total}, estado=201)
+
+        venta_id = escribir_operacion(
+            "venta", aplicar_venta, int(datos["producto_id"]), int(datos["cantidad"]),
+            usuario_id, fecha
+        )
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return error_api("se espera {producto_id, cantidad} o {lineas}", 400)
+    except VentaRechazada as e:
+        return error_api(str(e), 409)
+
+    return respuesta_api({"id": venta_id}, estado=201)
+
+
+@app.route("/api/v1/gastos", methods=["GET", "POST"])
+def api_gastos():
+    if request.method == "GET":
+        return listado_api("gastos")
+    if not requiere_operadora():
+        return error_api("sesión vencida", 401)
+
+    datos = request.get_json(silent=True)
+    try:
+        descripcion = str(datos["descripcion"]).strip()
+        monto = float(datos["monto"])
+    except (KeyError, TypeError, ValueError):
+        return error_api("se espera {descripcion, monto}", 400)
+    if not descripcion:
+        return error_api("falta descripcion", 400)
+
+    try:
+        gasto_id = escribir_operacion(
+            "gasto", aplicar_gasto, descripcion, monto, datetime.now().strftime("%Y-%m-%d"),
+            session.get("usuario_id")
+        )
+    except VentaRechazada as e:
+        return error_api(str(e), 409)
+    return respuesta_api({"id": gasto_id}, estado=201)
+
+
+@app.route("/api/v1/resumen")
+def api_resumen():
+    # ?desde=&hasta=&por=dia|semana|mes; semanas cerradas desde sus cierres
+    if session.get("rol") != "dueno":
+        return error_api("solo el dueño", 403)
+
+    por = request.args.get("por", "dia")
+    try:
+        desde = api.leer_fecha(request.args.get("desde"), "desde")
+        hasta = api.leer_fecha(request.args.get("hasta"), "hasta")
+        if por not in api.AGRUPACIONES:
+            raise api.ParametroInvalido("por: " + ", ".join(api.AGRUPACIONES))
+    except api.ParametroInvalido as e:
+        return error_api(str(e), 400)
+
+    conn = conectar()
+    # como en /calendar/data: con la versión del rango alcanza para el 304
+    etag = api.etag_de("resumen", desde, hasta, por, version_datos(conn, desde, hasta))
+    if request.if_none_match.contains_weak(etag):
+        return respuesta_api(None, etag)
+
+    consulta = ReporteConsulta(conn, desde, hasta)
+    ventas, gastos = consulta.totales
+    return respuesta_api({
+        "desde": desde,
+        "hasta": hasta,
+        "por": por,
+        "ventas": ventas,
+        "gastos": gastos,
+        "ganancia": consulta.ganancia,
+        "periodos": api.agrupar(consulta.descomposicion.por_dia(), por),
+    }, etag)
+
+
+@app.route("/api/v1/dashboard")
+def api_dashboard():
+    if "negocio" not in session:
+        return error_api("sesión vencida", 401)
+
+    # ?desde=&hasta= opcionales, para ventas_periodo / gastos_periodo
+    desde, hasta = request.args.get("desde"), request.args.get("hasta")
+    try:
+        if desde or hasta:
+            desde = api.leer_fecha(desde, "desde")
+            hasta = api.leer_fecha(hasta, "hasta")
+    except api.ParametroInvalido as e:
+        return error_api(str(e), 400)
+
+    totales = dashboard_totals(conectar(), desde, hasta)
+    return respuesta_api({**totales._asdict(), "ganancia": totales.ganancia})
 
 # =========================
 # RUN
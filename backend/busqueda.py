@@ -0,0 +1,80 @@
+# =========================
+# BÚSQUEDA POR NOMBRE (FTS5)
+# =========================
+# Índices FTS5 con tokenizer trigram sobre productos.nombre y usuarios.nombre:
+# resuelven búsquedas por subcadena ('%x%') sin recorrer las tablas. Son de
+# contenido externo (no duplican el texto) y los triggers los mantienen al día.
+
+# trigram necesita al menos 3 caracteres para usar el índice
+MIN_CARACTERES = 3
+
+# Con pocos nombres coincidentes conviene leer sus ventas por el índice
+# (producto_id, fecha) y ordenarlas. Si coincide más de esta fracción del
+# catálogo eso son miles de filas para ordenar y es más barato recorrer las
+# ventas por fecha (el "+" le saca el índice de id) hasta llenar la página.
+FRACCION_AMPLIA = 0.01
+
+
+def _fts(tabla):
+    return f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {tabla}_fts USING fts5(
+    nombre, content='{tabla}', content_rowid='id', tokenize='trigram'
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_{tabla}_fts_ins AFTER INSERT ON {tabla}
+BEGIN
+    INSERT INTO {tabla}_fts (rowid, nombre) VALUES (NEW.id, NEW.nombre);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_{tabla}_fts_del AFTER DELETE ON {tabla}
+BEGIN
+    INSERT INTO {tabla}_fts ({tabla}_fts, rowid, nombre) VALUES ('delete', OLD.id, OLD.nombre);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_{tabla}_fts_upd AFTER UPDATE OF nombre ON {tabla}
+BEGIN
+    INSERT INTO {tabla}_fts ({tabla}_fts, rowid, nombre) VALUES ('delete', OLD.id, OLD.nombre);
+    INSERT INTO {tabla}_fts (rowid, nombre) VALUES (NEW.id, NEW.nombre);
+END;
+"""
+
+
+TABLAS_FTS = ("productos", "usuarios")
+
+
+def crear_indices_busqueda(conn):
+    for tabla in TABLAS_FTS:
+        existia = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = ?", (f"{tabla}_fts",)
+        ).fetchone()
+
+        conn.executescript(_fts(tabla))
+
+        # primera vez: indexar lo que ya existe
+        if not existia:
+            reconstruir_indice(conn, tabla)
+
+
+def reconstruir_indice(conn, tabla):
+    conn.execute(f"INSERT INTO {tabla}_fts ({tabla}_fts) VALUES ('rebuild')")
+    conn.commit()
+
+
+def filtro_por_nombre(conn, columna_id, tabla, texto):
+    # condición "columna_id IN (ids cuyo nombre contiene texto)" y sus parámetros
+    if len(texto) >= MIN_CARACTERES:
+        ids = f"SELECT rowid FROM {tabla}_fts WHERE {tabla}_fts MATCH ?"
+        valores = ['"' + texto.replace('"', '""') + '"']
+    else:
+        # texto muy corto para trigram: buscar directo en la tabla (es chica)
+        ids = f"SELECT id FROM {tabla} WHERE nombre LIKE ?"
+        valores = [f"%{texto}%"]
+
+    # cuántos nombres coinciden decide el plan (ver FRACCION_AMPLIA)
+    coincidencias = conn.execute(f"SELECT COUNT(*) FROM ({ids})", valores).fetchone()[0]
+    if coincidencias == 0:
+        return "0", []
+
+    catalogo = conn.execute(f"SELECT IFNULL(MAX(id), 0) FROM {tabla}").fetchone()[0]
+    prefijo = "+" if coincidencias > catalogo * FRACCION_AMPLIA else ""
+    return f"{prefijo}{columna_id} IN ({ids})", valores
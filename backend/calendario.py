@@ -0,0 +1,77 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from datetime import date
+
+from .cierres import Descomposicion
+from .reports.cache import version_datos
+
+# =========================
+# CALENDARIO MENSUAL
+# =========================
+# /calendar/data devuelve los totales por día de un mes. La versión de datos
+# del mes (versiones_datos, la misma que usa la cache de reportes) cambia solo
+# cuando se escribe o borra algo en ese mes, y la ven todos los workers: sirve
+# de ETag y de clave de la cache en memoria de cada proceso. Un mes ya
+# terminado con todos sus días dentro de semanas cerradas no cambia más y se
+# marca immutable para que el navegador ni siquiera revalide.
+
+MES = re.compile(r"^\d{4}-(0[1-9]|1[0-2])$")
+
+
+def limites_mes(mes):
+    # (primer día, último día) como YYYY-MM-DD
+    anio, numero = map(int, mes.split("-"))
+    inicio = date(anio, numero, 1)
+    siguiente = date(anio + numero // 12, numero % 12 + 1, 1)
+    return inicio.isoformat(), date.fromordinal(siguiente.toordinal() - 1).isoformat()
+
+
+def mes_cerrado(conn, mes, periodos, hoy=None):
+    # cerrado = terminó y todos sus días caen en semanas cerradas (los
+    # intervalos fusionados de periodos: un hueco entre cierres lo deja abierto)
+    inicio, fin = limites_mes(mes)
+    hoy = (hoy or date.today()).isoformat()
+    return fin < hoy and periodos.cubre(conn, inicio, fin)
+
+
+def datos_mes(conn, mes):
+    # las semanas cerradas del mes salen congeladas, igual que en reportes
+    data = {}
+    for dia, (ventas, gastos) in Descomposicion(conn, *limites_mes(mes)).por_dia().items():
+        data[dia] = {
+            "ventas": ventas,
+            "gastos": gastos
+        }
+    return data
+
+
+class CacheCalendario:
+    """Meses ya calculados en este proceso, validados por versión de datos."""
+
+    def __init__(self, max_meses=120):
+        self.max_meses = max_meses
+        self._meses = OrderedDict()
+        self._lock = threading.Lock()
+
+    def etag(self, mes, version):
+        return hashlib.sha256(f"calendario:{mes}:{version}".encode()).hexdigest()[:32]
+
+    def version(self, conn, mes):
+        return version_datos(conn, *limites_mes(mes))
+
+    def obtener(self, conn, mes, version):
+        with self._lock:
+            guardado = self._meses.get(mes)
+            if guardado is not None and guardado[0] == version:
+                self._meses.move_to_end(mes)
+                return guardado[1]
+
+        data = datos_mes(conn, mes)
+        with self._lock:
+            self._meses[mes] = (version, data)
+            self._meses.move_to_end(mes)
+            while len(self._meses) > self.max_meses:
+                self._meses.popitem(last=False)
+        return data
@@ -0,0 +1,397 @@
+import threading
+from bisect import bisect_right
+from datetime import date, timedelta
+
+# =========================
+# CIERRES SEMANALES (SNAPSHOTS)
+# =========================
+# Al cerrar una semana se congelan sus totales (cierres_semanales) y el
+# desglose por día y por producto (cierres_semanales_dia / _producto),
+# copiados de resumen_diario en la misma transacción. Cualquier rango se
+# parte en semanas cerradas enteras, que se responden desde esas filas, y
+# tramos abiertos (los bordes y los huecos entre cierres), que se leen de los
+# datos vivos. Un reporte de un año lee ~52 cierres y unos pocos días sueltos.
+#
+# Una semana cerrada dos veces (o cierres que se pisan) usa el primero que
+# empieza antes; el resto se ignora al armar los tramos.
+
+DETALLE = """
+CREATE TABLE IF NOT EXISTS cierres_semanales_dia (
+    cierre_id INTEGER NOT NULL REFERENCES cierres_semanales(id) ON DELETE CASCADE,
+    dia TEXT NOT NULL,
+    ventas_total REAL NOT NULL,
+    ventas_cantidad INTEGER NOT NULL,
+    unidades INTEGER NOT NULL,
+    gastos_total REAL NOT NULL,
+    gastos_cantidad INTEGER NOT NULL,
+    PRIMARY KEY (cierre_id, dia)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS cierres_semanales_producto (
+    cierre_id INTEGER NOT NULL REFERENCES cierres_semanales(id) ON DELETE CASCADE,
+    producto_id INTEGER NOT NULL,
+    ventas_total REAL NOT NULL,
+    ventas_cantidad INTEGER NOT NULL,
+    unidades INTEGER NOT NULL,
+    PRIMARY KEY (cierre_id, producto_id)
+) WITHOUT ROWID;
+"""
+
+INDICE = """
+CREATE INDEX IF NOT EXISTS idx_cierres_semanales_fechas
+    ON cierres_semanales (fecha_inicio, fecha_fin);
+"""
+
+# diferencia máxima tolerada al comparar importes (redondeo de REAL)
+TOLERANCIA = 0.005
+
+
+def crear_detalle_cierres(conn):
+    conn.executescript(INDICE + DETALLE)
+
+    # cierres anteriores a esta tabla: congelar su desglose con los datos de hoy
+    pendientes = [r[0] for r in conn.execute("""
+        SELECT c.id FROM cierres_semanales c
+        WHERE NOT EXISTS (SELECT 1 FROM cierres_semanales_dia d WHERE d.cierre_id = c.id)
+    """).fetchall()]
+    for cierre_id in pendientes:
+        congelar_detalle(conn, cierre_id)
+    conn.commit()
+
+
+def congelar_detalle(conn, cierre_id):
+    # una fila por cada día de la semana, aunque no haya tenido movimiento:
+    # así todo cierre tiene detalle y crear_detalle_cierres no lo vuelve a
+    # buscar en cada arranque
+    conn.execute("""
+        WITH RECURSIVE dias(dia, fin) AS (
+            SELECT fecha_inicio, fecha_fin FROM cierres_semanales WHERE id = ?
+            UNION ALL
+            SELECT date(dia, '+1 day'), fin FROM dias WHERE dia < fin
+        )
+        INSERT OR REPLACE INTO cierres_semanales_dia
+            (cierre_id, dia, ventas_total, ventas_cantidad, unidades, gastos_total, gastos_cantidad)
+        SELECT ?, d.dia, IFNULL(r.ventas_total, 0), IFNULL(r.ventas_cantidad, 0),
+               IFNULL(r.unidades, 0), IFNULL(r.gastos_total, 0), IFNULL(r.gastos_cantidad, 0)
+        FROM dias d
+        LEFT JOIN resumen_diario r ON r.dia = d.dia
+    """, (cierre_id, cierre_id))
+
+    conn.execute("""
+        INSERT OR REPLACE INTO cierres_semanales_producto
+            (cierre_id, producto_id, ventas_total, ventas_cantidad, unidades)
+        SELECT c.id, r.producto_id, SUM(r.ventas_total), SUM(r.ventas_cantidad), SUM(r.unidades)
+        FROM cierres_semanales c
+        JOIN resumen_diario_producto r ON r.dia >= c.fecha_inicio AND r.dia <= c.fecha_fin
+        WHERE c.id = ?
+        GROUP BY r.producto_id
+    """, (cierre_id,))
+
+
+class CierreDuplicado(Exception):
+    pass
+
+
+def registrar_cierre(conn, inicio, fin, usuario_id, fecha_cierre):
+    # totales y desglose leídos y guardados bajo el mismo lock de escritura
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        # un segundo cierre de la misma semana quedaría oculto en
+        # cierres_en_rango, que se queda con el más viejo
+        if cursor.execute("""
+            SELECT 1 FROM cierres_semanales WHERE fecha_inicio = ? AND fecha_fin = ?
+        """, (inicio, fin)).fetchone():
+            raise CierreDuplicado(f"la semana {inicio} a {fin} ya está cerrada")
+
+        ventas, gastos = cursor.execute("""
+            SELECT IFNULL(SUM(ventas_total), 0), IFNULL(SUM(gastos_total), 0)
+            FROM resumen_diario
+            WHERE dia >= ? AND dia <= ?
+        """, (inicio, fin)).fetchone()
+
+        cursor.execute("""
+            INSERT INTO cierres_semanales
+            (fecha_inicio, fecha_fin, total_ventas, total_gastos, ganancia, cerrado_por, fecha_cierre)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (inicio, fin, ventas, gastos, ventas - gastos, usuario_id, fecha_cierre))
+        cierre_id = cursor.lastrowid
+
+        congelar_detalle(conn, cierre_id)
+        cursor.execute("COMMIT")
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+    return cierre_id
+
+
+# =========================
+# DESCOMPOSICIÓN DE UN RANGO
+# =========================
+def cierres_en_rango(conn, desde, hasta):
+    # [(id, inicio, fin, ventas, gastos)] enteros dentro del rango, sin solaparse
+    filas = conn.execute("""
+        SELECT id, fecha_inicio, fecha_fin, total_ventas, total_gastos
+        FROM cierres_semanales
+        WHERE fecha_inicio >= ? AND fecha_fin <= ?
+        ORDER BY fecha_inicio, id
+    """, (desde, hasta)).fetchall()
+
+    elegidos = []
+    for fila in filas:
+        if elegidos and fila[1] <= elegidos[-1][2]:
+            continue
+        elegidos.append(fila)
+    return elegidos
+
+
+def _dia(texto, delta=0):
+    return (date.fromisoformat(texto) + timedelta(days=delta)).isoformat()
+
+
+def tramos_abiertos(desde, hasta, cierres):
+    # [(desde, hasta)] del rango que no cubre ningún cierre
+    tramos = []
+    actual = desde
+    for _, inicio, fin, _, _ in cierres:
+        if actual < inicio:
+            tramos.append((actual, _dia(inicio, -1)))
+        actual = _dia(fin, 1)
+    if actual <= hasta:
+        tramos.append((actual, hasta))
+    return tramos
+
+
+def _donde_tramos(columna, tramos):
+    if not tramos:
+        return "0", []
+    condicion = " OR ".join(f"({columna} >= ? AND {columna} <= ?)" for _ in tramos)
+    return condicion, [d for tramo in tramos for d in tramo]
+
+
+class Descomposicion:
+    """Un rango partido en cierres (congelados) y tramos abiertos (vivos)."""
+
+    def __init__(self, conn, desde, hasta):
+        self.conn = conn
+        self.desde = desde
+        self.hasta = hasta
+        self.cierres = cierres_en_rango(conn, desde, hasta)
+        self.tramos = tramos_abiertos(desde, hasta, self.cierres)
+
+    @property
+    def ids(self):
+        return [c[0] for c in self.cierres]
+
+    def totales(self):
+        ventas = sum(c[3] for c in self.cierres)
+        gastos = sum(c[4] for c in self.cierres)
+
+        if self.tramos:
+            condicion, params = _donde_tramos("dia", self.tramos)
+            v, g = self.conn.execute(f"""
+                SELECT IFNULL(SUM(ventas_total), 0), IFNULL(SUM(gastos_total), 0)
+                FROM resumen_diario
+                WHERE {condicion}
+            """, params).fetchone()
+            ventas += v
+            gastos += g
+
+        return float(ventas), float(gastos)
+
+    def _union(self, congelado, vivo):
+        # filas de los cierres elegidos + filas vivas de los tramos abiertos
+        ids = self.ids
+        marcas = ", ".join("?" for _ in ids) or "NULL"
+        condicion, params = _donde_tramos("dia", self.tramos)
+        return (
+            f"{congelado} WHERE cierre_id IN ({marcas}) UNION ALL {vivo} WHERE {condicion}",
+            ids + params,
+        )
+
+    def por_dia(self):
+        # {dia: (ventas_total, gastos_total)} con movimiento
+        sql, params = self._union(
+            "SELECT dia, ventas_total, gastos_total, ventas_cantidad, gastos_cantidad "
+            "FROM cierres_semanales_dia",
+            "SELECT dia, ventas_total, gastos_total, ventas_cantidad, gastos_cantidad "
+            "FROM resumen_diario",
+        )
+        return {
+            dia: (ventas, gastos)
+            for dia, ventas, gastos, vc, gc in self.conn.execute(
+                f"SELECT * FROM ({sql}) ORDER BY dia", params
+            )
+            if vc > 0 or gc > 0
+        }
+
+    def por_producto(self):
+        # [(nombre, unidades, total)] de mayor a menor venta
+        sql, params = self._union(
+            "SELECT producto_id, unidades, ventas_total FROM cierres_semanales_producto",
+            "SELECT producto_id, unidades, ventas_total FROM resumen_diario_producto",
+        )
+        return self.conn.execute(f"""
+            SELECT IFNULL(p.nombre, '(eliminado)'), SUM(x.unidades), SUM(x.ventas_total)
+            FROM ({sql}) x
+            LEFT JOIN productos p ON p.id = x.producto_id
+            GROUP BY x.producto_id
+            HAVING SUM(x.unidades) > 0
+            ORDER BY 3 DESC
+        """, params).fetchall()
+
+
+# =========================
+# PERÍODOS CERRADOS
+# =========================
+# Regla única para vender, gastar, borrar o importar: una fecha está bloqueada
+# si cae dentro de alguna semana de cierres_semanales. Lo que ya está cerrado
+# no cambia, así los totales congelados siguen cuadrando con los datos vivos.
+# Los intervalos se cargan ordenados y fusionados en memoria y cada consulta es
+# un bisect. Para enterarse de cierres hechos (o borrados) en otro worker se
+# compara COUNT(*) y MAX(id) antes de responder (lecturas del índice, la tabla
+# tiene una fila por semana). El índice por fechas sirve a la carga ordenada y
+# a cierres_en_rango.
+
+
+def fusionar_intervalos(filas):
+    # [(inicio, fin)] ordenados por inicio → sin solapes ni días contiguos
+    fusionados = []
+    for inicio, fin in filas:
+        if fusionados and inicio <= _dia(fusionados[-1][1], 1):
+            if fin > fusionados[-1][1]:
+                fusionados[-1][1] = fin
+        else:
+            fusionados.append([inicio, fin])
+    return fusionados
+
+
+class PeriodosCerrados:
+    """Intervalos cerrados en memoria, con búsqueda binaria por fecha."""
+
+    def __init__(self):
+        self._marca = None
+        self._intervalos = ([], [])      # (inicios, fines) ordenados
+        self._lock = threading.Lock()
+
+    def invalidar(self):
+        self._marca = None
+
+    def _refrescar(self, conn):
+        marca = conn.execute("SELECT COUNT(*), MAX(id) FROM cierres_semanales").fetchone()
+        if marca == self._marca:
+            return
+        with self._lock:
+            filas = conn.execute("""
+                SELECT fecha_inicio, fecha_fin FROM cierres_semanales
+                ORDER BY fecha_inicio
+            """).fetchall()
+            intervalos = fusionar_intervalos(filas)
+            # una sola asignación: un lector nunca ve listas de distinta carga
+            self._intervalos = (
+                [i for i, _ in intervalos], [f for _, f in intervalos]
+            )
+            self._marca = marca
+
+    @staticmethod
+    def _buscar(inicios, fines, fecha):
+        dia = fecha[:10]
+        i = bisect_right(inicios, dia) - 1
+        return i >= 0 and dia <= fines[i]
+
+    def cerrada(self, conn, fecha):
+        self._refrescar(conn)
+        return self._buscar(*self._intervalos, fecha)
+
+    def cerradas(self, conn, fechas):
+        # [bool] por cada fecha, en el mismo orden; un solo refresco
+        self._refrescar(conn)
+        inicios, fines = self._intervalos
+        return [self._buscar(inicios, fines, f) for f in fechas]
+
+    def cubre(self, conn, desde, hasta):
+        # todos los días de [desde, hasta] cerrados: como los intervalos están
+        # fusionados (sin huecos adentro), tiene que contenerlos uno solo
+        self._refrescar(conn)
+        inicios, fines = self._intervalos
+        i = bisect_right(inicios, desde[:10]) - 1
+        return i >= 0 and hasta[:10] <= fines[i]
+
+
+# una por proceso: la comparten las rutas y las escrituras de ventas.py
+periodos_cerrados = PeriodosCerrados()
+
+
+# =========================
+# VERIFICACIÓN
+# =========================
+def verificar_cierres(conn):
+    # compara cada cierre contra las tablas ventas/gastos (no contra el
+    # resumen): [(cierre_id, qué, guardado, real)] por cada diferencia
+    diferencias = []
+
+    cierres = conn.execute("""
+        SELECT id, fecha_inicio, fecha_fin, total_ventas, total_gastos
+        FROM cierres_semanales
+        ORDER BY fecha_inicio, id
+    """).fetchall()
+
+    for cierre_id, inicio, fin, total_ventas, total_gastos in cierres:
+        reales = {}
+        for dia, ventas, cantidad, unidades in conn.execute("""
+            SELECT date(fecha), SUM(total), COUNT(*), SUM(cantidad)
+            FROM ventas
+            WHERE fecha >= ? AND fecha < date(?, '+1 day')
+            GROUP BY 1
+        """, (inicio, fin)):
+            reales[dia] = [ventas, cantidad, unidades, 0.0, 0]
+        for dia, gastos, cantidad in conn.execute("""
+            SELECT date(fecha), SUM(monto), COUNT(*)
+            FROM gastos
+            WHERE fecha >= ? AND fecha < date(?, '+1 day')
+            GROUP BY 1
+        """, (inicio, fin)):
+            reales.setdefault(dia, [0.0, 0, 0, 0.0, 0])[3:] = [gastos, cantidad]
+
+        guardados = {
+            dia: list(resto)
+            for dia, *resto in conn.execute("""
+                SELECT dia, ventas_total, ventas_cantidad, unidades, gastos_total, gastos_cantidad
+                FROM cierres_semanales_dia
+                WHERE cierre_id = ?
+            """, (cierre_id,))
+        }
+
+        campos = ("ventas_total", "ventas_cantidad", "unidades", "gastos_total", "gastos_cantidad")
+        for dia in sorted(set(reales) | set(guardados)):
+            real = reales.get(dia, [0.0, 0, 0, 0.0, 0])
+            guardado = guardados.get(dia, [0.0, 0, 0, 0.0, 0])
+            for campo, g, r in zip(campos, guardado, real):
+                if abs(g - r) > TOLERANCIA:
+                    diferencias.append((cierre_id, f"{dia} {campo}", g, r))
+
+        real_ventas = sum(r[0] for r in reales.values())
+        real_gastos = sum(r[3] for r in reales.values())
+        if abs(total_ventas - real_ventas) > TOLERANCIA:
+            diferencias.append((cierre_id, "total_ventas", total_ventas, real_ventas))
+        if abs(total_gastos - real_gastos) > TOLERANCIA:
+            diferencias.append((cierre_id, "total_gastos", total_gastos, real_gastos))
+
+        productos_reales = dict(conn.execute("""
+            SELECT IFNULL(producto_id, 0), SUM(total)
+            FROM ventas
+            WHERE fecha >= ? AND fecha < date(?, '+1 day')
+            GROUP BY 1
+        """, (inicio, fin)).fetchall())
+        productos_guardados = dict(conn.execute("""
+            SELECT producto_id, ventas_total
+            FROM cierres_semanales_producto
+            WHERE cierre_id = ?
+        """, (cierre_id,)).fetchall())
+        for producto_id in sorted(set(productos_reales) | set(productos_guardados)):
+            g = productos_guardados.get(producto_id, 0.0)
+            r = productos_reales.get(producto_id, 0.0)
+            if abs(g - r) > TOLERANCIA:
+                diferencias.append((cierre_id, f"producto {producto_id}", g, r))
+
+    return diferencias
@@ -1,8 +1,25 @@
+import logging
+import os
+import queue
 import sqlite3
+import threading
+import time
+from concurrent.futures import Future
 
 def conectar():
     return sqlite3.connect("database.db")
 
+
+registro = logging.getLogger(__name__)
+
+
+class PoolAgotado(Exception):
+    pass
+
+
+class EscrituraDemorada(Exception):
+    pass
+
 def crear_tablas():
     conn = conectar()
     cursor = conn.cursor()
@@ -39,3 +56,379 @@ def crear_tablas():
 
     conn.commit()
     conn.close()
+
+
+# =========================
+# POOL DE CONEXIONES
+# =========================
+class PoolConexiones:
+    """Pool acotado de conexiones SQLite, uno por proceso (worker de gunicorn).
+
+    Las conexiones se crean con check_same_thread=False para que cualquier
+    hilo pueda reutilizar una conexión libre, pero cada una la usa un solo
+    hilo a la vez: se presta con obtener() y vuelve con devolver().
+
+    `tamano` es cuántas libres se conservan; `maximo`, cuántas puede haber
+    abiertas a la vez (prestadas + libres). Con todas prestadas, obtener()
+    espera hasta `espera` segundos a que vuelva una y si no, PoolAgotado.
+    """
+
+    def __init__(self, ruta, tamano=8, pragmas=None, factory=sqlite3.Connection,
+                 al_conectar=None, al_obtener=None, maximo=None, espera=10):
+        self.ruta = ruta
+        self.tamano = tamano
+        self.maximo = max(maximo or 2 * tamano, tamano)
+        self.espera = espera
+        self.pragmas = dict(pragmas or {})
+        self.factory = factory
+        # ganchos opcionales (métricas): al abrir una conexión nueva y en
+        # cada obtener(), con True si se reutilizó una libre
+        self.al_conectar = al_conectar
+        self.al_obtener = al_obtener
+        self._lock = threading.Lock()
+        self._reiniciar()
+
+    def _reiniciar(self):
+        # tras un fork las conexiones heredadas no se tocan: se descartan
+        self._pid = os.getpid()
+        self._libres = queue.LifoQueue(maxsize=self.tamano)
+        self._cupos = threading.BoundedSemaphore(self.maximo)
+        self.aciertos = 0
+        self.fallos = 0
+
+    def _verificar_proceso(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reiniciar()
+
+    def _nueva_conexion(self):
+        # se llama con un cupo ya tomado; si falla, se devuelve
+        try:
+            conn = sqlite3.connect(self.ruta, check_same_thread=False, factory=self.factory)
+            # PRAGMAs de conexión: se aplican una sola vez, al crearla
+            for nombre, valor in self.pragmas.items():
+                conn.execute(f"PRAGMA {nombre} = {valor}")
+            if self.al_conectar is not None:
+                self.al_conectar(conn)
+        except Exception:
+            self._cupos.release()
+            raise
+        return conn
+
+    def _cerrar(self, conn):
+        conn.close()
+        self._cupos.release()
+
+    def obtener(self):
+        self._verificar_proceso()
+        limite = time.monotonic() + self.espera
+        conn = None
+        while conn is None:
+            try:
+                conn = self._libres.get_nowait()
+            except queue.Empty:
+                if self._cupos.acquire(blocking=False):
+                    with self._lock:
+                        self.fallos += 1
+                    if self.al_obtener is not None:
+                        self.al_obtener(False)
+                    return self._nueva_conexion()
+                if time.monotonic() >= limite:
+                    raise PoolAgotado(f"las {self.maximo} conexiones están en uso")
+                # espera corta: puede volver una conexión o liberarse un cupo
+                try:
+                    conn = self._libres.get(timeout=0.05)
+                except queue.Empty:
+                    pass
+
+        with self._lock:
+            self.aciertos += 1
+        if self.al_obtener is not None:
+            self.al_obtener(True)
+        return conn
+
+    def devolver(self, conn, descartar=False):
+        if self._pid != os.getpid():
+            return
+
+        if not descartar and conn.in_transaction:
+            # nunca pasar una transacción abierta al siguiente request
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                descartar = True
+
+        if not descartar:
+            try:
+                self._libres.put_nowait(conn)
+                return
+            except queue.Full:
+                pass
+
+        self._cerrar(conn)
+
+    def cerrar(self):
+        while True:
+            try:
+                self._cerrar(self._libres.get_nowait())
+            except queue.Empty:
+                break
+
+    def estadisticas(self):
+        return {
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "libres": self._libres.qsize(),
+            "tamano": self.tamano,
+            "maximo": self.maximo,
+        }
+
+
+# =========================
+# PERFIL DE ALMACENAMIENTO (WAL)
+# =========================
+def aplicar_perfil_wal(conn):
+    # journal_mode es persistente: basta con fijarlo una vez en el archivo
+    modo = conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+    return modo.lower() == "wal"
+
+
+def checkpoint_wal(conn, modo="PASSIVE"):
+    # devuelve (ocupado, paginas_en_wal, paginas_copiadas)
+    if modo not in ("PASSIVE", "FULL", "RESTART", "TRUNCATE"):
+        raise ValueError(f"modo de checkpoint inválido: {modo}")
+    return conn.execute(f"PRAGMA wal_checkpoint({modo})").fetchone()
+
+
+class ProgramadorCheckpoint:
+    """Hilo de fondo que hace checkpoint del WAL según umbrales.
+
+    Cada `intervalo` segundos hace un checkpoint PASSIVE (no bloquea a nadie);
+    si el archivo -wal supera `max_bytes` intenta un TRUNCATE para recortarlo.
+    Después corre las `tareas(conn)` de mantenimiento que se le registren.
+    """
+
+    def __init__(self, pool, intervalo=60, max_bytes=64 * 1024 * 1024, tareas=()):
+        self.pool = pool
+        self.intervalo = intervalo
+        self.max_bytes = max_bytes
+        self.tareas = list(tareas)
+        self._pid = None
+        self._hilo = None
+        self._parar = threading.Event()
+        self._lock = threading.Lock()
+
+    def iniciar(self):
+        # idempotente por proceso: cada worker tiene su propio hilo
+        if self.intervalo <= 0 or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._parar = threading.Event()
+            self._hilo = threading.Thread(
+                target=self._bucle, name="wal-checkpoint", daemon=True
+            )
+            self._hilo.start()
+
+    def detener(self):
+        self._parar.set()
+
+    def tamano_wal(self):
+        try:
+            return os.path.getsize(self.pool.ruta + "-wal")
+        except OSError:
+            return 0
+
+    def ejecutar(self):
+        modo = "TRUNCATE" if self.tamano_wal() > self.max_bytes else "PASSIVE"
+        conn = self.pool.obtener()
+        try:
+            return checkpoint_wal(conn, modo)
+        except sqlite3.Error:
+            return None
+        finally:
+            self.pool.devolver(conn)
+
+    def mantenimiento(self):
+        conn = self.pool.obtener()
+        try:
+            for tarea in self.tareas:
+                try:
+                    tarea(conn)
+                except Exception:
+                    # una tarea que falla no frena a las demás ni al hilo
+                    conn.rollback()
+        finally:
+            self.pool.devolver(conn)
+
+    def pasada(self):
+        # una vuelta del hilo; nada de lo que falle acá lo puede terminar
+        try:
+            self.ejecutar()
+            if self.tareas:
+                self.mantenimiento()
+        except PoolAgotado:
+            # pool ocupado por los requests: se reintenta en la próxima vuelta
+            registro.info("checkpoint omitido: pool sin conexiones libres")
+        except Exception:
+            registro.exception("falló una pasada de checkpoint/mantenimiento")
+
+    def _bucle(self):
+        while not self._parar.wait(self.intervalo):
+            self.pasada()
+
+
+# =========================
+# ESCRITURAS
+# =========================
+def en_transaccion(conn, aplicar, *args):
+    # aplicar(cursor, *args) dentro de su propia transacción de escritura
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        resultado = aplicar(cursor, *args)
+        cursor.execute("COMMIT")
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+    return resultado
+
+
+class EscritorAgrupado:
+    """Hilo escritor que agrupa varias escrituras en un mismo COMMIT.
+
+    Los requests encolan aplicar(cursor, *args) y esperan su Future. El hilo
+    toma lo que haya en la cola (hasta `max_operaciones`, esperando además
+    hasta `intervalo_ms` desde la primera) y lo escribe en una sola transacción:
+    un lock de escritura y un commit por lote en vez de uno por request. Cada
+    operación corre en su propio SAVEPOINT, así un rechazo (p. ej. sin stock)
+    no arrastra a las demás. Los Future se resuelven recién después del COMMIT.
+    """
+
+    def __init__(self, pool, intervalo_ms=0, max_operaciones=200,
+                 max_cola=10_000, al_confirmar=None):
+        self.pool = pool
+        self.intervalo = intervalo_ms / 1000
+        self.max_operaciones = max_operaciones
+        self.al_confirmar = al_confirmar
+        self._cola = queue.Queue(max_cola)
+        self._pid = None
+        self._hilo = None
+        self._lock = threading.Lock()
+
+    def iniciar(self):
+        # idempotente por proceso, igual que ProgramadorCheckpoint
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._cola = queue.Queue(self._cola.maxsize)
+            self._hilo = threading.Thread(
+                target=self._bucle, name="escritor-agrupado", daemon=True
+            )
+            self._hilo.start()
+
+    def detener(self):
+        # lo ya encolado se escribe antes de terminar
+        if self.activo:
+            self._cola.put(None)
+            self._hilo.join()
+
+    @property
+    def activo(self):
+        return (
+            self._pid == os.getpid()
+            and self._hilo is not None
+            and self._hilo.is_alive()
+        )
+
+    def enviar(self, aplicar, *args):
+        # queue.Full si la cola está llena: el que llama decide qué hacer
+        futuro = Future()
+        self._cola.put_nowait((aplicar, args, futuro))
+        return futuro
+
+    def _juntar_lote(self):
+        primero = self._cola.get()
+        if primero is None:
+            return None
+        lote = [primero]
+        limite = time.monotonic() + self.intervalo
+        while len(lote) < self.max_operaciones:
+            try:
+                restante = limite - time.monotonic()
+                operacion = (
+                    self._cola.get(timeout=restante) if restante > 0
+                    else self._cola.get_nowait()
+                )
+            except queue.Empty:
+                break
+            if operacion is None:
+                # terminar después de este lote
+                self._cola.put(None)
+                break
+            lote.append(operacion)
+        return lote
+
+    def _bucle(self):
+        while True:
+            lote = self._juntar_lote()
+            if lote is None:
+                return
+            try:
+                self._escribir(lote)
+            except Exception as e:
+                # falló el lote (lock, disco, ...): sus operaciones no quedaron
+                # escritas, pero el hilo sigue con el próximo
+                self._fallar(lote, e)
+
+    @staticmethod
+    def _fallar(lote, error):
+        for _, _, futuro in lote:
+            # ya resueltas antes del error, o canceladas por quien esperaba
+            if futuro.done():
+                continue
+            if futuro.running() or futuro.set_running_or_notify_cancel():
+                futuro.set_exception(error)
+
+    def _escribir(self, lote):
+        inicio = time.perf_counter()
+        resultados = []
+        conn = self.pool.obtener()
+        descartar = False
+        try:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            for aplicar, args, futuro in lote:
+                if not futuro.set_running_or_notify_cancel():
+                    continue
+                cursor.execute("SAVEPOINT operacion")
+                try:
+                    resultados.append((futuro, aplicar(cursor, *args), None))
+                except Exception as e:
+                    cursor.execute("ROLLBACK TO operacion")
+                    resultados.append((futuro, None, e))
+                cursor.execute("RELEASE operacion")
+            cursor.execute("COMMIT")
+        except Exception:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                descartar = True
+            raise
+        finally:
+            self.pool.devolver(conn, descartar=descartar)
+
+        for futuro, resultado, error in resultados:
+            if error is None:
+                futuro.set_result(resultado)
+            else:
+                futuro.set_exception(error)
+
+        if self.al_confirmar is not None:
+            self.al_confirmar(len(lote), time.perf_counter() - inicio)
@@ -0,0 +1,282 @@
+import csv
+from datetime import datetime
+from typing import NamedTuple
+
+from .reports.cache import sellar_version
+from .resumen import reconstruir_resumen_diario
+
+# =========================
+# IMPORTACIÓN MASIVA (CSV)
+# =========================
+# El archivo se lee fila por fila (csv.DictReader sobre el stream, nunca
+# entero en memoria) y se inserta con executemany en lotes de `tamano_lote`
+# filas, un commit por lote. Los nombres de productos y usuarios se resuelven
+# con un dict cargado al empezar (unas pocas filas, no crece con el archivo).
+# Las filas inválidas no frenan la importación: se cuentan y se guardan las
+# primeras MAX_ERRORES con su número de línea.
+#
+# Columnas (con encabezado; las marcadas con ? son opcionales):
+#   productos: nombre, precio, stock?
+#   ventas:    fecha, producto, cantidad, total?, usuario?
+#   gastos:    fecha, descripcion, monto, usuario?
+# Las ventas importadas son historia: no descuentan stock. Sin total se usa
+# el precio actual del producto; sin usuario, el que importa.
+#
+# Con diferir=True (solo desde la línea de comandos, con la app detenida) se
+# quitan los índices y triggers de ventas/gastos durante la carga y se
+# reconstruyen una vez al final (resumen diario y versiones de reportes).
+#
+# Con `periodos` (un PeriodosCerrados) las ventas y gastos con fecha dentro
+# de una semana cerrada se rechazan; se validan de a un lote por vez.
+
+MAX_ERRORES = 100
+TAMANO_LOTE = 5000
+
+# las mismas formas que escribe la app (ventas con hora, gastos sin)
+FORMATOS_FECHA = ("%Y-%m-%d %H:%M", "%Y-%m-%d")
+
+TABLAS_MANTENIMIENTO = ("ventas", "gastos")
+
+# posición de la fecha en la tupla del INSERT
+POSICION_FECHA = {"ventas": 3, "gastos": 2}
+
+
+COLUMNAS = {
+    "productos": ("nombre", "precio"),
+    "ventas": ("fecha", "producto", "cantidad"),
+    "gastos": ("fecha", "descripcion", "monto"),
+}
+
+
+class FilaInvalida(Exception):
+    pass
+
+
+class ArchivoInvalido(Exception):
+    pass
+
+
+class ResultadoImportacion(NamedTuple):
+    leidas: int
+    insertadas: int
+    cantidad_errores: int
+    errores: list      # [(línea, mensaje)], a lo sumo MAX_ERRORES
+
+
+def _texto(fila, campo, obligatorio=True):
+    valor = (fila.get(campo) or "").strip()
+    if obligatorio and not valor:
+        raise FilaInvalida(f"falta {campo}")
+    return valor
+
+
+def _numero(fila, campo, tipo=float, obligatorio=True, minimo=None):
+    valor = _texto(fila, campo, obligatorio)
+    if not valor:
+        return None
+    try:
+        numero = tipo(valor.replace(",", ".") if tipo is float else valor)
+    except ValueError:
+        raise FilaInvalida(f"{campo} no es un número: {valor!r}")
+    if minimo is not None and numero < minimo:
+        raise FilaInvalida(f"{campo} debe ser al menos {minimo}")
+    return numero
+
+
+def _fecha(fila):
+    valor = _texto(fila, "fecha")
+    for formato in FORMATOS_FECHA:
+        try:
+            # normalizada: SQLite solo entiende fechas con ceros a la izquierda
+            return datetime.strptime(valor, formato).strftime(formato)
+        except ValueError:
+            pass
+    raise FilaInvalida(f"fecha inválida (YYYY-MM-DD [HH:MM]): {valor!r}")
+
+
+class Importador:
+    def __init__(self, conn, usuario_id, tamano_lote=TAMANO_LOTE, al_avanzar=None,
+                 periodos=None):
+        self.conn = conn
+        self.usuario_id = usuario_id
+        self.tamano_lote = tamano_lote
+        self.al_avanzar = al_avanzar
+        self.periodos = periodos
+        self.productos = {
+            nombre: (id_, precio)
+            for id_, nombre, precio in conn.execute("SELECT id, nombre, precio FROM productos")
+        }
+        self.usuarios = dict(conn.execute("SELECT nombre, id FROM usuarios"))
+
+    # --- conversión de una fila del CSV a la tupla del INSERT ---
+
+    def _usuario(self, fila):
+        nombre = _texto(fila, "usuario", obligatorio=False)
+        if not nombre:
+            return self.usuario_id
+        if nombre not in self.usuarios:
+            raise FilaInvalida(f"usuario desconocido: {nombre!r}")
+        return self.usuarios[nombre]
+
+    def fila_producto(self, fila):
+        nombre = _texto(fila, "nombre")
+        if nombre in self.productos:
+            raise FilaInvalida(f"el producto {nombre!r} ya existe")
+        precio = _numero(fila, "precio", minimo=0)
+        stock = _numero(fila, "stock", int, obligatorio=False, minimo=0) or 0
+        # reservado ya: un nombre repetido dentro del mismo archivo es error
+        self.productos[nombre] = (None, precio)
+        return (nombre, precio, stock)
+
+    def fila_venta(self, fila):
+        fecha = _fecha(fila)
+        nombre = _texto(fila, "producto")
+        if nombre not in self.productos:
+            raise FilaInvalida(f"producto desconocido: {nombre!r}")
+        producto_id, precio = self.productos[nombre]
+        cantidad = _numero(fila, "cantidad", int, minimo=1)
+        total = _numero(fila, "total", obligatorio=False, minimo=0)
+        if total is None:
+            total = precio * cantidad
+        return (producto_id, cantidad, total, fecha, self._usuario(fila))
+
+    def fila_gasto(self, fila):
+        fecha = _fecha(fila)
+        descripcion = _texto(fila, "descripcion")
+        monto = _numero(fila, "monto", minimo=0)
+        return (descripcion, monto, fecha, self._usuario(fila))
+
+    # --- carga ---
+
+    def _separar_cerradas(self, tipo, lote, lineas):
+        # (lote sin las filas de semanas cerradas, [(línea, mensaje)] rechazadas)
+        if self.periodos is None or tipo not in POSICION_FECHA:
+            return lote, []
+        posicion = POSICION_FECHA[tipo]
+        cerradas = self.periodos.cerradas(self.conn, [f[posicion] for f in lote])
+        if not any(cerradas):
+            return lote, []
+        return (
+            [f for f, cerrada in zip(lote, cerradas) if not cerrada],
+            [(linea, f"la fecha {f[posicion]} está en una semana cerrada")
+             for f, linea, cerrada in zip(lote, lineas, cerradas) if cerrada],
+        )
+
+    def _insertar(self, tipo, lote):
+        cursor = self.conn.cursor()
+        if tipo == "productos":
+            cursor.executemany(
+                "INSERT INTO productos (nombre, precio, stock) VALUES (?, ?, ?)", lote
+            )
+            # los productos nuevos ya pueden usarse en ventas del mismo proceso
+            nombres = [f[0] for f in lote]
+            marcas = ", ".join("?" for _ in nombres)
+            for id_, nombre, precio in cursor.execute(
+                f"SELECT id, nombre, precio FROM productos WHERE nombre IN ({marcas})", nombres
+            ).fetchall():
+                self.productos[nombre] = (id_, precio)
+        elif tipo == "ventas":
+            cursor.executemany("""
+                INSERT INTO ventas (producto_id, cantidad, total, fecha, usuario_id)
+                VALUES (?, ?, ?, ?, ?)
+            """, lote)
+        else:
+            cursor.executemany("""
+                INSERT INTO gastos (descripcion, monto, fecha, usuario_id)
+                VALUES (?, ?, ?, ?)
+            """, lote)
+        self.conn.commit()
+
+    def importar(self, tipo, archivo):
+        convertir = {
+            "productos": self.fila_producto,
+            "ventas": self.fila_venta,
+            "gastos": self.fila_gasto,
+        }[tipo]
+
+        lector = csv.DictReader(archivo)
+        faltan = [c for c in COLUMNAS[tipo] if c not in (lector.fieldnames or ())]
+        if faltan:
+            raise ArchivoInvalido("faltan columnas: " + ", ".join(faltan))
+
+        lote, lineas = [], []
+        leidas = insertadas = cantidad_errores = 0
+        errores = []
+
+        def anotar(linea, mensaje):
+            nonlocal cantidad_errores
+            cantidad_errores += 1
+            if len(errores) < MAX_ERRORES:
+                errores.append((linea, mensaje))
+
+        def cargar(lote, lineas):
+            lote, rechazadas = self._separar_cerradas(tipo, lote, lineas)
+            for linea, mensaje in rechazadas:
+                anotar(linea, mensaje)
+            if lote:
+                self._insertar(tipo, lote)
+            return len(lote)
+
+        for fila in lector:
+            leidas += 1
+            try:
+                lote.append(convertir(fila))
+            except FilaInvalida as e:
+                anotar(lector.line_num, str(e))
+                continue
+            lineas.append(lector.line_num)
+
+            if len(lote) >= self.tamano_lote:
+                insertadas += cargar(lote, lineas)
+                lote, lineas = [], []
+                if self.al_avanzar is not None:
+                    self.al_avanzar(leidas, insertadas, cantidad_errores)
+
+        if lote:
+            insertadas += cargar(lote, lineas)
+        if self.al_avanzar is not None:
+            self.al_avanzar(leidas, insertadas, cantidad_errores)
+
+        return ResultadoImportacion(leidas, insertadas, cantidad_errores, errores)
+
+
+# =========================
+# MANTENIMIENTO DIFERIDO
+# =========================
+def quitar_mantenimiento(conn):
+    # guarda y borra índices y triggers de ventas/gastos; devuelve su SQL
+    marcas = ", ".join("?" for _ in TABLAS_MANTENIMIENTO)
+    definiciones = conn.execute(f"""
+        SELECT type, name, sql FROM sqlite_master
+        WHERE type IN ('index', 'trigger') AND sql IS NOT NULL
+          AND tbl_name IN ({marcas})
+    """, TABLAS_MANTENIMIENTO).fetchall()
+
+    for tipo, nombre, _ in definiciones:
+        conn.execute(f"DROP {tipo.upper()} {nombre}")
+    conn.commit()
+    return definiciones
+
+
+def restaurar_mantenimiento(conn, definiciones):
+    for _, _, sql in definiciones:
+        conn.execute(sql)
+    conn.commit()
+
+    reconstruir_resumen_diario(conn)
+    # no se sabe qué días tocó la carga: invalidar todos los reportes
+    sellar_version(conn)
+    conn.commit()
+
+
+def importar_csv(conn, tipo, archivo, usuario_id, tamano_lote=TAMANO_LOTE,
+                 al_avanzar=None, diferir=False, periodos=None):
+    importador = Importador(conn, usuario_id, tamano_lote, al_avanzar, periodos)
+    if not diferir:
+        return importador.importar(tipo, archivo)
+
+    definiciones = quitar_mantenimiento(conn)
+    try:
+        return importador.importar(tipo, archivo)
+    finally:
+        restaurar_mantenimiento(conn, definiciones)
@@ -0,0 +1,113 @@
+import os
+from time import perf_counter
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+
+# =========================
+# MÉTRICAS (PROMETHEUS)
+# =========================
+# Con varios workers de gunicorn cada proceso lleva sus propios contadores.
+# Si PROMETHEUS_MULTIPROC_DIR apunta a un directorio vacío al arrancar,
+# prometheus_client escribe las métricas de cada proceso en archivos mmap de
+# ese directorio y /metrics las suma todas (también las de los procesos de
+# exportación en segundo plano, que heredan la variable). Solo se usan
+# contadores e histogramas, que no necesitan limpieza al morir un worker.
+
+LATENCIA_REQUEST = Histogram(
+    "controlsimple_request_duracion_segundos",
+    "Duración de los requests por endpoint de Flask",
+    ["endpoint", "metodo", "estado"],
+)
+
+CONEXIONES_DB = Counter(
+    "controlsimple_db_conexiones_total",
+    "Conexiones pedidas al pool (acierto = reutilizada, fallo = nueva)",
+    ["resultado"],
+)
+
+CONSULTAS_DB = Counter(
+    "controlsimple_db_consultas_total",
+    "Sentencias SQL ejecutadas",
+)
+
+RENDER_REPORTE = Histogram(
+    "controlsimple_reporte_render_segundos",
+    "Tiempo de consulta + generación de un reporte",
+    ["formato"],
+)
+
+TAMANO_REPORTE = Histogram(
+    "controlsimple_reporte_bytes",
+    "Tamaño del reporte generado",
+    ["formato"],
+    buckets=(10e3, 50e3, 100e3, 500e3, 1e6, 5e6, 10e6, 50e6, 100e6),
+)
+
+CACHE_REPORTES = Counter(
+    "controlsimple_reportes_cache_total",
+    "Búsquedas en la cache de reportes",
+    ["resultado"],
+)
+
+LOTE_ESCRITURA = Histogram(
+    "controlsimple_escritura_lote_operaciones",
+    "Operaciones confirmadas por COMMIT en el escritor agrupado",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+
+COMMIT_ESCRITURA = Histogram(
+    "controlsimple_escritura_lote_segundos",
+    "Duración de cada lote del escritor agrupado (BEGIN a COMMIT)",
+)
+
+
+def contar_conexion(acierto):
+    CONEXIONES_DB.labels("acierto" if acierto else "fallo").inc()
+
+
+def contar_consulta(sql):
+    # las sentencias internas de los triggers llegan como "-- TRIGGER ..."
+    if not sql.startswith("--"):
+        CONSULTAS_DB.inc()
+
+
+def instrumentar_conexion(conn):
+    conn.set_trace_callback(contar_consulta)
+
+
+def medir_lote(operaciones, segundos):
+    LOTE_ESCRITURA.observe(operaciones)
+    COMMIT_ESCRITURA.observe(segundos)
+
+
+def contar_cache(acierto):
+    CACHE_REPORTES.labels("acierto" if acierto else "fallo").inc()
+
+
+def generar_reporte_medido(formato, generador, data):
+    inicio = perf_counter()
+    archivo = generador(data)
+    RENDER_REPORTE.labels(formato).observe(perf_counter() - inicio)
+
+    archivo.seek(0, os.SEEK_END)
+    TAMANO_REPORTE.labels(formato).observe(archivo.tell())
+    archivo.seek(0)
+    return archivo
+
+
+def exponer():
+    # devuelve (cuerpo, content-type) para /metrics
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registro = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registro)
+    else:
+        registro = REGISTRY
+    return generate_latest(registro), CONTENT_TYPE_LATEST
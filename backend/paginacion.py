@@ -0,0 +1,101 @@
+import base64
+import binascii
+import json
+from typing import NamedTuple
+
+# =========================
+# PAGINACIÓN KEYSET
+# =========================
+# En vez de OFFSET (que recorre todo lo anterior) cada página arranca donde
+# terminó la otra: WHERE (clave) < (última clave vista). Con un índice sobre
+# la clave el costo de una página no depende del tamaño de la tabla.
+
+
+class Pagina(NamedTuple):
+    filas: list
+    siguiente: str   # cursor para la página siguiente (más antigua) o None
+    anterior: str    # cursor para la página anterior (más nueva) o None
+
+
+def codificar_cursor(valores):
+    texto = json.dumps(list(valores), separators=(",", ":"))
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor, largo):
+    if not cursor:
+        return None
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+    except (binascii.Error, ValueError):
+        return None
+    if not isinstance(valores, list) or len(valores) != largo:
+        return None
+    # solo valores que SQLite pueda comparar contra la clave (bool es un int
+    # para isinstance, pero ninguna clave lo es)
+    if not all(isinstance(v, (int, float, str)) and not isinstance(v, bool) for v in valores):
+        return None
+    return valores
+
+
+def leer_pagina(conn, consulta, condiciones, params, claves, posiciones,
+                antes=None, despues=None, tamano=50):
+    """Lee una página ordenada por `claves` descendente.
+
+    consulta: SELECT ... FROM ... sin WHERE ni ORDER BY.
+    claves: columnas SQL de la clave (únicas en conjunto, p. ej. v.id).
+    posiciones: índice de cada clave dentro de las filas devueltas.
+    antes / despues: cursores recibidos en la URL.
+    """
+    condiciones = list(condiciones)
+    params = list(params)
+    tupla = "(" + ", ".join(claves) + ")"
+    marcas = "(" + ", ".join("?" for _ in claves) + ")"
+
+    valores_despues = decodificar_cursor(despues, len(claves))
+    valores_antes = decodificar_cursor(antes, len(claves))
+
+    # con clave compuesta se repite la primera columna sola: el planificador
+    # no usa la comparación de tuplas como rango del índice, pero sí esta
+    if valores_despues is not None:
+        # página anterior: se lee hacia arriba y se invierte
+        condiciones.append(f"{tupla} > {marcas}")
+        params.extend(valores_despues)
+        if len(claves) > 1:
+            condiciones.append(f"{claves[0]} >= ?")
+            params.append(valores_despues[0])
+        orden = "ASC"
+    else:
+        if valores_antes is not None:
+            condiciones.append(f"{tupla} < {marcas}")
+            params.extend(valores_antes)
+            if len(claves) > 1:
+                condiciones.append(f"{claves[0]} <= ?")
+                params.append(valores_antes[0])
+        orden = "DESC"
+
+    sql = consulta
+    if condiciones:
+        sql += " WHERE " + " AND ".join(condiciones)
+    sql += " ORDER BY " + ", ".join(f"{c} {orden}" for c in claves) + " LIMIT ?"
+    params.append(tamano + 1)
+
+    filas = conn.execute(sql, params).fetchall()
+    hay_mas = len(filas) > tamano
+    filas = filas[:tamano]
+
+    if valores_despues is not None:
+        filas.reverse()
+        hay_siguiente, hay_anterior = True, hay_mas
+    else:
+        hay_siguiente, hay_anterior = hay_mas, valores_antes is not None
+
+    def cursor_de(fila):
+        return codificar_cursor(fila[i] for i in posiciones)
+
+    return Pagina(
+        filas=filas,
+        siguiente=cursor_de(filas[-1]) if filas and hay_siguiente else None,
+        anterior=cursor_de(filas[0]) if filas and hay_anterior else None,
+    )
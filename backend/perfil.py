@@ -0,0 +1,136 @@
+import random
+import sqlite3
+from time import perf_counter
+
+# =========================
+# PERFIL DE SQL POR REQUEST
+# =========================
+# Las conexiones del pool son ConexionPerfilada. Mientras no tengan un perfil
+# asignado se comportan como una conexión normal (los cursores son
+# sqlite3.Cursor, sin costo extra). En los requests muestreados la conexión
+# recibe un PerfilSQL y sus cursores miden cada sentencia: tiempo de
+# ejecución + lectura y filas devueltas.
+
+SENTENCIAS_EXPLICABLES = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+
+class PerfilSQL:
+    def __init__(self):
+        self.consultas = []
+
+    def registrar(self, sql, params):
+        registro = {"sql": sql, "params": params, "segundos": 0.0, "filas": 0}
+        self.consultas.append(registro)
+        return registro
+
+    @property
+    def cantidad(self):
+        return len(self.consultas)
+
+    @property
+    def segundos(self):
+        return sum(r["segundos"] for r in self.consultas)
+
+    def lentas(self, umbral_segundos):
+        return [r for r in self.consultas if r["segundos"] >= umbral_segundos]
+
+    def server_timing(self):
+        mas_lenta = max((r["segundos"] for r in self.consultas), default=0.0)
+        return (
+            f'db;dur={self.segundos * 1000:.2f};desc="{self.cantidad} consultas", '
+            f"db-max;dur={mas_lenta * 1000:.2f}"
+        )
+
+
+def muestrear(probabilidad):
+    return probabilidad >= 1 or (probabilidad > 0 and random.random() < probabilidad)
+
+
+def explicar(conn, registro):
+    sql = registro["sql"].lstrip()
+    if not sql.upper().startswith(SENTENCIAS_EXPLICABLES):
+        return []
+    try:
+        filas = sqlite3.Connection.execute(
+            conn, "EXPLAIN QUERY PLAN " + sql, registro["params"]
+        ).fetchall()
+    except sqlite3.Error:
+        return []
+    return [f[-1] for f in filas]
+
+
+class CursorPerfilado(sqlite3.Cursor):
+    _registro = None
+
+    def _medir(self, metodo, *args):
+        inicio = perf_counter()
+        try:
+            return metodo(*args)
+        finally:
+            if self._registro is not None:
+                self._registro["segundos"] += perf_counter() - inicio
+
+    def execute(self, sql, params=()):
+        perfil = self.connection.perfil
+        if perfil is None:
+            self._registro = None
+            return super().execute(sql, params)
+        self._registro = perfil.registrar(sql, params)
+        resultado = self._medir(super().execute, sql, params)
+        if self.rowcount > 0:
+            self._registro["filas"] += self.rowcount
+        return resultado
+
+    def executemany(self, sql, secuencia):
+        perfil = self.connection.perfil
+        if perfil is None:
+            self._registro = None
+            return super().executemany(sql, secuencia)
+        self._registro = perfil.registrar(sql, None)
+        resultado = self._medir(super().executemany, sql, secuencia)
+        if self.rowcount > 0:
+            self._registro["filas"] += self.rowcount
+        return resultado
+
+    def fetchone(self):
+        fila = self._medir(super().fetchone)
+        if fila is not None and self._registro is not None:
+            self._registro["filas"] += 1
+        return fila
+
+    def fetchmany(self, size=None):
+        filas = self._medir(super().fetchmany, size or self.arraysize)
+        if self._registro is not None:
+            self._registro["filas"] += len(filas)
+        return filas
+
+    def fetchall(self):
+        filas = self._medir(super().fetchall)
+        if self._registro is not None:
+            self._registro["filas"] += len(filas)
+        return filas
+
+    def __next__(self):
+        fila = self._medir(super().__next__)
+        if self._registro is not None:
+            self._registro["filas"] += 1
+        return fila
+
+
+class ConexionPerfilada(sqlite3.Connection):
+    perfil = None
+
+    def cursor(self, factory=None):
+        if self.perfil is None:
+            return super().cursor(factory or sqlite3.Cursor)
+        return super().cursor(factory or CursorPerfilado)
+
+    def execute(self, sql, params=()):
+        if self.perfil is None:
+            return super().execute(sql, params)
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, secuencia):
+        if self.perfil is None:
+            return super().executemany(sql, secuencia)
+        return self.cursor().executemany(sql, secuencia)
@@ -0,0 +1,10 @@
+import os
+import tempfile
+
+# por encima de este tamaño el reporte pasa de memoria a un archivo temporal
+# anónimo (nombre único, se borra solo al cerrarse la respuesta)
+MAX_EN_MEMORIA = int(os.environ.get("REPORTE_MAX_MEMORIA_MB", 8)) * 1024 * 1024
+
+
+def archivo_reporte():
+    return tempfile.SpooledTemporaryFile(max_size=MAX_EN_MEMORIA, prefix="reporte_")
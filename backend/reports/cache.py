@@ -0,0 +1,175 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+
+# =========================
+# VERSIÓN DE DATOS POR DÍA
+# =========================
+# Cada escritura en ventas/gastos sella el día afectado con un número de
+# versión global creciente. La versión de un rango es el máximo de sus días:
+# cambia solo si se escribió algo dentro del rango. Las semanas cerradas en
+# cierres_semanales no admiten cambios, así que sus reportes no se invalidan.
+# La fila '*' se sella cuando cambia el nombre de un producto/usuario o se
+# borra uno, porque aparecen en cualquier reporte.
+
+_SELLAR = """
+    INSERT INTO versiones_datos (dia, version)
+    VALUES ({dia}, (SELECT IFNULL(MAX(version), 0) + 1 FROM versiones_datos))
+    ON CONFLICT (dia) DO UPDATE SET version = excluded.version;
+"""
+
+
+def _triggers_version(tabla):
+    nuevo = _SELLAR.format(dia="date(NEW.fecha)")
+    viejo = _SELLAR.format(dia="date(OLD.fecha)")
+    return f"""
+CREATE TRIGGER IF NOT EXISTS trg_{tabla}_version_ins AFTER INSERT ON {tabla}
+BEGIN {nuevo} END;
+
+CREATE TRIGGER IF NOT EXISTS trg_{tabla}_version_del AFTER DELETE ON {tabla}
+BEGIN {viejo} END;
+
+CREATE TRIGGER IF NOT EXISTS trg_{tabla}_version_upd AFTER UPDATE ON {tabla}
+BEGIN {viejo} {nuevo} END;
+"""
+
+
+def _trigger_nombres(tabla):
+    # el de UPDATE se recrea: las bases anteriores lo tienen sin el WHEN
+    todos = _SELLAR.format(dia="'*'")
+    return f"""
+DROP TRIGGER IF EXISTS trg_{tabla}_version_nombre;
+CREATE TRIGGER trg_{tabla}_version_nombre AFTER UPDATE OF nombre ON {tabla}
+WHEN OLD.nombre IS NOT NEW.nombre
+BEGIN {todos} END;
+
+CREATE TRIGGER IF NOT EXISTS trg_{tabla}_version_baja AFTER DELETE ON {tabla}
+BEGIN {todos} END;
+"""
+
+
+VERSIONES = """
+CREATE TABLE IF NOT EXISTS versiones_datos (
+    dia TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_versiones_datos_version ON versiones_datos (version);
+""" + (
+    _triggers_version("ventas")
+    + _triggers_version("gastos")
+    + _trigger_nombres("productos")
+    + _trigger_nombres("usuarios")
+)
+
+
+def crear_versiones(conn):
+    conn.executescript(VERSIONES)
+
+
+def sellar_version(conn, dia="*"):
+    # sin dia: invalida todos los reportes (como un cambio de nombres)
+    conn.execute(_SELLAR.format(dia="?"), (dia,))
+
+
+def version_datos(conn, desde, hasta):
+    return conn.execute("""
+        SELECT MAX(
+            (SELECT IFNULL(MAX(version), 0) FROM versiones_datos
+             WHERE dia >= ? AND dia <= ?),
+            (SELECT IFNULL(MAX(version), 0) FROM versiones_datos
+             WHERE dia = '*')
+        )
+    """, (desde, hasta)).fetchone()[0]
+
+
+# =========================
+# CACHE DE REPORTES EN DISCO
+# =========================
+class CacheReportes:
+    """Reportes ya generados, guardados en disco por el hash de su clave.
+
+    La clave es (formato, desde, hasta, versión de datos), así que una entrada
+    nunca queda desactualizada: al cambiar los datos cambia la clave. El hash
+    sirve también como ETag. Se expulsa por LRU (mtime) cuando el total en
+    disco supera max_bytes; el directorio se comparte entre workers.
+    """
+
+    def __init__(self, directorio, max_bytes=256 * 1024 * 1024):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self.aciertos = 0
+        self.fallos = 0
+        self._lock = threading.Lock()
+
+    def clave(self, formato, desde, hasta, version):
+        texto = f"{formato}:{desde}:{hasta}:{version}"
+        return hashlib.sha256(texto.encode()).hexdigest()[:32]
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, clave)
+
+    def abrir(self, clave):
+        ruta = self._ruta(clave)
+        try:
+            archivo = open(ruta, "rb")
+        except FileNotFoundError:
+            with self._lock:
+                self.fallos += 1
+            return None
+
+        # marcar como usado recientemente (LRU)
+        try:
+            os.utime(ruta)
+        except OSError:
+            pass
+
+        with self._lock:
+            self.aciertos += 1
+        return archivo
+
+    def guardar(self, clave, archivo):
+        os.makedirs(self.directorio, exist_ok=True)
+
+        # escribir a un temporal y renombrar: otro worker nunca ve un archivo a medias
+        fd, temporal = tempfile.mkstemp(dir=self.directorio, prefix=".tmp_")
+        try:
+            with os.fdopen(fd, "wb") as destino:
+                shutil.copyfileobj(archivo, destino)
+            os.replace(temporal, self._ruta(clave))
+        except OSError:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+        finally:
+            archivo.seek(0)
+
+        self.expulsar()
+
+    def expulsar(self):
+        entradas = []
+        total = 0
+        try:
+            with os.scandir(self.directorio) as it:
+                for e in it:
+                    if e.name.startswith(".tmp_") or not e.is_file():
+                        continue
+                    st = e.stat()
+                    entradas.append((st.st_mtime, st.st_size, e.path))
+                    total += st.st_size
+        except FileNotFoundError:
+            return
+
+        entradas.sort()
+        for _, tamano, ruta in entradas:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(ruta)
+            except OSError:
+                continue
+            total -= tamano
+
+    def estadisticas(self):
+        return {"aciertos": self.aciertos, "fallos": self.fallos}
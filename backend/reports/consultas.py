@@ -0,0 +1,254 @@
+from functools import cached_property
+
+from ..busqueda import filtro_por_nombre
+from ..cierres import Descomposicion
+from ..paginacion import leer_pagina
+
+# =========================
+# CONSULTAS DE REPORTES
+# =========================
+# Un solo lugar para las consultas de un período: la pantalla de reportes,
+# el historial y las exportaciones usan la conexión del request y cada
+# consulta corre a lo sumo una vez. Los totales salen de los cierres
+# semanales congelados más resumen_diario para los días abiertos; el
+# detalle se entrega como generador y la consulta recién corre cuando alguien
+# lo recorre (plantilla o exportador), sin materializar listas intermedias.
+
+VENTAS_DETALLE = """
+    SELECT p.nombre, v.cantidad, v.total, v.fecha, u.nombre
+    FROM ventas v
+    JOIN productos p ON p.id = v.producto_id
+    JOIN usuarios u ON u.id = v.usuario_id
+    WHERE v.fecha >= ? AND v.fecha < date(?, '+1 day')
+    ORDER BY v.fecha DESC
+"""
+
+GASTOS_DETALLE = """
+    SELECT g.descripcion, g.monto, g.fecha, u.nombre
+    FROM gastos g
+    JOIN usuarios u ON u.id = g.usuario_id
+    WHERE g.fecha >= ? AND g.fecha < date(?, '+1 day')
+    ORDER BY g.fecha DESC
+"""
+
+HISTORIAL = """
+    SELECT v.fecha, p.nombre, v.cantidad, v.total, u.nombre, v.id
+    FROM ventas v
+    JOIN productos p ON p.id = v.producto_id
+    JOIN usuarios u ON u.id = v.usuario_id
+"""
+
+# exportación en texto (CSV / NDJSON): cronológica, con ids para conciliar
+EXPORTAR_VENTAS = """
+    SELECT v.id, v.fecha, p.nombre, v.cantidad, v.total, u.nombre, v.ticket_id
+    FROM ventas v
+    LEFT JOIN productos p ON p.id = v.producto_id
+    LEFT JOIN usuarios u ON u.id = v.usuario_id
+"""
+
+EXPORTAR_GASTOS = """
+    SELECT g.id, g.fecha, g.descripcion, g.monto, u.nombre
+    FROM gastos g
+    LEFT JOIN usuarios u ON u.id = g.usuario_id
+"""
+
+COLUMNAS_EXPORTAR_VENTAS = ("id", "fecha", "producto", "cantidad", "total", "usuario", "ticket_id")
+COLUMNAS_EXPORTAR_GASTOS = ("id", "fecha", "descripcion", "monto", "usuario")
+
+# API JSON: campo → (expresión SQL, JOIN que necesita). Solo se consultan
+# (y solo se unen las tablas de) los campos pedidos con ?campos=
+CAMPOS_LISTADO = {
+    "ventas": {
+        "id": ("v.id", None),
+        "fecha": ("v.fecha", None),
+        "producto_id": ("v.producto_id", None),
+        "producto": ("p.nombre", "LEFT JOIN productos p ON p.id = v.producto_id"),
+        "cantidad": ("v.cantidad", None),
+        "total": ("v.total", None),
+        "usuario": ("u.nombre", "LEFT JOIN usuarios u ON u.id = v.usuario_id"),
+        "ticket_id": ("v.ticket_id", None),
+    },
+    "gastos": {
+        "id": ("g.id", None),
+        "fecha": ("g.fecha", None),
+        "descripcion": ("g.descripcion", None),
+        "monto": ("g.monto", None),
+        "usuario": ("u.nombre", "LEFT JOIN usuarios u ON u.id = g.usuario_id"),
+    },
+}
+
+CLAVES_VENTA = ("producto", "cantidad", "total", "fecha", "usuario")
+CLAVES_GASTO = ("descripcion", "monto", "fecha", "usuario")
+CLAVES_HISTORIAL = ("fecha", "producto", "cantidad", "total", "usuario")
+
+
+def iterar_filas(cursor, claves, tamano=1000):
+    # recorre el cursor por bloques y entrega cada fila como dict
+    while True:
+        filas = cursor.fetchmany(tamano)
+        if not filas:
+            break
+        for r in filas:
+            yield dict(zip(claves, r))
+
+
+class ReporteConsulta:
+    def __init__(self, conn, desde=None, hasta=None):
+        self.conn = conn
+        self.desde = desde
+        self.hasta = hasta
+
+    @cached_property
+    def descomposicion(self):
+        return Descomposicion(self.conn, self.desde, self.hasta)
+
+    @cached_property
+    def totales(self):
+        if not self.desde or not self.hasta:
+            return 0.0, 0.0
+        return self.descomposicion.totales()
+
+    @property
+    def ventas(self):
+        return self.totales[0]
+
+    @property
+    def gastos(self):
+        return self.totales[1]
+
+    @property
+    def ganancia(self):
+        return self.ventas - self.gastos
+
+    def por_producto(self):
+        if not self.desde or not self.hasta:
+            return []
+        return [
+            dict(zip(("producto", "unidades", "total"), fila))
+            for fila in self.descomposicion.por_producto()
+        ]
+
+    def _detalle(self, sql, claves, limite):
+        # limite=None: todo el período (exports); si no, las más nuevas
+        params = [self.desde, self.hasta]
+        if limite is not None:
+            sql += " LIMIT ?"
+            params.append(limite)
+        yield from iterar_filas(self.conn.execute(sql, params), claves)
+
+    def ventas_detalle(self, limite=None):
+        return self._detalle(VENTAS_DETALLE, CLAVES_VENTA, limite)
+
+    def gastos_detalle(self, limite=None):
+        return self._detalle(GASTOS_DETALLE, CLAVES_GASTO, limite)
+
+    def _filtros(self, alias, producto=None, usuario=None):
+        # rango + nombres de producto/usuario, sobre ventas (v) o gastos (g)
+        condiciones = []
+        params = []
+
+        if self.desde and self.hasta:
+            condiciones.append(f"{alias}.fecha >= ? AND {alias}.fecha < date(?, '+1 day')")
+            params.extend([self.desde, self.hasta])
+
+        # los nombres se resuelven a ids con el índice FTS antes de tocar ventas
+        if producto:
+            condicion, valores = filtro_por_nombre(
+                self.conn, f"{alias}.producto_id", "productos", producto
+            )
+            condiciones.append(condicion)
+            params.extend(valores)
+
+        if usuario:
+            condicion, valores = filtro_por_nombre(
+                self.conn, f"{alias}.usuario_id", "usuarios", usuario
+            )
+            condiciones.append(condicion)
+            params.extend(valores)
+
+        return condiciones, params
+
+    def historial(self, producto=None, usuario=None, antes=None, despues=None, tamano=50):
+        condiciones, params = self._filtros("v", producto, usuario)
+
+        # paginado por (fecha, id): más nuevas primero, desempate por id
+        pagina = leer_pagina(
+            self.conn,
+            HISTORIAL,
+            condiciones,
+            params,
+            claves=("v.fecha", "v.id"),
+            posiciones=(0, 5),
+            antes=antes,
+            despues=despues,
+            tamano=tamano
+        )
+
+        return pagina._replace(
+            filas=[dict(zip(CLAVES_HISTORIAL, r)) for r in pagina.filas]
+        )
+
+    def listar(self, tipo, campos, producto=None, usuario=None, usuario_id=None,
+               antes=None, despues=None, tamano=50):
+        # página de ventas o gastos (más nuevos primero, por id) con solo los
+        # campos pedidos, como dicts
+        alias = "g" if tipo == "gastos" else "v"
+        disponibles = CAMPOS_LISTADO[tipo]
+        if tipo == "gastos":
+            producto = None
+
+        # el id va siempre primero: es la clave del cursor
+        columnas = [disponibles["id"][0]] + [disponibles[c][0] for c in campos]
+        joins = dict.fromkeys(disponibles[c][1] for c in campos if disponibles[c][1])
+        consulta = (
+            f"SELECT {', '.join(columnas)} FROM {tipo} {alias} " + " ".join(joins)
+        )
+
+        condiciones, params = self._filtros(alias, producto, usuario)
+        if usuario_id is not None:
+            condiciones.append(f"{alias}.usuario_id = ?")
+            params.append(usuario_id)
+
+        pagina = leer_pagina(
+            self.conn,
+            consulta,
+            condiciones,
+            params,
+            claves=(f"{alias}.id",),
+            posiciones=(0,),
+            antes=antes,
+            despues=despues,
+            tamano=tamano
+        )
+
+        return pagina._replace(
+            filas=[dict(zip(campos, r[1:])) for r in pagina.filas]
+        )
+
+    def exportar(self, tipo, producto=None, usuario=None):
+        # cursor abierto para recorrer con fetchmany: (columnas, cursor)
+        if tipo == "gastos":
+            # los gastos no tienen producto: ese filtro no aplica
+            consulta, columnas, alias = EXPORTAR_GASTOS, COLUMNAS_EXPORTAR_GASTOS, "g"
+            producto = None
+        else:
+            consulta, columnas, alias = EXPORTAR_VENTAS, COLUMNAS_EXPORTAR_VENTAS, "v"
+
+        condiciones, params = self._filtros(alias, producto, usuario)
+        sql = consulta
+        if condiciones:
+            sql += " WHERE " + " AND ".join(condiciones)
+        sql += f" ORDER BY {alias}.fecha, {alias}.id"
+        return columnas, self.conn.execute(sql, params)
+
+    def como_dict(self):
+        # formato que esperan generate_pdf / generate_excel
+        return {
+            "desde": self.desde,
+            "hasta": self.hasta,
+            "ventas": self.ventas,
+            "gastos": self.gastos,
+            "ganancia": self.ganancia,
+            "ventas_detalle": self.ventas_detalle(),
+            "gastos_detalle": self.gastos_detalle(),
+        }
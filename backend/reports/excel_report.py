@@ -1,41 +1,38 @@
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font
-import os
-from datetime import datetime
-from flask import send_file
-import io
+from .archivo import archivo_reporte
 
-def generate_excel(data):
-    buffer = io.BytesIO()
-    buffer.write(b"Reporte PDF")  # ejemplo
-    buffer.seek(0)
-    os.makedirs("tmp", exist_ok=True)
-    filename = f"reporte_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    path = os.path.join("tmp", filename)
+def _negrita(ws, valor):
+    cell = WriteOnlyCell(ws, value=valor)
+    cell.font = Font(bold=True)
+    return cell
 
-    wb = Workbook()
 
-    # HOJA RESUMEN
-    ws = wb.active
-    ws.title = "Resumen"
+def generate_excel(data):
+    # se genera en memoria (o en un temporal si crece) y se devuelve el archivo
+    # abierto y rebobinado, listo para send_file
+    buffer = archivo_reporte()
 
-    ws["A1"] = "Período"
-    ws["B1"] = f"{data['desde']} a {data['hasta']}"
-    ws["A3"] = "Ventas"
-    ws["B3"] = data["ventas"]
-    ws["A4"] = "Gastos"
-    ws["B4"] = data["gastos"]
-    ws["A5"] = "Ganancia"
-    ws["B5"] = data["ganancia"]
+    # write-only: las filas se vuelcan a disco a medida que llegan, así la
+    # memoria no crece con el tamaño del período (ventas_detalle y
+    # gastos_detalle pueden ser iteradores sobre un cursor)
+    wb = Workbook(write_only=True)
 
-    for cell in ["A1", "A3", "A4", "A5"]:
-        ws[cell].font = Font(bold=True)
+    # HOJA RESUMEN
+    ws = wb.create_sheet("Resumen")
+    ws.append([_negrita(ws, "Período"), f"{data['desde']} a {data['hasta']}"])
+    ws.append([])
+    ws.append([_negrita(ws, "Ventas"), data["ventas"]])
+    ws.append([_negrita(ws, "Gastos"), data["gastos"]])
+    ws.append([_negrita(ws, "Ganancia"), data["ganancia"]])
 
     # HOJA VENTAS
     ws_v = wb.create_sheet("Ventas")
-    ws_v.append(["Fecha", "Producto", "Cantidad", "Total", "Usuario"])
-    for cell in ws_v[1]:
-        cell.font = Font(bold=True)
+    ws_v.append([
+        _negrita(ws_v, titulo)
+        for titulo in ["Fecha", "Producto", "Cantidad", "Total", "Usuario"]
+    ])
 
     for v in data["ventas_detalle"]:
         ws_v.append([
@@ -48,9 +45,10 @@ def generate_excel(data):
 
     # HOJA GASTOS
     ws_g = wb.create_sheet("Gastos")
-    ws_g.append(["Fecha", "Descripción", "Monto", "Usuario"])
-    for cell in ws_g[1]:
-        cell.font = Font(bold=True)
+    ws_g.append([
+        _negrita(ws_g, titulo)
+        for titulo in ["Fecha", "Descripción", "Monto", "Usuario"]
+    ])
 
     for g in data["gastos_detalle"]:
         ws_g.append([
@@ -60,5 +58,6 @@ def generate_excel(data):
             g["usuario"]
         ])
 
-    wb.save(path)
-    return path
+    wb.save(buffer)
+    buffer.seek(0)
+    return buffer
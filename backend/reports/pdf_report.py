@@ -1,20 +1,14 @@
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
 from reportlab.lib.units import cm
-import os
-from datetime import datetime
-from flask import send_file
-import io
+from .archivo import archivo_reporte
 
 def generate_pdf(data):
-    buffer = io.BytesIO()
-    buffer.write(b"Reporte PDF")  # ejemplo
-    buffer.seek(0)
-    os.makedirs("tmp", exist_ok=True)
-    filename = f"reporte_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    path = os.path.join("tmp", filename)
+    # se genera en memoria (o en un temporal si crece) y se devuelve el archivo
+    # abierto y rebobinado, listo para send_file
+    buffer = archivo_reporte()
 
-    c = canvas.Canvas(path, pagesize=A4)
+    c = canvas.Canvas(buffer, pagesize=A4)
     width, height = A4
 
     y = height - 2 * cm
@@ -68,4 +62,5 @@ def generate_pdf(data):
 
     c.showPage()
     c.save()
-    return path
+    buffer.seek(0)
+    return buffer
@@ -0,0 +1,56 @@
+import csv
+import io
+import json
+import zlib
+
+# =========================
+# EXPORTACIÓN EN TEXTO (CSV / NDJSON)
+# =========================
+# Generadores que convierten un cursor abierto en bloques de bytes: se leen
+# BLOQUE filas por vez con fetchmany y cada bloque se entrega apenas está
+# listo, así la respuesta empieza a salir enseguida y la memoria no depende
+# del tamaño del rango. comprimir() aplica gzip sobre la marcha.
+
+BLOQUE = 2000
+
+
+def _bloques(cursor):
+    while True:
+        filas = cursor.fetchmany(BLOQUE)
+        if not filas:
+            break
+        yield filas
+
+
+def lineas_csv(columnas, cursor):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, lineterminator="\n")
+
+    escritor.writerow(columnas)
+    for filas in _bloques(cursor):
+        escritor.writerows(filas)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+    # solo el encabezado si no hubo filas
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def lineas_ndjson(columnas, cursor):
+    for filas in _bloques(cursor):
+        yield "".join(
+            json.dumps(dict(zip(columnas, f)), ensure_ascii=False) + "\n"
+            for f in filas
+        ).encode()
+
+
+def comprimir(bloques, nivel=6):
+    # wbits=31: formato gzip (con encabezado y CRC), no zlib crudo
+    compresor = zlib.compressobj(nivel, zlib.DEFLATED, 31)
+    for bloque in bloques:
+        comprimido = compresor.compress(bloque)
+        if comprimido:
+            yield comprimido
+    yield compresor.flush()
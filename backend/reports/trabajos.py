@@ -0,0 +1,272 @@
+import logging
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+from ..database import en_transaccion
+
+registro = logging.getLogger(__name__)
+
+# =========================
+# EXPORTACIONES EN SEGUNDO PLANO
+# =========================
+# Los reportes grandes se generan en un pool de procesos local para no
+# retener un worker de gunicorn. El estado vive en SQLite
+# (trabajos_exportacion), así cualquier worker puede responder el polling,
+# la descarga o la cancelación aunque el trabajo lo haya lanzado otro.
+
+PENDIENTE = "pendiente"
+EJECUTANDO = "ejecutando"
+LISTO = "listo"
+ERROR = "error"
+CANCELADO = "cancelado"
+
+ACTIVOS = (PENDIENTE, EJECUTANDO)
+
+# _terminar corre en un hilo del executor, que se traga sus excepciones
+REINTENTOS_ESTADO = 5
+ESPERA_REINTENTO = 0.2
+
+TABLA = """
+CREATE TABLE IF NOT EXISTS trabajos_exportacion (
+    id TEXT PRIMARY KEY,
+    usuario_id INTEGER NOT NULL,
+    formato TEXT NOT NULL,
+    desde TEXT NOT NULL,
+    hasta TEXT NOT NULL,
+    estado TEXT NOT NULL,
+    ruta TEXT,
+    error TEXT,
+    creado TEXT NOT NULL,
+    terminado TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_trabajos_usuario_estado
+    ON trabajos_exportacion (usuario_id, estado);
+"""
+
+
+def crear_tabla_trabajos(conn):
+    conn.executescript(TABLA)
+
+
+def _ahora():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _ejecutar_trabajo(trabajo_id, formato, desde, hasta, ruta):
+    # corre en el proceso hijo: importa la app ahí (contexto spawn)
+    from ..app import app, conectar, get_report_data
+    from ..metricas import generar_reporte_medido
+    from .excel_report import generate_excel
+    from .pdf_report import generate_pdf
+
+    generador = {"pdf": generate_pdf, "xlsx": generate_excel}[formato]
+
+    with app.app_context():
+        conn = conectar()
+
+        # se pudo cancelar mientras esperaba en la cola
+        cursor = conn.execute("""
+            UPDATE trabajos_exportacion SET estado = ?
+            WHERE id = ? AND estado = ?
+        """, (EJECUTANDO, trabajo_id, PENDIENTE))
+        conn.commit()
+        if cursor.rowcount == 0:
+            return None
+
+        archivo = generar_reporte_medido(formato, generador, get_report_data(desde, hasta))
+
+    temporal = ruta + ".parcial"
+    with archivo, open(temporal, "wb") as destino:
+        shutil.copyfileobj(archivo, destino)
+    os.replace(temporal, ruta)
+    return ruta
+
+
+class ColaExportaciones:
+    def __init__(self, pool, directorio, procesos=2, max_por_usuario=2, ttl_minutos=60):
+        self.pool = pool
+        self.directorio = directorio
+        self.procesos = procesos
+        self.max_por_usuario = max_por_usuario
+        self.ttl = timedelta(minutes=ttl_minutos)
+        self._pid = None
+        self._executor = None
+        self._futuros = {}
+        self._lock = threading.Lock()
+
+    def _obtener_executor(self):
+        # uno por worker; spawn evita heredar hilos y conexiones del padre
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._futuros = {}
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.procesos,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def _reservar(self, cursor, usuario_id, trabajo_id, formato, desde, hasta, ruta):
+        # contar e insertar bajo el mismo lock: dos pedidos simultáneos no
+        # pueden pasar los dos el límite
+        activos = cursor.execute("""
+            SELECT COUNT(*) FROM trabajos_exportacion
+            WHERE usuario_id = ? AND estado IN (?, ?)
+        """, (usuario_id, *ACTIVOS)).fetchone()[0]
+        if activos >= self.max_por_usuario:
+            return False
+
+        cursor.execute("""
+            INSERT INTO trabajos_exportacion
+            (id, usuario_id, formato, desde, hasta, estado, ruta, creado)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (trabajo_id, usuario_id, formato, desde, hasta, PENDIENTE, ruta, _ahora()))
+        return True
+
+    def crear(self, conn, usuario_id, formato, desde, hasta):
+        self.limpiar_vencidos(conn)
+
+        os.makedirs(self.directorio, exist_ok=True)
+        trabajo_id = uuid.uuid4().hex
+        ruta = os.path.join(self.directorio, f"{trabajo_id}.{formato}")
+
+        if not en_transaccion(
+            conn, self._reservar, usuario_id, trabajo_id, formato, desde, hasta, ruta
+        ):
+            return None
+
+        try:
+            futuro = self._obtener_executor().submit(
+                _ejecutar_trabajo, trabajo_id, formato, desde, hasta, ruta
+            )
+        except Exception as e:
+            # pool roto (BrokenProcessPool) o cerrado: el trabajo no va a
+            # correr, que no ocupe el cupo como pendiente y que el próximo
+            # pedido arme un executor nuevo
+            with self._lock:
+                self._pid = None
+            conn.execute("""
+                UPDATE trabajos_exportacion
+                SET estado = ?, error = ?, terminado = ?
+                WHERE id = ?
+            """, (ERROR, str(e) or type(e).__name__, _ahora(), trabajo_id))
+            conn.commit()
+            raise
+        with self._lock:
+            self._futuros[trabajo_id] = futuro
+        futuro.add_done_callback(lambda f: self._terminar(trabajo_id, f))
+        return trabajo_id
+
+    def _terminar(self, trabajo_id, futuro):
+        with self._lock:
+            self._futuros.pop(trabajo_id, None)
+
+        if futuro.cancelled():
+            estado, error = CANCELADO, None
+        elif futuro.exception() is not None:
+            estado, error = ERROR, str(futuro.exception())
+        elif futuro.result() is None:
+            return  # ya estaba cancelado en la tabla
+        else:
+            estado, error = LISTO, None
+
+        # sin conexión libre (PoolAgotado) o con la base bloqueada se
+        # reintenta; si nada alcanza queda en el log y limpiar_vencidos lo
+        # pasa a error cuando vence el TTL
+        for intento in range(1, REINTENTOS_ESTADO + 1):
+            try:
+                self._guardar_estado(trabajo_id, estado, error)
+                return
+            except Exception:
+                if intento == REINTENTOS_ESTADO:
+                    registro.exception(
+                        "no se pudo guardar el estado del trabajo %s", trabajo_id
+                    )
+                else:
+                    time.sleep(ESPERA_REINTENTO * intento)
+
+    def _guardar_estado(self, trabajo_id, estado, error):
+        conn = self.pool.obtener()
+        try:
+            cursor = conn.execute("""
+                UPDATE trabajos_exportacion
+                SET estado = ?, error = ?, terminado = ?
+                WHERE id = ? AND estado IN (?, ?)
+            """, (estado, error, _ahora(), trabajo_id, *ACTIVOS))
+            conn.commit()
+
+            # lo cancelaron mientras se generaba: el archivo sobra
+            if cursor.rowcount == 0:
+                fila = conn.execute(
+                    "SELECT ruta FROM trabajos_exportacion WHERE id = ?", (trabajo_id,)
+                ).fetchone()
+                if fila:
+                    _borrar(fila[0])
+        finally:
+            self.pool.devolver(conn)
+
+    def consultar(self, conn, trabajo_id, usuario_id):
+        fila = conn.execute("""
+            SELECT id, formato, desde, hasta, estado, ruta, error, creado, terminado
+            FROM trabajos_exportacion
+            WHERE id = ? AND usuario_id = ?
+        """, (trabajo_id, usuario_id)).fetchone()
+        if not fila:
+            return None
+
+        return dict(zip(
+            ("id", "formato", "desde", "hasta", "estado", "ruta", "error", "creado", "terminado"),
+            fila
+        ))
+
+    def cancelar(self, conn, trabajo_id, usuario_id):
+        cursor = conn.execute("""
+            UPDATE trabajos_exportacion
+            SET estado = ?, terminado = ?
+            WHERE id = ? AND usuario_id = ? AND estado IN (?, ?)
+        """, (CANCELADO, _ahora(), trabajo_id, usuario_id, *ACTIVOS))
+        conn.commit()
+
+        # si todavía está en la cola de este worker, sacarlo
+        with self._lock:
+            futuro = self._futuros.get(trabajo_id)
+        if futuro is not None:
+            futuro.cancel()
+
+        return cursor.rowcount > 0
+
+    def limpiar_vencidos(self, conn):
+        limite = (datetime.now() - self.ttl).strftime("%Y-%m-%d %H:%M:%S")
+
+        # activos más viejos que el TTL: su proceso murió (reinicio del worker)
+        conn.execute("""
+            UPDATE trabajos_exportacion
+            SET estado = ?, error = 'vencido', terminado = ?
+            WHERE estado IN (?, ?) AND creado < ?
+        """, (ERROR, _ahora(), *ACTIVOS, limite))
+        vencidos = conn.execute("""
+            SELECT id, ruta FROM trabajos_exportacion
+            WHERE estado NOT IN (?, ?) AND terminado < ?
+        """, (*ACTIVOS, limite)).fetchall()
+
+        for trabajo_id, ruta in vencidos:
+            _borrar(ruta)
+            conn.execute("DELETE FROM trabajos_exportacion WHERE id = ?", (trabajo_id,))
+        conn.commit()
+
+
+def _borrar(ruta):
+    if not ruta:
+        return
+    for r in (ruta, ruta + ".parcial"):
+        try:
+            os.remove(r)
+        except OSError:
+            pass
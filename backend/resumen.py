@@ -0,0 +1,216 @@
+# =========================
+# RESUMEN DIARIO (ROLLUP)
+# =========================
+# resumen_diario guarda por día los totales de ventas y gastos; las tablas
+# _producto y _usuario guardan el desglose. Los triggers sobre ventas/gastos
+# los mantienen al día en la misma transacción que la escritura, así que
+# cualquier camino de escritura (rutas, imports, consola) queda cubierto.
+from typing import NamedTuple
+
+from .cierres import Descomposicion
+
+TABLAS = """
+CREATE TABLE IF NOT EXISTS resumen_diario (
+    dia TEXT PRIMARY KEY,
+    ventas_total REAL NOT NULL DEFAULT 0,
+    ventas_cantidad INTEGER NOT NULL DEFAULT 0,
+    unidades INTEGER NOT NULL DEFAULT 0,
+    gastos_total REAL NOT NULL DEFAULT 0,
+    gastos_cantidad INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS resumen_diario_producto (
+    dia TEXT NOT NULL,
+    producto_id INTEGER NOT NULL,
+    ventas_total REAL NOT NULL DEFAULT 0,
+    ventas_cantidad INTEGER NOT NULL DEFAULT 0,
+    unidades INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (dia, producto_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS resumen_diario_usuario (
+    dia TEXT NOT NULL,
+    usuario_id INTEGER NOT NULL,
+    ventas_total REAL NOT NULL DEFAULT 0,
+    ventas_cantidad INTEGER NOT NULL DEFAULT 0,
+    gastos_total REAL NOT NULL DEFAULT 0,
+    gastos_cantidad INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (dia, usuario_id)
+) WITHOUT ROWID;
+"""
+
+# signo = 1 suma la fila (NEW), signo = -1 la resta (OLD)
+_SUMAR_VENTA = """
+    INSERT INTO resumen_diario (dia, ventas_total, ventas_cantidad, unidades)
+    VALUES (date({f}.fecha), {s} * {f}.total, {s}, {s} * {f}.cantidad)
+    ON CONFLICT (dia) DO UPDATE SET
+        ventas_total = ventas_total + excluded.ventas_total,
+        ventas_cantidad = ventas_cantidad + excluded.ventas_cantidad,
+        unidades = unidades + excluded.unidades;
+
+    INSERT INTO resumen_diario_producto (dia, producto_id, ventas_total, ventas_cantidad, unidades)
+    VALUES (date({f}.fecha), IFNULL({f}.producto_id, 0), {s} * {f}.total, {s}, {s} * {f}.cantidad)
+    ON CONFLICT (dia, producto_id) DO UPDATE SET
+        ventas_total = ventas_total + excluded.ventas_total,
+        ventas_cantidad = ventas_cantidad + excluded.ventas_cantidad,
+        unidades = unidades + excluded.unidades;
+
+    INSERT INTO resumen_diario_usuario (dia, usuario_id, ventas_total, ventas_cantidad)
+    VALUES (date({f}.fecha), {f}.usuario_id, {s} * {f}.total, {s})
+    ON CONFLICT (dia, usuario_id) DO UPDATE SET
+        ventas_total = ventas_total + excluded.ventas_total,
+        ventas_cantidad = ventas_cantidad + excluded.ventas_cantidad;
+"""
+
+_SUMAR_GASTO = """
+    INSERT INTO resumen_diario (dia, gastos_total, gastos_cantidad)
+    VALUES (date({f}.fecha), {s} * {f}.monto, {s})
+    ON CONFLICT (dia) DO UPDATE SET
+        gastos_total = gastos_total + excluded.gastos_total,
+        gastos_cantidad = gastos_cantidad + excluded.gastos_cantidad;
+
+    INSERT INTO resumen_diario_usuario (dia, usuario_id, gastos_total, gastos_cantidad)
+    VALUES (date({f}.fecha), {f}.usuario_id, {s} * {f}.monto, {s})
+    ON CONFLICT (dia, usuario_id) DO UPDATE SET
+        gastos_total = gastos_total + excluded.gastos_total,
+        gastos_cantidad = gastos_cantidad + excluded.gastos_cantidad;
+"""
+
+
+def _triggers(tabla, cuerpo, columnas):
+    sumar = cuerpo.format(f="NEW", s=1)
+    restar = cuerpo.format(f="OLD", s=-1)
+    return f"""
+CREATE TRIGGER IF NOT EXISTS trg_{tabla}_resumen_ins AFTER INSERT ON {tabla}
+BEGIN {sumar} END;
+
+CREATE TRIGGER IF NOT EXISTS trg_{tabla}_resumen_del AFTER DELETE ON {tabla}
+BEGIN {restar} END;
+
+CREATE TRIGGER IF NOT EXISTS trg_{tabla}_resumen_upd AFTER UPDATE OF {columnas} ON {tabla}
+BEGIN {restar} {sumar} END;
+"""
+
+
+TRIGGERS = (
+    _triggers("ventas", _SUMAR_VENTA, "producto_id, cantidad, total, fecha, usuario_id")
+    + _triggers("gastos", _SUMAR_GASTO, "monto, fecha, usuario_id")
+)
+
+
+def crear_resumen_diario(conn):
+    existia = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'resumen_diario'"
+    ).fetchone()
+
+    conn.executescript(TABLAS + TRIGGERS)
+
+    # primera vez sobre una base con datos: cargar el histórico
+    if not existia:
+        reconstruir_resumen_diario(conn)
+
+
+def reconstruir_resumen_diario(conn):
+    cursor = conn.cursor()
+
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        cursor.execute("DELETE FROM resumen_diario")
+        cursor.execute("DELETE FROM resumen_diario_producto")
+        cursor.execute("DELETE FROM resumen_diario_usuario")
+
+        cursor.execute("""
+            INSERT INTO resumen_diario
+                (dia, ventas_total, ventas_cantidad, unidades, gastos_total, gastos_cantidad)
+            SELECT dia, SUM(vt), SUM(vc), SUM(u), SUM(gt), SUM(gc)
+            FROM (
+                SELECT date(fecha) AS dia, total AS vt, 1 AS vc, cantidad AS u,
+                       0 AS gt, 0 AS gc
+                FROM ventas
+                UNION ALL
+                SELECT date(fecha), 0, 0, 0, monto, 1
+                FROM gastos
+            )
+            GROUP BY dia
+        """)
+
+        cursor.execute("""
+            INSERT INTO resumen_diario_producto
+                (dia, producto_id, ventas_total, ventas_cantidad, unidades)
+            SELECT date(fecha), IFNULL(producto_id, 0), SUM(total), COUNT(*), SUM(cantidad)
+            FROM ventas
+            GROUP BY 1, 2
+        """)
+
+        cursor.execute("""
+            INSERT INTO resumen_diario_usuario
+                (dia, usuario_id, ventas_total, ventas_cantidad, gastos_total, gastos_cantidad)
+            SELECT dia, usuario_id, SUM(vt), SUM(vc), SUM(gt), SUM(gc)
+            FROM (
+                SELECT date(fecha) AS dia, usuario_id, total AS vt, 1 AS vc,
+                       0 AS gt, 0 AS gc
+                FROM ventas
+                UNION ALL
+                SELECT date(fecha), usuario_id, 0, 0, monto, 1
+                FROM gastos
+            )
+            GROUP BY dia, usuario_id
+        """)
+
+        cursor.execute("COMMIT")
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+
+
+# =========================
+# TOTALES DEL DASHBOARD
+# =========================
+# "todo el histórico" como rango para Descomposicion
+HISTORICO_DESDE = "0001-01-01"
+HISTORICO_HASTA = "9999-12-30"
+
+
+class TotalesDashboard(NamedTuple):
+    ventas: float
+    gastos: float
+    ventas_hoy: float
+    gastos_hoy: float
+    ventas_semana: float
+    gastos_semana: float
+    ventas_mes: float
+    gastos_mes: float
+    # solo si se pidió un período explícito (desde/hasta)
+    ventas_periodo: float
+    gastos_periodo: float
+
+    @property
+    def ganancia(self):
+        return self.ventas - self.gastos
+
+    @property
+    def ganancia_periodo(self):
+        return self.ventas_periodo - self.gastos_periodo
+
+
+def dashboard_totals(conn, desde=None, hasta=None):
+    # hoy, 7 días y 30 días: una pasada sobre los días recientes de
+    # resumen_diario. Histórico y período: cierres congelados + días abiertos
+    fila = conn.execute("""
+        SELECT
+            IFNULL(SUM(CASE WHEN dia = date('now') THEN ventas_total END), 0),
+            IFNULL(SUM(CASE WHEN dia = date('now') THEN gastos_total END), 0),
+            IFNULL(SUM(CASE WHEN dia >= date('now', '-7 day') THEN ventas_total END), 0),
+            IFNULL(SUM(CASE WHEN dia >= date('now', '-7 day') THEN gastos_total END), 0),
+            IFNULL(SUM(CASE WHEN dia >= date('now', '-30 day') THEN ventas_total END), 0),
+            IFNULL(SUM(CASE WHEN dia >= date('now', '-30 day') THEN gastos_total END), 0)
+        FROM resumen_diario
+        WHERE dia >= date('now', '-30 day')
+    """).fetchone()
+
+    historico = Descomposicion(conn, HISTORICO_DESDE, HISTORICO_HASTA).totales()
+    periodo = (0.0, 0.0)
+    if desde and hasta:
+        periodo = Descomposicion(conn, desde, hasta).totales()
+
+    return TotalesDashboard(*historico, *(float(v) for v in fila), *periodo)
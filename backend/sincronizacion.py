@@ -0,0 +1,139 @@
+import json
+from datetime import datetime
+from typing import NamedTuple
+
+from .ventas import VentaRechazada, aplicar_gasto, aplicar_ticket, aplicar_venta
+
+# =========================
+# OPERACIONES IDEMPOTENTES (MODO SIN CONEXIÓN)
+# =========================
+# El service worker le pone a cada venta, ticket o gasto una clave única
+# (Idempotency-Key) antes del primer intento y la conserva en la cola de
+# IndexedDB si no hay conexión. Un reintento con la misma clave — el primer
+# envío llegó pero se perdió la respuesta, o la cola se reenvía dos veces —
+# no vuelve a escribir: devuelve el resultado guardado.
+#
+# La clave se guarda en la misma transacción que la venta (o su rechazo, que
+# también es definitivo), así nunca queda una sin la otra. Es única por
+# usuario: la clave de otra sesión nunca devuelve (ni bloquea) su resultado.
+
+OPERACIONES = """
+CREATE TABLE IF NOT EXISTS operaciones_sincronizadas (
+    usuario_id INTEGER NOT NULL,
+    clave TEXT NOT NULL,
+    tipo TEXT NOT NULL,
+    estado TEXT NOT NULL,
+    respuesta TEXT NOT NULL,
+    fecha TEXT NOT NULL,
+    PRIMARY KEY (usuario_id, clave)
+) WITHOUT ROWID;
+"""
+
+# bases anteriores: la clave sola era la clave primaria
+MIGRAR_OPERACIONES = """
+BEGIN;
+ALTER TABLE operaciones_sincronizadas RENAME TO operaciones_sincronizadas_vieja;
+{crear}
+INSERT INTO operaciones_sincronizadas (usuario_id, clave, tipo, estado, respuesta, fecha)
+SELECT IFNULL(usuario_id, 0), clave, tipo, estado, respuesta, fecha
+FROM operaciones_sincronizadas_vieja;
+DROP TABLE operaciones_sincronizadas_vieja;
+COMMIT;
+""".format(crear=OPERACIONES)
+
+TIPOS = ("venta", "ticket", "gasto")
+
+# estados guardados; "repetida" solo se informa, nunca se guarda
+OK = "ok"
+RECHAZADA = "rechazada"
+
+FORMATO_FECHA = "%Y-%m-%d %H:%M"
+
+
+def crear_tabla_operaciones(conn):
+    primaria = [
+        c[1] for c in sorted(conn.execute("PRAGMA table_info(operaciones_sincronizadas)"),
+                             key=lambda c: c[5])
+        if c[5]
+    ]
+    conn.executescript(MIGRAR_OPERACIONES if primaria == ["clave"] else OPERACIONES)
+
+
+class OperacionInvalida(Exception):
+    pass
+
+
+class Resultado(NamedTuple):
+    estado: str         # OK o RECHAZADA
+    respuesta: dict     # {"resultado": ...} o {"error": ...}
+    repetida: bool
+
+
+def clave_valida(clave):
+    return isinstance(clave, str) and 8 <= len(clave) <= 64 and clave.isprintable()
+
+
+def aplicar_idempotente(cursor, clave, tipo, usuario_id, aplicar, *args):
+    fila = cursor.execute("""
+        SELECT estado, respuesta FROM operaciones_sincronizadas
+        WHERE usuario_id = ? AND clave = ?
+    """, (usuario_id, clave)).fetchone()
+    if fila is not None:
+        return Resultado(fila[0], json.loads(fila[1]), True)
+
+    # un rechazo deshace lo que haya escrito la operación, pero se guarda
+    cursor.execute("SAVEPOINT idempotente")
+    try:
+        estado, respuesta = OK, {"resultado": aplicar(cursor, *args)}
+    except VentaRechazada as e:
+        cursor.execute("ROLLBACK TO idempotente")
+        estado, respuesta = RECHAZADA, {"error": str(e)}
+    cursor.execute("RELEASE idempotente")
+
+    cursor.execute("""
+        INSERT INTO operaciones_sincronizadas (usuario_id, clave, tipo, estado, respuesta, fecha)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (usuario_id, clave, tipo, estado, json.dumps(respuesta),
+          datetime.now().strftime(FORMATO_FECHA)))
+    return Resultado(estado, respuesta, False)
+
+
+# =========================
+# COLA REENVIADA POR EL SERVICE WORKER
+# =========================
+def fecha_operacion(texto, ahora):
+    # la hora en que se cargó sin conexión; nunca en el futuro
+    try:
+        fecha = datetime.strptime(texto, FORMATO_FECHA)
+    except (TypeError, ValueError):
+        raise OperacionInvalida(f"fecha inválida: {texto!r}")
+    return min(fecha, ahora).strftime(FORMATO_FECHA)
+
+
+def leer_operacion(operacion, usuario_id, ahora):
+    # {"clave", "tipo", "fecha", "datos"} → (clave, tipo, fecha, aplicar, args)
+    try:
+        clave, tipo, datos = operacion["clave"], operacion["tipo"], operacion["datos"]
+        if not clave_valida(clave):
+            raise OperacionInvalida("clave inválida")
+        if tipo not in TIPOS:
+            raise OperacionInvalida(f"tipo desconocido: {tipo!r}")
+        fecha = fecha_operacion(operacion.get("fecha"), ahora)
+
+        if tipo == "venta":
+            args = (int(datos["producto_id"]), int(datos["cantidad"]), usuario_id, fecha)
+            return clave, tipo, fecha, aplicar_venta, args
+        if tipo == "ticket":
+            lineas = [(int(l["producto_id"]), int(l["cantidad"])) for l in datos["lineas"]]
+            return clave, tipo, fecha, aplicar_ticket, (lineas, usuario_id, fecha)
+
+        descripcion = str(datos["descripcion"]).strip()
+        if not descripcion:
+            raise OperacionInvalida("falta descripcion")
+        # los gastos se guardan sin hora
+        args = (descripcion, float(datos["monto"]), fecha[:10], usuario_id)
+        return clave, tipo, fecha, aplicar_gasto, args
+    except KeyError as e:
+        raise OperacionInvalida(f"falta {e.args[0]}") from e
+    except (TypeError, ValueError, AttributeError) as e:
+        raise OperacionInvalida(f"datos inválidos: {e}") from e
@@ -0,0 +1,182 @@
+# =========================
+# REGISTRO DE VENTAS
+# =========================
+# Una venta es una sola transacción BEGIN IMMEDIATE (toma el lock de escritura
+# al empezar, así dos operadoras no pueden leer el mismo stock a la vez):
+#   1. UPDATE condicional: descuenta stock solo si alcanza (stock >= cantidad).
+#      Si no actualizó ninguna fila, no hay stock (o no existe el producto) y
+#      no se escribe nada.
+#   2. INSERT ... SELECT: el total se calcula en SQL con el precio vigente,
+#      sin ida y vuelta a Python.
+#
+# Un ticket agrupa varias líneas de la misma compra: una cabecera en tickets
+# y una fila en ventas por línea (con ticket_id). Todo el ticket es una sola
+# transacción: precios y stock de todas las líneas con un WHERE id IN (...),
+# y los UPDATE de stock y los INSERT de líneas con executemany.
+#
+# Las funciones aplicar_* hacen el trabajo sobre un cursor sin abrir ni cerrar
+# la transacción: registrar_* las envuelven en una propia, y el escritor
+# agrupado (database.EscritorAgrupado) junta varias en un mismo COMMIT.
+#
+# Todas rechazan una fecha dentro de una semana cerrada. Se verifica con el
+# lock de escritura tomado, así un cierre y una venta de esa semana nunca se
+# cruzan: o la venta entra en el cierre, o el cierre la rechaza.
+
+from .cierres import periodos_cerrados
+from .database import en_transaccion
+
+TICKETS = """
+CREATE TABLE IF NOT EXISTS tickets (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    fecha TEXT NOT NULL,
+    usuario_id INTEGER,
+    total REAL NOT NULL,
+    lineas INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_ventas_ticket ON ventas (ticket_id)
+    WHERE ticket_id IS NOT NULL;
+"""
+
+
+def crear_tabla_tickets(conn):
+    # bases existentes: ventas todavía no tiene la columna ticket_id
+    columnas = [c[1] for c in conn.execute("PRAGMA table_info(ventas)")]
+    if "ticket_id" not in columnas:
+        conn.execute("ALTER TABLE ventas ADD COLUMN ticket_id INTEGER REFERENCES tickets(id)")
+    conn.executescript(TICKETS)
+
+
+class VentaRechazada(Exception):
+    pass
+
+
+class ProductoInexistente(VentaRechazada):
+    pass
+
+
+class StockInsuficiente(VentaRechazada):
+    def __init__(self, producto_id, disponible):
+        super().__init__(f"stock insuficiente (quedan {disponible})")
+        self.producto_id = producto_id
+        self.disponible = disponible
+
+
+class SemanaCerrada(VentaRechazada):
+    def __init__(self, fecha):
+        super().__init__(f"la semana del {fecha[:10]} ya está cerrada")
+        self.fecha = fecha
+
+
+def verificar_semana_abierta(cursor, fecha):
+    if periodos_cerrados.cerrada(cursor, fecha):
+        raise SemanaCerrada(fecha)
+
+
+def aplicar_venta(cursor, producto_id, cantidad, usuario_id, fecha):
+    if cantidad <= 0:
+        raise VentaRechazada("la cantidad debe ser mayor a cero")
+    verificar_semana_abierta(cursor, fecha)
+
+    cursor.execute("""
+        UPDATE productos
+        SET stock = stock - ?
+        WHERE id = ? AND stock >= ?
+    """, (cantidad, producto_id, cantidad))
+
+    if cursor.rowcount == 0:
+        fila = cursor.execute(
+            "SELECT stock FROM productos WHERE id = ?", (producto_id,)
+        ).fetchone()
+        if fila is None:
+            raise ProductoInexistente("el producto no existe")
+        raise StockInsuficiente(producto_id, fila[0])
+
+    cursor.execute("""
+        INSERT INTO ventas (producto_id, cantidad, total, fecha, usuario_id)
+        SELECT id, ?, precio * ?, ?, ?
+        FROM productos
+        WHERE id = ?
+    """, (cantidad, cantidad, fecha, usuario_id, producto_id))
+    return cursor.lastrowid
+
+
+def registrar_venta(conn, producto_id, cantidad, usuario_id, fecha):
+    return en_transaccion(conn, aplicar_venta, producto_id, cantidad, usuario_id, fecha)
+
+
+def agrupar_lineas(lineas):
+    # [(producto_id, cantidad), ...] → {producto_id: cantidad total}, en orden
+    cantidades = {}
+    for producto_id, cantidad in lineas:
+        if cantidad <= 0:
+            raise VentaRechazada("la cantidad debe ser mayor a cero")
+        cantidades[producto_id] = cantidades.get(producto_id, 0) + cantidad
+    if not cantidades:
+        raise VentaRechazada("el ticket no tiene productos")
+    return cantidades
+
+
+def aplicar_ticket(cursor, lineas, usuario_id, fecha):
+    cantidades = agrupar_lineas(lineas)
+    verificar_semana_abierta(cursor, fecha)
+    ids = list(cantidades)
+
+    # con el lock de escritura tomado, el stock leído no puede cambiar
+    # hasta el COMMIT
+    marcas = ", ".join("?" for _ in ids)
+    productos = {
+        fila[0]: fila[1:]
+        for fila in cursor.execute(
+            f"SELECT id, precio, stock FROM productos WHERE id IN ({marcas})", ids
+        ).fetchall()
+    }
+
+    filas = []
+    for producto_id, cantidad in cantidades.items():
+        if producto_id not in productos:
+            raise ProductoInexistente(f"el producto {producto_id} no existe")
+        precio, stock = productos[producto_id]
+        if stock < cantidad:
+            raise StockInsuficiente(producto_id, stock)
+        filas.append((producto_id, cantidad, precio * cantidad))
+
+    total = sum(f[2] for f in filas)
+
+    cursor.executemany("""
+        UPDATE productos
+        SET stock = stock - ?
+        WHERE id = ?
+    """, [(cantidad, producto_id) for producto_id, cantidad, _ in filas])
+
+    cursor.execute("""
+        INSERT INTO tickets (fecha, usuario_id, total, lineas)
+        VALUES (?, ?, ?, ?)
+    """, (fecha, usuario_id, total, len(filas)))
+    ticket_id = cursor.lastrowid
+
+    cursor.executemany("""
+        INSERT INTO ventas (producto_id, cantidad, total, fecha, usuario_id, ticket_id)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, [
+        (producto_id, cantidad, subtotal, fecha, usuario_id, ticket_id)
+        for producto_id, cantidad, subtotal in filas
+    ])
+
+    return ticket_id, total
+
+
+def registrar_ticket(conn, lineas, usuario_id, fecha):
+    return en_transaccion(conn, aplicar_ticket, lineas, usuario_id, fecha)
+
+
+# =========================
+# REGISTRO DE GASTOS
+# =========================
+def aplicar_gasto(cursor, descripcion, monto, fecha, usuario_id):
+    verificar_semana_abierta(cursor, fecha)
+    cursor.execute("""
+        INSERT INTO gastos (descripcion, monto, fecha, usuario_id)
+        VALUES (?, ?, ?, ?)
+    """, (descripcion, monto, fecha, usuario_id))
+    return cursor.lastrowid
@@ -0,0 +1,223 @@
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime
+
+from .comparaciones import COMPARACIONES
+from .datos import CONTRASENA, sembrar as sembrar_base
+from .escenarios import (
+    ClienteFlask, ClienteHTTP, ESCENARIOS, cargar_contexto,
+    correr_escenario, iniciar_sesion,
+)
+
+# =========================
+# BENCHMARK
+# =========================
+# Desde la raíz del repo:
+#
+#   python -m bench sembrar --db /tmp/bench.db --ventas 2000000 --anios 3
+#   python -m bench correr --db /tmp/bench.db --salida resultados.json
+#
+# Para medir un servidor real, levantarlo sobre la misma base y pasar --url:
+#
+#   CONTROL_SIMPLE_DB=/tmp/bench.db gunicorn -w 4 -b 127.0.0.1:8000 backend.app:app
+#   python -m bench correr --db /tmp/bench.db --url http://127.0.0.1:8000
+#
+# Commits por segundo con y sin escritor agrupado (escribe ventas en la base):
+#
+#   python -m bench escritura --db /tmp/bench.db --hilos 16 --operaciones 5000
+#
+# Forma vieja contra la actual, sobre los mismos datos (ver comparaciones.py):
+#
+#   python -m bench comparar --db /tmp/bench.db wal --segundos 10
+#
+# "venta" escribe en la base: sembrar una copia nueva para cada comparación.
+# Todos los usuarios sembrados tienen la contraseña datos.CONTRASENA.
+
+
+def _preparar_entorno(ruta_db):
+    # la app lee su configuración al importarse: la base y los directorios de
+    # trabajo del benchmark van a un lugar propio, nunca a los del repo
+    os.environ["CONTROL_SIMPLE_DB"] = os.path.abspath(ruta_db)
+    trabajo = tempfile.mkdtemp(prefix="bench-control-simple-")
+    os.environ.setdefault("REPORTES_CACHE_DIR", os.path.join(trabajo, "cache"))
+    os.environ.setdefault("EXPORT_DIR", os.path.join(trabajo, "exportaciones"))
+    os.environ.setdefault("SQL_PERFIL_MUESTREO", "0")
+
+
+def sembrar(args):
+    _preparar_entorno(args.db)
+    resumen = sembrar_base(
+        args.db,
+        productos=args.productos,
+        operadoras=args.operadoras,
+        ventas=args.ventas,
+        gastos=args.gastos,
+        anios=args.anios,
+        semilla=args.semilla,
+    )
+    print(json.dumps(resumen, indent=2))
+
+
+def escritura(args):
+    from .escritura import correr_escritura
+
+    if not os.path.exists(args.db):
+        sys.exit(f"{args.db} no existe: correr primero 'python -m bench sembrar'")
+
+    _preparar_entorno(args.db)
+    contexto = cargar_contexto(args.db)
+    resultado = correr_escritura(
+        args.db,
+        contexto["productos"],
+        hilos=args.hilos,
+        operaciones=args.operaciones,
+        intervalo_ms=args.intervalo_ms,
+        lote_max=args.lote_max,
+        synchronous=args.synchronous,
+    )
+    _escribir_salida(resultado, args.salida)
+
+
+def comparar(args):
+    if not os.path.exists(args.db):
+        sys.exit(f"{args.db} no existe: correr primero 'python -m bench sembrar'")
+
+    _preparar_entorno(args.db)
+    contexto = cargar_contexto(args.db)
+    resultado = COMPARACIONES[args.caso](args.db, contexto, args)
+    resultado["caso"] = args.caso
+    resultado["ventas"] = contexto["ventas"]
+    _escribir_salida(resultado, args.salida)
+
+
+def correr(args):
+    if not os.path.exists(args.db):
+        sys.exit(f"{args.db} no existe: correr primero 'python -m bench sembrar'")
+
+    _preparar_entorno(args.db)
+    contexto = cargar_contexto(args.db)
+
+    if args.url:
+        def nuevo():
+            return ClienteHTTP(args.url)
+    else:
+        from backend.app import app
+
+        def nuevo():
+            return ClienteFlask(app)
+
+    def crear_cliente():
+        cliente = nuevo()
+        iniciar_sesion(cliente, args.usuario, CONTRASENA)
+        return cliente
+
+    nombres = args.escenarios or list(ESCENARIOS)
+    resultados = {}
+    for nombre in nombres:
+        if args.calentamiento:
+            correr_escenario(nombre, crear_cliente, contexto,
+                             args.calentamiento, 1, args.semilla)
+        resultados[nombre] = correr_escenario(
+            nombre, crear_cliente, contexto, args.iteraciones, args.hilos, args.semilla
+        )
+        r = resultados[nombre]
+        print(
+            f"{nombre:16} {r['rps'] or 0:9.1f} req/s  "
+            f"p50 {r['p50_ms'] or 0:8.2f}  p95 {r['p95_ms'] or 0:8.2f}  "
+            f"p99 {r['p99_ms'] or 0:8.2f} ms  errores {r['errores']}",
+            file=sys.stderr
+        )
+
+    salida = {
+        "meta": {
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "destino": args.url or "test_client",
+            "db": os.path.abspath(args.db),
+            "db_bytes": os.path.getsize(args.db),
+            "ventas": contexto["ventas"],
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "plataforma": platform.platform(),
+            "iteraciones": args.iteraciones,
+            "hilos": args.hilos,
+            "semilla": args.semilla,
+        },
+        "escenarios": resultados,
+    }
+
+    _escribir_salida(salida, args.salida)
+
+
+def _escribir_salida(datos, ruta):
+    texto = json.dumps(datos, indent=2, ensure_ascii=False)
+    if ruta:
+        with open(ruta, "w", encoding="utf-8") as f:
+            f.write(texto + "\n")
+    else:
+        print(texto)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m bench")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("sembrar", help="crear una base con datos sintéticos")
+    p.add_argument("--db", required=True)
+    p.add_argument("--productos", type=int, default=500)
+    p.add_argument("--operadoras", type=int, default=5)
+    p.add_argument("--ventas", type=int, default=1_000_000)
+    p.add_argument("--gastos", type=int, default=50_000)
+    p.add_argument("--anios", type=int, default=3)
+    p.add_argument("--semilla", type=int, default=1)
+    p.set_defaults(funcion=sembrar)
+
+    p = sub.add_parser("correr", help="medir los escenarios y escribir JSON")
+    p.add_argument("--db", required=True)
+    p.add_argument("--url", help="servidor a medir (por defecto: test client)")
+    p.add_argument("--usuario", default="admin")
+    p.add_argument("--escenarios", nargs="*", choices=list(ESCENARIOS))
+    p.add_argument("--iteraciones", type=int, default=200)
+    p.add_argument("--calentamiento", type=int, default=10)
+    p.add_argument("--hilos", type=int, default=1)
+    p.add_argument("--semilla", type=int, default=1)
+    p.add_argument("--salida", help="archivo JSON (por defecto: stdout)")
+    p.set_defaults(funcion=correr)
+
+    p = sub.add_parser("escritura", help="commits/seg con y sin escritor agrupado")
+    p.add_argument("--db", required=True)
+    p.add_argument("--hilos", type=int, default=16)
+    p.add_argument("--operaciones", type=int, default=5000)
+    p.add_argument("--intervalo-ms", type=float, default=0)
+    p.add_argument("--lote-max", type=int, default=200)
+    p.add_argument("--synchronous", choices=("NORMAL", "FULL"), default="NORMAL")
+    p.add_argument("--salida", help="archivo JSON (por defecto: stdout)")
+    p.set_defaults(funcion=escritura)
+
+    p = sub.add_parser("comparar", help="forma vieja contra la actual de una consulta")
+    p.add_argument("caso", choices=list(COMPARACIONES))
+    p.add_argument("--db", required=True)
+    p.add_argument("--segundos", type=float, default=5, help="wal: duración de cada modo")
+    p.add_argument("--lectores", type=int, default=4, help="wal: hilos leyendo")
+    p.add_argument("--escritores", type=int, default=2, help="wal: hilos vendiendo")
+    p.add_argument("--repeticiones", type=int, default=20,
+                   help="veces que se mide cada forma (busqueda: términos; salvo wal)")
+    p.add_argument("--filas", type=int, nargs="+", default=[10_000, 100_000],
+                   help="excel: cantidades de ventas a exportar")
+    p.add_argument("--tamano", type=int, default=50,
+                   help="busqueda, paginacion: filas por página")
+    p.add_argument("--profundidades", type=int, nargs="+", default=[0, 1_000, 10_000, 100_000],
+                   help="paginacion: filas anteriores a la página medida")
+    p.add_argument("--salida", help="archivo JSON (por defecto: stdout)")
+    p.set_defaults(funcion=comparar)
+
+    args = parser.parse_args()
+    args.funcion(args)
+
+
+if __name__ == "__main__":
+    main()
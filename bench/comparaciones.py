@@ -0,0 +1,463 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import tracemalloc
+from datetime import datetime
+from time import perf_counter
+
+from .escenarios import percentil
+
+# =========================
+# COMPARACIONES ANTES / DESPUÉS
+# =========================
+# Cada caso mide, directo contra la base (sin HTTP), la forma vieja de hacer
+# algo contra la actual, sobre los mismos datos:
+#
+#   python -m bench comparar --db /tmp/bench.db wal
+#
+# Los casos que escriben trabajan sobre una copia temporal de la base.
+
+
+def _latencias(tiempos):
+    ms = sorted(t * 1000 for t in tiempos)
+    return {
+        "n": len(ms),
+        "p50_ms": _redondear(percentil(ms, 50)),
+        "p95_ms": _redondear(percentil(ms, 95)),
+        "p99_ms": _redondear(percentil(ms, 99)),
+        "max_ms": _redondear(ms[-1] if ms else None),
+    }
+
+
+def _redondear(valor):
+    return round(valor, 2) if valor is not None else None
+
+
+def _copiar(origen, directorio):
+    destino = os.path.join(directorio, "copia.db")
+    fuente = sqlite3.connect(f"file:{origen}?mode=ro", uri=True)
+    copia = sqlite3.connect(destino)
+    try:
+        fuente.backup(copia)
+    finally:
+        fuente.close()
+        copia.close()
+    return destino
+
+
+# =========================
+# WAL VS ROLLBACK JOURNAL
+# =========================
+# Lectoras (el calendario de un mes al azar, como /calendar/data) y
+# operadoras vendiendo a la vez durante `segundos`, primero con el journal
+# por defecto (DELETE: una escritura bloquea las lecturas y viceversa) y
+# después con el perfil WAL de la app.
+
+def _concurrencia(ruta, pragmas, contexto, segundos, lectores, escritores):
+    from backend.calendario import datos_mes
+    from backend.database import en_transaccion
+    from backend.ventas import aplicar_venta
+
+    meses = [f"{a}-{m:02d}" for a, m in _meses(contexto)]
+    fecha = datetime.now().strftime("%Y-%m-%d %H:%M")
+    limite = perf_counter() + segundos
+    candado = threading.Lock()
+    tiempos = {"lecturas": [], "escrituras": []}
+    errores = {"lecturas": 0, "escrituras": 0}
+
+    def abrir():
+        conn = sqlite3.connect(ruta, check_same_thread=False)
+        for nombre, valor in pragmas.items():
+            conn.execute(f"PRAGMA {nombre} = {valor}")
+        return conn
+
+    def trabajar(tipo, n):
+        conn = abrir()
+        azar = random.Random(f"{tipo}-{n}")
+        propios, fallidos = [], 0
+        while perf_counter() < limite:
+            inicio = perf_counter()
+            try:
+                if tipo == "lecturas":
+                    datos_mes(conn, azar.choice(meses))
+                else:
+                    producto = azar.choice(contexto["productos"])
+                    en_transaccion(conn, aplicar_venta, producto, 1, 1, fecha)
+            except Exception:
+                # sobre todo "database is locked" tras agotar busy_timeout
+                fallidos += 1
+            propios.append(perf_counter() - inicio)
+        conn.close()
+        with candado:
+            tiempos[tipo].extend(propios)
+            errores[tipo] += fallidos
+
+    hilos = [threading.Thread(target=trabajar, args=("lecturas", n)) for n in range(lectores)]
+    hilos += [threading.Thread(target=trabajar, args=("escrituras", n)) for n in range(escritores)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+
+    return {
+        tipo: dict(_latencias(tiempos[tipo]), errores=errores[tipo],
+                   por_seg=round(len(tiempos[tipo]) / segundos, 1))
+        for tipo in tiempos
+    }
+
+
+def _meses(contexto):
+    actual = contexto["desde"].replace(day=1)
+    while actual <= contexto["hasta"]:
+        yield actual.year, actual.month
+        actual = actual.replace(year=actual.year + actual.month // 12,
+                                month=actual.month % 12 + 1)
+
+
+def comparar_wal(ruta, contexto, args):
+    from backend.app import DB_PRAGMAS
+
+    modos = {
+        # como estaba antes: journal por defecto, solo con la misma espera
+        "rollback": ("DELETE", {"busy_timeout": DB_PRAGMAS["busy_timeout"]}),
+        "wal": ("WAL", DB_PRAGMAS),
+    }
+    resultados = {}
+    for nombre, (journal, pragmas) in modos.items():
+        with tempfile.TemporaryDirectory(prefix="bench-wal-") as directorio:
+            copia = _copiar(ruta, directorio)
+            conn = sqlite3.connect(copia)
+            conn.execute(f"PRAGMA journal_mode = {journal}")
+            conn.close()
+            resultados[nombre] = _concurrencia(
+                copia, pragmas, contexto, args.segundos, args.lectores, args.escritores
+            )
+
+    return {
+        "segundos": args.segundos,
+        "lectores": args.lectores,
+        "escritores": args.escritores,
+        "modos": resultados,
+    }
+
+
+# =========================
+# DASHBOARD: 8 CONSULTAS VS UNA PASADA
+# =========================
+# home() antes: ocho SUM sobre ventas/gastos, cada una recorriendo la tabla.
+# Ahora: dashboard_totals() (resumen_diario + cierres congelados). Además de
+# la latencia se cuentan los recorridos completos (EXPLAIN QUERY PLAN) y los
+# pasos de la máquina virtual de SQLite, que no dependen del disco.
+
+DASHBOARD_ANTES = [
+    "SELECT IFNULL(SUM(total),0) FROM ventas",
+    "SELECT IFNULL(SUM(monto),0) FROM gastos",
+    "SELECT IFNULL(SUM(total), 0) FROM ventas WHERE date(fecha) = date('now')",
+    "SELECT IFNULL(SUM(monto), 0) FROM gastos WHERE date(fecha) = date('now')",
+    "SELECT IFNULL(SUM(total), 0) FROM ventas WHERE date(fecha) >= date('now', '-7 day')",
+    "SELECT IFNULL(SUM(monto), 0) FROM gastos WHERE date(fecha) >= date('now', '-7 day')",
+    "SELECT IFNULL(SUM(total), 0) FROM ventas WHERE date(fecha) >= date('now', '-30 day')",
+    "SELECT IFNULL(SUM(monto), 0) FROM gastos WHERE date(fecha) >= date('now', '-30 day')",
+]
+
+PASOS_POR_AVISO = 1000
+
+
+def _trazar(conn, funcion):
+    # (SELECT ejecutadas, pasos de VM aproximados) de una llamada a funcion()
+    consultas, pasos = [], [0]
+
+    def contar():
+        pasos[0] += PASOS_POR_AVISO
+        return 0
+
+    conn.set_trace_callback(consultas.append)
+    conn.set_progress_handler(contar, PASOS_POR_AVISO)
+    try:
+        funcion()
+    finally:
+        conn.set_trace_callback(None)
+        conn.set_progress_handler(None, 0)
+    return [c for c in consultas if c.lstrip().upper().startswith("SELECT")], pasos[0]
+
+
+def _recorridos(conn, consultas):
+    total = 0
+    for sql in consultas:
+        for fila in conn.execute("EXPLAIN QUERY PLAN " + sql):
+            detalle = fila[3]
+            if detalle.startswith("SCAN ") and " USING " not in detalle:
+                total += 1
+    return total
+
+
+def _medir_forma(conn, funcion, repeticiones):
+    consultas, pasos = _trazar(conn, funcion)
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = perf_counter()
+        funcion()
+        tiempos.append(perf_counter() - inicio)
+    return dict(
+        _latencias(tiempos),
+        consultas=len(consultas),
+        recorridos_completos=_recorridos(conn, consultas),
+        pasos_vm=pasos,
+    )
+
+
+def comparar_dashboard(ruta, contexto, args):
+    from backend.resumen import dashboard_totals
+
+    conn = sqlite3.connect(f"file:{ruta}?mode=ro", uri=True)
+    try:
+        def antes():
+            return [conn.execute(sql).fetchone()[0] for sql in DASHBOARD_ANTES]
+
+        return {
+            "repeticiones": args.repeticiones,
+            "formas": {
+                "ocho_consultas": _medir_forma(conn, antes, args.repeticiones),
+                "dashboard_totals": _medir_forma(
+                    conn, lambda: dashboard_totals(conn), args.repeticiones
+                ),
+            },
+        }
+    finally:
+        conn.close()
+
+
+# =========================
+# EXCEL: EN MEMORIA VS STREAMING
+# =========================
+# El export de antes: todas las filas materializadas como dicts y un
+# Workbook normal (cada celda es un objeto vivo hasta el save). El de ahora:
+# cursor → workbook write-only. Se mide el pico de memoria con tracemalloc
+# para los últimos N ventas de la base (el rango se elige para que entren).
+
+def _excel_en_memoria(data):
+    import io
+
+    from openpyxl import Workbook
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Resumen"
+    ws["A1"] = "Período"
+    ws["B1"] = f"{data['desde']} a {data['hasta']}"
+    ws["A3"], ws["B3"] = "Ventas", data["ventas"]
+    ws["A4"], ws["B4"] = "Gastos", data["gastos"]
+    ws["A5"], ws["B5"] = "Ganancia", data["ganancia"]
+
+    ws_v = wb.create_sheet("Ventas")
+    ws_v.append(["Fecha", "Producto", "Cantidad", "Total", "Usuario"])
+    for v in data["ventas_detalle"]:
+        ws_v.append([v["fecha"], v["producto"], v["cantidad"], v["total"], v["usuario"]])
+
+    ws_g = wb.create_sheet("Gastos")
+    ws_g.append(["Fecha", "Descripción", "Monto", "Usuario"])
+    for g in data["gastos_detalle"]:
+        ws_g.append([g["fecha"], g["descripcion"], g["monto"], g["usuario"]])
+
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer
+
+
+def _pico(funcion):
+    tracemalloc.start()
+    inicio = perf_counter()
+    try:
+        funcion()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"pico_mb": round(pico / 2**20, 1), "segundos": round(perf_counter() - inicio, 2)}
+
+
+def comparar_excel(ruta, contexto, args):
+    from backend.reports.consultas import ReporteConsulta
+    from backend.reports.excel_report import generate_excel
+
+    conn = sqlite3.connect(f"file:{ruta}?mode=ro", uri=True)
+    resultados = {}
+    try:
+        hasta = conn.execute("SELECT MAX(substr(fecha, 1, 10)) FROM ventas").fetchone()[0]
+        for filas in args.filas:
+            fila = conn.execute(
+                "SELECT substr(fecha, 1, 10) FROM ventas ORDER BY fecha DESC LIMIT 1 OFFSET ?",
+                (filas - 1,)
+            ).fetchone()
+            if fila is None:
+                resultados[filas] = {"omitido": f"la base tiene menos de {filas} ventas"}
+                continue
+            desde = fila[0]
+
+            def antes():
+                consulta = ReporteConsulta(conn, desde, hasta)
+                data = consulta.como_dict()
+                # como get_report_data() original: listas completas de dicts
+                data["ventas_detalle"] = list(data["ventas_detalle"])
+                data["gastos_detalle"] = list(data["gastos_detalle"])
+                _excel_en_memoria(data)
+
+            def ahora():
+                generate_excel(ReporteConsulta(conn, desde, hasta).como_dict())
+
+            resultados[filas] = {
+                "desde": desde,
+                "hasta": hasta,
+                "ventas": conn.execute(
+                    "SELECT COUNT(*) FROM ventas WHERE fecha >= ? AND fecha < date(?, '+1 day')",
+                    (desde, hasta)
+                ).fetchone()[0],
+                "en_memoria": _pico(antes),
+                "streaming": _pico(ahora),
+            }
+    finally:
+        conn.close()
+    return {"filas": resultados}
+
+
+# =========================
+# HISTORIAL: LIKE VS FTS
+# =========================
+# Filtro por nombre de producto en el historial. Antes: JOIN + p.nombre LIKE
+# '%x%' (ningún índice: recorre las ventas más nuevas primero hasta llenar la
+# página, o la tabla entera si el nombre no aparece). Ahora: el nombre se
+# resuelve con FTS5 trigram y el plan depende de cuántos productos coinciden.
+# Misma página para las dos formas, con tres clases de término: una palabra
+# común (muchos productos), un nombre completo (uno o pocos) y uno que no existe.
+
+HISTORIAL_ANTES = """
+    SELECT v.fecha, p.nombre, v.cantidad, v.total, u.nombre
+    FROM ventas v
+    JOIN productos p ON p.id = v.producto_id
+    JOIN usuarios u ON u.id = v.usuario_id
+    WHERE p.nombre LIKE ?
+    ORDER BY v.fecha DESC
+    LIMIT ?
+"""
+
+TERMINO_INEXISTENTE = "zzqx"
+
+
+def _terminos(conn, contexto, cantidad):
+    azar = random.Random(0)
+    completos = [f[0] for f in conn.execute("SELECT nombre FROM productos ORDER BY id")]
+    return {
+        "amplio": azar.sample(contexto["nombres"], min(cantidad, len(contexto["nombres"]))),
+        "estrecho": azar.sample(completos, min(cantidad, len(completos))),
+        "inexistente": [TERMINO_INEXISTENTE],
+    }
+
+
+def comparar_busqueda(ruta, contexto, args):
+    from backend.reports.consultas import ReporteConsulta
+
+    conn = sqlite3.connect(f"file:{ruta}?mode=ro", uri=True)
+    try:
+        formas = {
+            "like": lambda t: conn.execute(HISTORIAL_ANTES, (f"%{t}%", args.tamano)).fetchall(),
+            "fts": lambda t: ReporteConsulta(conn).historial(producto=t, tamano=args.tamano).filas,
+        }
+        resultados = {}
+        for clase, terminos in _terminos(conn, contexto, args.repeticiones).items():
+            resultados[clase] = {}
+            for nombre, funcion in formas.items():
+                tiempos, filas = [], 0
+                for termino in terminos:
+                    inicio = perf_counter()
+                    filas += len(funcion(termino))
+                    tiempos.append(perf_counter() - inicio)
+                _, pasos = _trazar(conn, lambda: [funcion(t) for t in terminos])
+                resultados[clase][nombre] = dict(
+                    _latencias(tiempos), filas=filas, pasos_vm=pasos
+                )
+        return {
+            "ventas": conn.execute("SELECT COUNT(*) FROM ventas").fetchone()[0],
+            "productos": conn.execute("SELECT COUNT(*) FROM productos").fetchone()[0],
+            "tamano": args.tamano,
+            "terminos": resultados,
+        }
+    finally:
+        conn.close()
+
+
+# =========================
+# LISTADO: TODO / OFFSET VS KEYSET
+# =========================
+# /ventas antes traía la tabla entera (fetchall). La paginación obvia,
+# LIMIT/OFFSET, sigue leyendo y descartando todo lo anterior a la página; el
+# cursor keyset (WHERE v.id < último visto) arranca directo en el índice. Se
+# mide una página a distintas profundidades; el cursor de cada profundidad se
+# arma antes de medir, como lo traería el link "más viejas".
+
+LISTADO_VENTAS = """
+    SELECT v.id, p.nombre, v.cantidad, v.total, v.fecha, u.nombre
+    FROM ventas v
+    JOIN productos p ON p.id = v.producto_id
+    JOIN usuarios u ON u.id = v.usuario_id
+"""
+
+
+def comparar_paginacion(ruta, contexto, args):
+    from backend.paginacion import codificar_cursor, leer_pagina
+
+    conn = sqlite3.connect(f"file:{ruta}?mode=ro", uri=True)
+    try:
+        total = conn.execute("SELECT COUNT(*) FROM ventas").fetchone()[0]
+
+        def todo():
+            conn.execute(LISTADO_VENTAS + " ORDER BY v.id DESC").fetchall()
+
+        profundidades = {}
+        for profundidad in args.profundidades:
+            if profundidad >= total:
+                profundidades[profundidad] = {"omitido": f"la base tiene {total} ventas"}
+                continue
+
+            anterior = conn.execute(
+                "SELECT id FROM ventas ORDER BY id DESC LIMIT 1 OFFSET ?", (profundidad - 1,)
+            ).fetchone() if profundidad else None
+            cursor = codificar_cursor(anterior) if anterior else None
+
+            def offset():
+                conn.execute(
+                    LISTADO_VENTAS + " ORDER BY v.id DESC LIMIT ? OFFSET ?",
+                    (args.tamano, profundidad)
+                ).fetchall()
+
+            def keyset():
+                leer_pagina(conn, LISTADO_VENTAS, [], [], claves=("v.id",), posiciones=(0,),
+                            antes=cursor, tamano=args.tamano)
+
+            profundidades[profundidad] = {}
+            for nombre, funcion in (("offset", offset), ("keyset", keyset)):
+                medida = _medir_forma(conn, funcion, args.repeticiones)
+                # ORDER BY v.id recorre la tabla por rowid (SCAN v) y corta en
+                # el LIMIT: no es un recorrido completo, lo dicen los pasos
+                medida.pop("recorridos_completos")
+                profundidades[profundidad][nombre] = medida
+
+        return {
+            "ventas": total,
+            "tamano": args.tamano,
+            # una sola vez: es la tabla entera
+            "todo": {k: v for k, v in _medir_forma(conn, todo, 1).items()
+                     if k != "recorridos_completos"},
+            "profundidades": profundidades,
+        }
+    finally:
+        conn.close()
+
+
+COMPARACIONES = {
+    "wal": comparar_wal,
+    "dashboard": comparar_dashboard,
+    "excel": comparar_excel,
+    "busqueda": comparar_busqueda,
+    "paginacion": comparar_paginacion,
+}
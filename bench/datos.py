@@ -0,0 +1,177 @@
+import os
+import random
+import sqlite3
+from datetime import date, datetime, timedelta
+
+# =========================
+# GENERADOR DE DATOS SINTÉTICOS
+# =========================
+# Crea una base nueva con el esquema real de la app (importándola) y la llena
+# con inserts masivos: productos, operadoras, ventas y gastos repartidos en
+# varios años y cierres semanales de todas las semanas ya terminadas.
+
+CONTRASENA = "bench"
+TAMANO_LOTE = 50_000
+
+PALABRAS = (
+    "pan", "leche", "queso", "café", "yerba", "arroz", "fideos", "aceite",
+    "azúcar", "harina", "galletas", "jugo", "agua", "jabón", "shampoo",
+    "body", "remera", "media", "gorra", "buzo", "campera", "pantalón",
+)
+
+GASTOS = ("arriendo", "luz", "agua", "internet", "proveedor", "sueldos", "limpieza")
+
+
+def _lotes(filas, tamano=TAMANO_LOTE):
+    lote = []
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) >= tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def _fechas(cantidad, desde, hasta, azar, con_hora=True):
+    # fechas ordenadas: los ids crecen con la fecha, como en producción
+    dias = (hasta - desde).days + 1
+    por_dia, resto = divmod(cantidad, dias)
+    for n in range(dias):
+        dia = desde + timedelta(days=n)
+        for _ in range(por_dia + (1 if n < resto else 0)):
+            if con_hora:
+                minuto = azar.randrange(8 * 60, 22 * 60)
+                yield f"{dia.isoformat()} {minuto // 60:02d}:{minuto % 60:02d}"
+            else:
+                yield dia.isoformat()
+
+
+def sembrar(ruta, productos=500, operadoras=5, ventas=1_000_000, gastos=50_000,
+            anios=3, semilla=1):
+    if os.path.exists(ruta):
+        raise FileExistsError(f"{ruta} ya existe: usar una ruta nueva")
+
+    # la app crea el esquema (tablas, índices, triggers) al importarse
+    os.environ["CONTROL_SIMPLE_DB"] = ruta
+    from werkzeug.security import generate_password_hash
+    from backend import app as control
+
+    azar = random.Random(semilla)
+    hasta = date.today()
+    desde = hasta - timedelta(days=365 * anios)
+
+    conn = sqlite3.connect(ruta)
+    conn.execute("PRAGMA synchronous = OFF")
+
+    # sin triggers durante la carga: el resumen y la búsqueda se reconstruyen
+    # al final en una sola pasada
+    triggers = [r[0] for r in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger'"
+    )]
+    for nombre in triggers:
+        conn.execute(f"DROP TRIGGER {nombre}")
+
+    password = generate_password_hash(CONTRASENA)
+    conn.execute(
+        "UPDATE usuarios SET password_hash = ? WHERE rol = 'dueno'", (password,)
+    )
+    conn.executemany(
+        "INSERT INTO usuarios (nombre, rol, password_hash) VALUES (?, 'operadora', ?)",
+        [(f"operadora{n}", password) for n in range(1, operadoras + 1)]
+    )
+    usuarios = [r[0] for r in conn.execute("SELECT id FROM usuarios")]
+
+    conn.executemany(
+        "INSERT INTO productos (nombre, precio, stock) VALUES (?, ?, ?)",
+        [
+            (
+                f"{azar.choice(PALABRAS)} {azar.choice(PALABRAS)} {n}",
+                round(azar.uniform(1, 500), 2),
+                10 ** 9,
+            )
+            for n in range(1, productos + 1)
+        ]
+    )
+    precios = dict(conn.execute("SELECT id, precio FROM productos"))
+    ids_productos = list(precios)
+    conn.commit()
+
+    def filas_ventas():
+        for fecha in _fechas(ventas, desde, hasta, azar):
+            producto_id = azar.choice(ids_productos)
+            cantidad = azar.randint(1, 5)
+            yield (
+                producto_id, cantidad, precios[producto_id] * cantidad,
+                fecha, azar.choice(usuarios)
+            )
+
+    for lote in _lotes(filas_ventas()):
+        conn.executemany("""
+            INSERT INTO ventas (producto_id, cantidad, total, fecha, usuario_id)
+            VALUES (?, ?, ?, ?, ?)
+        """, lote)
+        conn.commit()
+
+    def filas_gastos():
+        for fecha in _fechas(gastos, desde, hasta, azar, con_hora=False):
+            yield (
+                azar.choice(GASTOS), round(azar.uniform(5, 2000), 2),
+                fecha, azar.choice(usuarios)
+            )
+
+    for lote in _lotes(filas_gastos()):
+        conn.executemany("""
+            INSERT INTO gastos (descripcion, monto, fecha, usuario_id)
+            VALUES (?, ?, ?, ?)
+        """, lote)
+        conn.commit()
+    conn.close()
+
+    # esquema completo otra vez (recrea triggers) + reconstrucciones
+    with control.app.app_context():
+        control.crear_tablas()
+        conn = control.conectar()
+        control.reconstruir_resumen_diario(conn)
+        for tabla in ("productos", "usuarios"):
+            conn.execute(f"INSERT INTO {tabla}_fts ({tabla}_fts) VALUES ('rebuild')")
+        conn.commit()
+
+        _sembrar_cierres(conn, desde, hasta)
+        conn.execute("ANALYZE")
+        conn.commit()
+
+    return {
+        "productos": productos,
+        "usuarios": len(usuarios),
+        "ventas": ventas,
+        "gastos": gastos,
+        "desde": desde.isoformat(),
+        "hasta": hasta.isoformat(),
+    }
+
+
+def _sembrar_cierres(conn, desde, hasta):
+    # todas las semanas (lunes a domingo) terminadas antes de la actual
+    lunes = desde + timedelta(days=(7 - desde.weekday()) % 7)
+    lunes_actual = hasta - timedelta(days=hasta.weekday())
+    cierres = []
+    while lunes < lunes_actual:
+        domingo = lunes + timedelta(days=6)
+        ventas, gastos = conn.execute("""
+            SELECT IFNULL(SUM(ventas_total), 0), IFNULL(SUM(gastos_total), 0)
+            FROM resumen_diario
+            WHERE dia >= ? AND dia <= ?
+        """, (lunes.isoformat(), domingo.isoformat())).fetchone()
+        cierres.append((
+            lunes.isoformat(), domingo.isoformat(), ventas, gastos, ventas - gastos,
+            1, datetime.combine(domingo, datetime.max.time()).strftime("%Y-%m-%d %H:%M")
+        ))
+        lunes += timedelta(days=7)
+
+    conn.executemany("""
+        INSERT INTO cierres_semanales
+        (fecha_inicio, fecha_fin, total_ventas, total_gastos, ganancia, cerrado_por, fecha_cierre)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, cierres)
+    conn.commit()
@@ -0,0 +1,253 @@
+import http.cookiejar
+import random
+import sqlite3
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import date, timedelta
+from time import perf_counter
+
+# =========================
+# CLIENTES
+# =========================
+# Los escenarios hablan con la app a través de un cliente mínimo (get/post que
+# devuelven el código HTTP y consumen el cuerpo entero). ClienteFlask usa el
+# test client en el mismo proceso; ClienteHTTP va contra un servidor real
+# (gunicorn local) con su propia cookie de sesión.
+
+
+class ClienteFlask:
+    def __init__(self, app):
+        self.cliente = app.test_client()
+
+    def _medir(self, respuesta):
+        respuesta.get_data()
+        respuesta.close()
+        return respuesta.status_code
+
+    def get(self, ruta):
+        return self._medir(self.cliente.get(ruta))
+
+    def post(self, ruta, datos):
+        return self._medir(self.cliente.post(ruta, data=datos))
+
+
+class _SinRedirecciones(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class ClienteHTTP:
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+        self.abridor = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+            _SinRedirecciones,
+        )
+
+    def _pedir(self, ruta, datos=None):
+        if datos is not None:
+            cuerpo = urllib.parse.urlencode(datos, doseq=True).encode()
+        else:
+            cuerpo = None
+        try:
+            with self.abridor.open(self.url + ruta, data=cuerpo) as respuesta:
+                respuesta.read()
+                return respuesta.status
+        except urllib.error.HTTPError as e:
+            # los 3xx llegan acá porque no se siguen las redirecciones
+            e.read()
+            return e.code
+
+    def get(self, ruta):
+        return self._pedir(ruta)
+
+    def post(self, ruta, datos):
+        return self._pedir(ruta, datos)
+
+
+def iniciar_sesion(cliente, usuario, password):
+    estado = cliente.post("/login", {
+        "negocio": "bench",
+        "usuario": usuario,
+        "password": password,
+    })
+    # login correcto = redirect al dashboard; si no, vuelve a mostrar el form
+    if estado != 302:
+        raise RuntimeError(f"no se pudo iniciar sesión como {usuario} ({estado})")
+
+
+# =========================
+# ESCENARIOS
+# =========================
+# Cada escenario recibe el cliente, un Random propio y el contexto de la base
+# (ids de productos, nombres, rango de fechas) y devuelve el código HTTP.
+
+
+def _rango(azar, contexto, max_dias):
+    total = (contexto["hasta"] - contexto["desde"]).days
+    largo = azar.randint(0, min(max_dias, total))
+    inicio = contexto["desde"] + timedelta(days=azar.randint(0, total - largo))
+    return inicio.isoformat(), (inicio + timedelta(days=largo)).isoformat()
+
+
+def dashboard(cliente, azar, contexto):
+    return cliente.get("/")
+
+
+def venta(cliente, azar, contexto):
+    return cliente.post("/ventas/nueva", {
+        "producto_id": azar.choice(contexto["productos"]),
+        "cantidad": azar.randint(1, 3),
+    })
+
+
+def ticket_10(cliente, azar, contexto):
+    # una compra de 10 productos en un solo POST...
+    return cliente.post("/ventas/ticket", {
+        "producto_id": azar.sample(contexto["productos"], 10),
+        "cantidad": [azar.randint(1, 3) for _ in range(10)],
+    })
+
+
+def ventas_sueltas_10(cliente, azar, contexto):
+    # ...contra la misma compra cargada línea por línea
+    estados = [venta(cliente, azar, contexto) for _ in range(10)]
+    return max(estados)
+
+
+def reportes_filtro(cliente, azar, contexto):
+    desde, hasta = _rango(azar, contexto, 90)
+    return cliente.post("/reportes", {"desde": desde, "hasta": hasta})
+
+
+def historial(cliente, azar, contexto):
+    desde, hasta = _rango(azar, contexto, 365)
+    consulta = urllib.parse.urlencode({
+        "desde": desde,
+        "hasta": hasta,
+        "producto": azar.choice(contexto["nombres"]),
+    })
+    return cliente.get(f"/reportes?{consulta}")
+
+
+def calendario(cliente, azar, contexto):
+    desde, _ = _rango(azar, contexto, 0)
+    return cliente.get(f"/calendar/data?month={desde[:7]}")
+
+
+def listado_ventas(cliente, azar, contexto):
+    return cliente.get("/ventas")
+
+
+def export_pdf(cliente, azar, contexto):
+    desde, hasta = _rango(azar, contexto, 31)
+    return cliente.get(f"/export/pdf?from={desde}&to={hasta}")
+
+
+def export_excel(cliente, azar, contexto):
+    desde, hasta = _rango(azar, contexto, 31)
+    return cliente.get(f"/export/excel?from={desde}&to={hasta}")
+
+
+ESCENARIOS = {
+    "dashboard": dashboard,
+    "venta": venta,
+    "ticket_10": ticket_10,
+    "ventas_sueltas_10": ventas_sueltas_10,
+    "reportes_filtro": reportes_filtro,
+    "historial": historial,
+    "calendario": calendario,
+    "listado_ventas": listado_ventas,
+    "export_pdf": export_pdf,
+    "export_excel": export_excel,
+}
+
+
+def cargar_contexto(ruta_db):
+    conn = sqlite3.connect(f"file:{ruta_db}?mode=ro", uri=True)
+    try:
+        productos = conn.execute("SELECT id, nombre FROM productos").fetchall()
+        desde, hasta, ventas = conn.execute(
+            "SELECT MIN(dia), MAX(dia), IFNULL(SUM(ventas_cantidad), 0) FROM resumen_diario"
+        ).fetchone()
+    finally:
+        conn.close()
+
+    hoy = date.today()
+    return {
+        "productos": [p[0] for p in productos],
+        # una palabra del nombre: así el filtro del historial pasa por FTS
+        "nombres": sorted({p[1].split()[0] for p in productos}),
+        "desde": date.fromisoformat(desde) if desde else hoy,
+        "hasta": date.fromisoformat(hasta) if hasta else hoy,
+        "ventas": ventas,
+    }
+
+
+# =========================
+# EJECUCIÓN Y PERCENTILES
+# =========================
+
+
+def percentil(ordenados, p):
+    # vecino más cercano sobre la lista ya ordenada
+    if not ordenados:
+        return None
+    indice = max(0, min(len(ordenados) - 1, round(p / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+
+def correr_escenario(nombre, crear_cliente, contexto, iteraciones, hilos, semilla):
+    escenario = ESCENARIOS[nombre]
+    tiempos = []
+    errores = 0
+    candado = threading.Lock()
+
+    por_hilo = [iteraciones // hilos + (1 if n < iteraciones % hilos else 0)
+                for n in range(hilos)]
+    clientes = [crear_cliente() for _ in range(hilos)]
+
+    def trabajar(n):
+        nonlocal errores
+        azar = random.Random(f"{semilla}-{nombre}-{n}")
+        propios, fallidos = [], 0
+        for _ in range(por_hilo[n]):
+            inicio = perf_counter()
+            try:
+                estado = escenario(clientes[n], azar, contexto)
+            except Exception:
+                estado = None
+            propios.append(perf_counter() - inicio)
+            if estado is None or estado >= 400:
+                fallidos += 1
+        with candado:
+            tiempos.extend(propios)
+            errores += fallidos
+
+    inicio = perf_counter()
+    trabajadores = [threading.Thread(target=trabajar, args=(n,)) for n in range(hilos)]
+    for t in trabajadores:
+        t.start()
+    for t in trabajadores:
+        t.join()
+    segundos = perf_counter() - inicio
+
+    tiempos.sort()
+    ms = [t * 1000 for t in tiempos]
+    return {
+        "iteraciones": len(tiempos),
+        "errores": errores,
+        "hilos": hilos,
+        "segundos": round(segundos, 3),
+        "rps": round(len(tiempos) / segundos, 2) if segundos else None,
+        "p50_ms": _redondear(percentil(ms, 50)),
+        "p95_ms": _redondear(percentil(ms, 95)),
+        "p99_ms": _redondear(percentil(ms, 99)),
+        "max_ms": _redondear(ms[-1] if ms else None),
+    }
+
+
+def _redondear(valor):
+    return round(valor, 2) if valor is not None else None
@@ -0,0 +1,103 @@
+import threading
+from datetime import datetime
+from time import perf_counter
+
+# =========================
+# ESCRITURAS: COMMIT POR REQUEST VS AGRUPADO
+# =========================
+# Mide ventas/seg con `hilos` operadoras vendiendo a la vez, contra la base
+# directamente (sin HTTP): primero cada venta en su propia transacción (como
+# con ESCRITURA_AGRUPADA_MS=0) y después a través de EscritorAgrupado.
+
+
+def _medir(hilos, operaciones, vender):
+    errores = [0]
+    candado = threading.Lock()
+    por_hilo = [operaciones // hilos + (1 if n < operaciones % hilos else 0)
+                for n in range(hilos)]
+
+    def trabajar(n):
+        fallidas = 0
+        for i in range(por_hilo[n]):
+            try:
+                vender(n, i)
+            except Exception:
+                fallidas += 1
+        with candado:
+            errores[0] += fallidas
+
+    inicio = perf_counter()
+    trabajadores = [threading.Thread(target=trabajar, args=(n,)) for n in range(hilos)]
+    for t in trabajadores:
+        t.start()
+    for t in trabajadores:
+        t.join()
+    return perf_counter() - inicio, errores[0]
+
+
+def correr_escritura(ruta, productos, hilos, operaciones, intervalo_ms, lote_max,
+                     synchronous):
+    from backend.app import DB_PRAGMAS
+    from backend.database import EscritorAgrupado, PoolConexiones, en_transaccion
+    from backend.ventas import aplicar_venta
+
+    pragmas = dict(DB_PRAGMAS, synchronous=synchronous)
+    fecha = datetime.now().strftime("%Y-%m-%d %H:%M")
+
+    def argumentos(n, i):
+        return productos[(n * 7919 + i) % len(productos)], 1, 1, fecha
+
+    resultados = {}
+
+    # 1. un commit por venta
+    pool = PoolConexiones(ruta, tamano=hilos, pragmas=pragmas)
+
+    def vender_sincronico(n, i):
+        conn = pool.obtener()
+        try:
+            en_transaccion(conn, aplicar_venta, *argumentos(n, i))
+        finally:
+            pool.devolver(conn)
+
+    segundos, errores = _medir(hilos, operaciones, vender_sincronico)
+    pool.cerrar()
+    resultados["sincronico"] = _resumen(operaciones, errores, segundos, operaciones - errores)
+
+    # 2. escritor agrupado
+    pool = PoolConexiones(ruta, tamano=2, pragmas=pragmas)
+    lotes = []
+    escritor = EscritorAgrupado(
+        pool, intervalo_ms=intervalo_ms, max_operaciones=lote_max,
+        al_confirmar=lambda cantidad, _: lotes.append(cantidad),
+    )
+    escritor.iniciar()
+
+    def vender_agrupado(n, i):
+        escritor.enviar(aplicar_venta, *argumentos(n, i)).result()
+
+    segundos, errores = _medir(hilos, operaciones, vender_agrupado)
+    escritor.detener()
+    pool.cerrar()
+    resultados["agrupado"] = _resumen(operaciones, errores, segundos, len(lotes))
+    resultados["agrupado"]["operaciones_por_commit"] = (
+        round(sum(lotes) / len(lotes), 1) if lotes else None
+    )
+
+    return {
+        "hilos": hilos,
+        "synchronous": synchronous,
+        "intervalo_ms": intervalo_ms,
+        "lote_max": lote_max,
+        "modos": resultados,
+    }
+
+
+def _resumen(operaciones, errores, segundos, commits):
+    return {
+        "operaciones": operaciones,
+        "errores": errores,
+        "segundos": round(segundos, 3),
+        "operaciones_por_seg": round((operaciones - errores) / segundos, 1),
+        "commits": commits,
+        "commits_por_seg": round(commits / segundos, 1),
+    }
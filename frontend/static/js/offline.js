@@ -0,0 +1,38 @@
+// =========================
+// MODO SIN CONEXIÓN (PÁGINAS)
+// =========================
+// Registra el service worker y le avisa que reenvíe la cola al cargar la
+// página y al volver la conexión (para navegadores sin Background Sync).
+// Muestra cuántas operaciones quedan esperando.
+
+if ("serviceWorker" in navigator) {
+  navigator.serviceWorker.register("/sw.js");
+
+  const sincronizar = () => {
+    navigator.serviceWorker.ready.then(r => {
+      if (r.active) r.active.postMessage({ tipo: "sincronizar" });
+    });
+  };
+
+  navigator.serviceWorker.addEventListener("message", e => {
+    if (e.data && e.data.tipo === "cola") mostrarPendientes(e.data.pendientes);
+  });
+
+  window.addEventListener("online", sincronizar);
+  sincronizar();
+}
+
+function mostrarPendientes(pendientes) {
+  let aviso = document.getElementById("aviso-offline");
+  if (!pendientes) {
+    if (aviso) aviso.remove();
+    return;
+  }
+  if (!aviso) {
+    aviso = document.createElement("div");
+    aviso.id = "aviso-offline";
+    aviso.className = "aviso-offline";
+    document.body.appendChild(aviso);
+  }
+  aviso.textContent = `📴 ${pendientes} operación(es) sin enviar — se mandan al volver la conexión`;
+}
@@ -1,18 +1,317 @@
+// =========================
+// SERVICE WORKER (MODO SIN CONEXIÓN)
+// =========================
+// - /static/*: stale-while-revalidate (responde la copia y la actualiza atrás)
+// - páginas y datos (GET): primero la red; sin conexión, la última copia
+// - ventas, tickets y gastos (POST): van con una Idempotency-Key. Si la red
+//   falla se guardan en IndexedDB y se reenvían en lotes a /sincronizar
+//   cuando vuelve la conexión (Background Sync o aviso de la página). El
+//   servidor descarta las claves repetidas: reenviar nunca duplica una venta.
+
+const VERSION = "v2";
+const CACHE_ESTATICOS = `estaticos-${VERSION}`;
+const CACHE_PAGINAS = `paginas-${VERSION}`;
+
+const PRECARGA = [
+  "/static/css/style.css",
+  "/static/js/offline.js",
+];
+
+// POST que se pueden encolar → tipo de operación en /sincronizar
+const FORMULARIOS = {
+  "/ventas/nueva": "venta",
+  "/ventas/ticket": "ticket",
+  "/gastos/nuevo": "gasto",
+};
+
+// nunca desde la cache: descargas, sesión y la propia sincronización
+const SIN_CACHE = ["/export", "/login", "/logout", "/sincronizar", "/metrics"];
+
+const LOTE = 20;
+const ETIQUETA_SYNC = "cola-operaciones";
+
+
 self.addEventListener("install", e => {
   e.waitUntil(
-    caches.open("control-simple").then(cache => {
-      return cache.addAll([
-        "/",
-        "/static/css/style.css"
-      ]);
-    })
+    caches.open(CACHE_ESTATICOS)
+      .then(cache => cache.addAll(PRECARGA))
+      .then(() => self.skipWaiting())
   );
 });
 
-self.addEventListener("fetch", e => {
-  e.respondWith(
-    caches.match(e.request).then(response => {
-      return response || fetch(e.request);
-    })
+self.addEventListener("activate", e => {
+  e.waitUntil(
+    caches.keys()
+      .then(nombres => Promise.all(
+        nombres
+          .filter(n => n !== CACHE_ESTATICOS && n !== CACHE_PAGINAS)
+          .map(n => caches.delete(n))
+      ))
+      .then(() => self.clients.claim())
+      .then(() => sincronizar())
   );
 });
+
+self.addEventListener("fetch", e => {
+  const url = new URL(e.request.url);
+  if (url.origin !== self.location.origin) return;
+
+  if (e.request.method === "POST") {
+    if (url.pathname in FORMULARIOS) {
+      e.respondWith(enviarOperacion(e.request, FORMULARIOS[url.pathname]));
+    }
+    return;
+  }
+  if (e.request.method !== "GET") return;
+
+  if (url.pathname === "/logout") {
+    // las páginas guardadas son de este usuario
+    e.waitUntil(caches.delete(CACHE_PAGINAS));
+    return;
+  }
+  if (SIN_CACHE.some(p => url.pathname.startsWith(p))) return;
+
+  if (url.pathname.startsWith("/static/")) {
+    e.respondWith(staleWhileRevalidate(e));
+  } else {
+    e.respondWith(primeroLaRed(e.request));
+  }
+});
+
+self.addEventListener("sync", e => {
+  if (e.tag === ETIQUETA_SYNC) e.waitUntil(sincronizar());
+});
+
+self.addEventListener("message", e => {
+  if (e.data && e.data.tipo === "sincronizar") e.waitUntil(sincronizar());
+});
+
+
+// =========================
+// CACHE
+// =========================
+async function staleWhileRevalidate(e) {
+  const cache = await caches.open(CACHE_ESTATICOS);
+  const guardada = await cache.match(e.request);
+  const red = fetch(e.request)
+    .then(r => {
+      if (r.ok) return cache.put(e.request, r.clone()).then(() => r);
+      return r;
+    });
+
+  if (guardada) {
+    e.waitUntil(red.catch(() => {}));
+    return guardada;
+  }
+  return red;
+}
+
+async function primeroLaRed(request) {
+  const cache = await caches.open(CACHE_PAGINAS);
+  try {
+    const r = await fetch(request);
+    // solo respuestas completas; una redirección (p. ej. al login) no se guarda
+    if (r.ok && !r.redirected && r.type === "basic") {
+      await cache.put(request, r.clone());
+    }
+    return r;
+  } catch (error) {
+    const guardada = await cache.match(request);
+    if (guardada) return guardada;
+    if (request.mode === "navigate") return paginaSinConexion();
+    throw error;
+  }
+}
+
+
+// =========================
+// OPERACIONES (VENTAS / TICKETS / GASTOS)
+// =========================
+function ahora() {
+  // la hora local del negocio, con el mismo formato que guarda el servidor
+  const d = new Date();
+  const dos = n => String(n).padStart(2, "0");
+  return `${d.getFullYear()}-${dos(d.getMonth() + 1)}-${dos(d.getDate())} ` +
+         `${dos(d.getHours())}:${dos(d.getMinutes())}`;
+}
+
+async function enviarOperacion(request, tipo) {
+  const clave = crypto.randomUUID();
+  const fecha = ahora();
+  const copia = request.clone();
+  const cuerpo = await request.arrayBuffer();
+
+  const headers = new Headers(request.headers);
+  headers.set("Idempotency-Key", clave);
+
+  try {
+    return await fetch(request.url, {
+      method: "POST",
+      headers,
+      body: cuerpo,
+      credentials: "same-origin",
+      redirect: request.mode === "navigate" ? "manual" : "follow",
+    });
+  } catch (error) {
+    // sin conexión (o se cortó a mitad de camino): a la cola con la misma
+    // clave; si el servidor alcanzó a guardarla, el reenvío no la repite
+    const json = (request.headers.get("Content-Type") || "").includes("application/json");
+    await encolar({ clave, tipo, fecha, datos: await leerDatos(copia, tipo) });
+    await pedirSincronizacion();
+    return respuestaEncolada(json);
+  }
+}
+
+async function leerDatos(request, tipo) {
+  if ((request.headers.get("Content-Type") || "").includes("application/json")) {
+    return request.json();
+  }
+  const form = await request.formData();
+  if (tipo === "ticket") {
+    const cantidades = form.getAll("cantidad");
+    return {
+      lineas: form.getAll("producto_id")
+        .map((producto_id, i) => ({ producto_id, cantidad: cantidades[i] }))
+        .filter(l => l.producto_id && l.cantidad),
+    };
+  }
+  return Object.fromEntries(form);
+}
+
+async function pedirSincronizacion() {
+  // Background Sync donde exista; si no, la página avisa al volver "online"
+  if (self.registration.sync) {
+    try {
+      await self.registration.sync.register(ETIQUETA_SYNC);
+    } catch (error) {}
+  }
+}
+
+let sincronizando = null;
+
+function sincronizar() {
+  // una sola pasada a la vez aunque lleguen varios avisos juntos
+  if (!sincronizando) {
+    sincronizando = reenviarCola().finally(() => { sincronizando = null; });
+  }
+  return sincronizando;
+}
+
+async function reenviarCola() {
+  for (;;) {
+    const pendientes = await leerCola(LOTE);
+    if (!pendientes.length) break;
+
+    let r;
+    try {
+      r = await fetch("/sincronizar", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        credentials: "same-origin",
+        body: JSON.stringify({
+          operaciones: pendientes.map(({ clave, tipo, fecha, datos }) => ({ clave, tipo, fecha, datos })),
+        }),
+      });
+    } catch (error) {
+      break;    // sigue sin conexión
+    }
+    // 401 (sesión vencida) o error del servidor: queda todo para después
+    if (!r.ok) break;
+
+    const { resultados } = await r.json();
+    // ok, repetida, rechazada o inválida: ya no tiene sentido reintentarlas
+    const terminadas = new Set(resultados.map(res => res.clave));
+    const ids = pendientes.filter(p => terminadas.has(p.clave)).map(p => p.id);
+    await borrarDeCola(ids);
+    await avisar({ tipo: "sincronizado", resultados });
+    if (!ids.length) break;
+  }
+  await avisar({ tipo: "cola", pendientes: await contarCola() });
+}
+
+async function avisar(mensaje) {
+  const clientes = await self.clients.matchAll({ type: "window" });
+  clientes.forEach(c => c.postMessage(mensaje));
+}
+
+
+// =========================
+// COLA EN INDEXEDDB
+// =========================
+function abrirBase() {
+  return new Promise((resolver, rechazar) => {
+    const pedido = indexedDB.open("control-simple", 1);
+    pedido.onupgradeneeded = () => {
+      // id autoincremental: getAll devuelve en orden de carga
+      pedido.result.createObjectStore("cola", { keyPath: "id", autoIncrement: true });
+    };
+    pedido.onsuccess = () => resolver(pedido.result);
+    pedido.onerror = () => rechazar(pedido.error);
+  });
+}
+
+async function enCola(modo, accion) {
+  const base = await abrirBase();
+  return new Promise((resolver, rechazar) => {
+    const tx = base.transaction("cola", modo);
+    const pedido = accion(tx.objectStore("cola"));
+    tx.oncomplete = () => resolver(pedido && pedido.result);
+    tx.onerror = () => rechazar(tx.error);
+  });
+}
+
+function encolar(operacion) {
+  return enCola("readwrite", cola => cola.add(operacion));
+}
+
+function leerCola(cantidad) {
+  return enCola("readonly", cola => cola.getAll(null, cantidad));
+}
+
+function contarCola() {
+  return enCola("readonly", cola => cola.count());
+}
+
+function borrarDeCola(ids) {
+  return enCola("readwrite", cola => { ids.forEach(id => cola.delete(id)); });
+}
+
+
+// =========================
+// RESPUESTAS SIN CONEXIÓN
+// =========================
+function respuestaEncolada(json) {
+  if (json) {
+    return new Response(JSON.stringify({ encolada: true }), {
+      status: 202,
+      headers: { "Content-Type": "application/json" },
+    });
+  }
+  return new Response(`<!DOCTYPE html>
+<html lang="es"><head><meta charset="UTF-8">
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
+<link rel="stylesheet" href="/static/css/style.css"><title>Guardado sin conexión</title></head>
+<body><div class="container">
+<h1>📴 Guardado sin conexión</h1>
+<p>Se va a enviar solo cuando vuelva la conexión.</p>
+<a href="/" class="btn-accion">⬅ Volver</a>
+</div></body></html>`, {
+    status: 202,
+    headers: { "Content-Type": "text/html; charset=utf-8" },
+  });
+}
+
+function paginaSinConexion() {
+  return new Response(`<!DOCTYPE html>
+<html lang="es"><head><meta charset="UTF-8">
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
+<link rel="stylesheet" href="/static/css/style.css"><title>Sin conexión</title></head>
+<body><div class="container">
+<h1>📴 Sin conexión</h1>
+<p>Esta página todavía no se abrió en este equipo. Las ventas y gastos se pueden seguir cargando.</p>
+<a href="/" class="btn-accion">⬅ Volver</a>
+</div></body></html>`, {
+    status: 503,
+    headers: { "Content-Type": "text/html; charset=utf-8" },
+  });
+}
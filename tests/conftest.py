@@ -0,0 +1,68 @@
+import os
+import sqlite3
+import tempfile
+
+import pytest
+
+# =========================
+# ENTORNO DE PRUEBAS
+# =========================
+# La app lee su configuración al importarse y crea el esquema en DB_PATH: la
+# base y los directorios de trabajo van a un temporal, nunca a los del repo.
+
+_TRABAJO = tempfile.mkdtemp(prefix="control-simple-tests-")
+os.environ["CONTROL_SIMPLE_DB"] = os.path.join(_TRABAJO, "pruebas.db")
+os.environ["REPORTES_CACHE_DIR"] = os.path.join(_TRABAJO, "cache")
+os.environ["EXPORT_DIR"] = os.path.join(_TRABAJO, "exportaciones")
+os.environ["SQL_PERFIL_MUESTREO"] = "0"
+os.environ["WAL_CHECKPOINT_INTERVALO"] = "0"
+
+from backend.app import DB_PATH, app as aplicacion  # noqa: E402
+from backend.cierres import registrar_cierre  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    return aplicacion
+
+
+@pytest.fixture
+def conn():
+    conexion = sqlite3.connect(DB_PATH)
+    yield conexion
+    conexion.close()
+
+
+@pytest.fixture
+def dueno(app):
+    cliente = app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion["usuario_id"] = 1
+        sesion["rol"] = "dueno"
+        sesion["negocio"] = "pruebas"
+    return cliente
+
+
+@pytest.fixture
+def cerrar(conn):
+    # cierra semanas como la ruta (totales y detalle congelados) y las borra
+    # al terminar, para no bloquear las fechas de otras pruebas
+    ids = []
+
+    def cerrar(inicio, fin):
+        ids.append(registrar_cierre(conn, inicio, fin, 1, f"{fin} 23:59"))
+        return ids[-1]
+
+    yield cerrar
+    for tabla in ("cierres_semanales_dia", "cierres_semanales_producto"):
+        conn.executemany(f"DELETE FROM {tabla} WHERE cierre_id = ?", [(i,) for i in ids])
+    conn.executemany("DELETE FROM cierres_semanales WHERE id = ?", [(i,) for i in ids])
+    conn.commit()
+
+
+def crear_producto(conn, nombre, precio=10.0, stock=100):
+    cursor = conn.execute(
+        "INSERT INTO productos (nombre, precio, stock) VALUES (?, ?, ?)", (nombre, precio, stock)
+    )
+    conn.commit()
+    return cursor.lastrowid
@@ -0,0 +1,158 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from backend.calendario import mes_cerrado
+from backend.cierres import PeriodosCerrados, crear_detalle_cierres
+from backend.database import en_transaccion
+from backend.resumen import dashboard_totals
+from backend.ventas import SemanaCerrada, aplicar_gasto, registrar_ticket, registrar_venta
+from conftest import crear_producto
+
+# =========================
+# PERÍODOS CERRADOS
+# =========================
+# Un mes es immutable solo si terminó y sus días están todos dentro de
+# semanas cerradas: un hueco entre cierres, o un cierre borrado, lo reabre.
+
+HOY = date(2019, 12, 1)
+
+
+def semanas(desde, hasta):
+    # lunes a domingo que cubren [desde, hasta]
+    lunes = date.fromisoformat(desde)
+    lunes -= timedelta(days=lunes.weekday())
+    while lunes.isoformat() <= hasta:
+        yield lunes.isoformat(), (lunes + timedelta(days=6)).isoformat()
+        lunes += timedelta(days=7)
+
+
+def test_mes_cubierto_y_terminado_es_cerrado(conn, cerrar):
+    for inicio, fin in semanas("2019-03-01", "2019-03-31"):
+        cerrar(inicio, fin)
+    assert mes_cerrado(conn, "2019-03", PeriodosCerrados(), hoy=HOY)
+
+
+def test_hueco_entre_cierres_deja_el_mes_abierto(conn, cerrar):
+    # cierres antes y después del mes (MIN/MAX lo cubrían) pero falta una semana
+    for inicio, fin in semanas("2019-04-01", "2019-04-30"):
+        if inicio != "2019-04-15":
+            cerrar(inicio, fin)
+    periodos = PeriodosCerrados()
+    assert not mes_cerrado(conn, "2019-04", periodos, hoy=HOY)
+    assert not periodos.cubre(conn, "2019-04-14", "2019-04-15")
+    assert periodos.cubre(conn, "2019-04-22", "2019-04-30")
+
+
+def test_mes_en_curso_no_es_cerrado(conn, cerrar):
+    for inicio, fin in semanas("2019-11-01", "2019-11-30"):
+        cerrar(inicio, fin)
+    assert not mes_cerrado(conn, "2019-11", PeriodosCerrados(), hoy=date(2019, 11, 30))
+    assert mes_cerrado(conn, "2019-11", PeriodosCerrados(), hoy=HOY)
+
+
+def test_cierre_borrado_reabre_el_mes(conn, cerrar):
+    ids = [cerrar(inicio, fin) for inicio, fin in semanas("2019-05-01", "2019-05-31")]
+    periodos = PeriodosCerrados()
+    assert mes_cerrado(conn, "2019-05", periodos, hoy=HOY)
+
+    # borrar uno del medio no cambia MAX(id): la marca tiene que verlo igual
+    conn.execute("DELETE FROM cierres_semanales WHERE id = ?", (ids[2],))
+    conn.commit()
+    assert not mes_cerrado(conn, "2019-05", periodos, hoy=HOY)
+    assert not periodos.cerrada(conn, "2019-05-15")
+
+
+# =========================
+# ESCRITURAS EN SEMANAS CERRADAS
+# =========================
+def test_aplicar_rechaza_fechas_de_semanas_cerradas(conn, cerrar):
+    producto_id = crear_producto(conn, "Cierre directo", stock=10)
+    cerrar("2019-06-10", "2019-06-16")
+
+    with pytest.raises(SemanaCerrada):
+        registrar_venta(conn, producto_id, 1, 1, "2019-06-12 10:00")
+    with pytest.raises(SemanaCerrada):
+        registrar_ticket(conn, [(producto_id, 1)], 1, "2019-06-16 23:59")
+    with pytest.raises(SemanaCerrada):
+        en_transaccion(conn, aplicar_gasto, "gasto cerrado", 5.0, "2019-06-10", 1)
+
+    # los días vecinos siguen abiertos
+    assert registrar_venta(conn, producto_id, 1, 1, "2019-06-17 09:00")
+    assert conn.execute(
+        "SELECT stock FROM productos WHERE id = ?", (producto_id,)
+    ).fetchone()[0] == 9
+
+
+def test_semana_actual_cerrada_rechaza_todas_las_rutas(dueno, conn, cerrar):
+    producto_id = crear_producto(conn, "Cierre rutas", stock=10)
+    hoy = date.today()
+    lunes = hoy - timedelta(days=hoy.weekday())
+    cerrar(lunes.isoformat(), (lunes + timedelta(days=6)).isoformat())
+    ventas_antes = conn.execute("SELECT COUNT(*), IFNULL(SUM(total), 0) FROM ventas").fetchone()
+
+    venta = {"producto_id": producto_id, "cantidad": 1}
+    assert dueno.post("/ventas/nueva", data=venta).status_code == 409
+    assert dueno.post("/ventas/ticket", json={"lineas": [venta]}).status_code == 409
+    assert dueno.post("/api/v1/ventas", json=venta).status_code == 409
+    assert dueno.post("/gastos/nuevo", data={"descripcion": "x", "monto": "1"}).status_code == 409
+    assert dueno.post("/api/v1/gastos", json={"descripcion": "x", "monto": 1}).status_code == 409
+    respuesta = dueno.post("/sincronizar", json={"operaciones": [{
+        "clave": "venta-semana-cerrada-01", "tipo": "venta",
+        "fecha": datetime.now().strftime("%Y-%m-%d %H:%M"), "datos": venta,
+    }]})
+    assert respuesta.json["resultados"][0]["estado"] == "rechazada"
+
+    # nada entró: el histórico congelado sigue cuadrando con las tablas
+    assert conn.execute(
+        "SELECT COUNT(*), IFNULL(SUM(total), 0) FROM ventas"
+    ).fetchone() == ventas_antes
+    assert dashboard_totals(conn).ventas == pytest.approx(ventas_antes[1])
+
+
+def test_cierre_sin_movimiento_no_se_vuelve_a_congelar(conn, cerrar):
+    cierre_id = cerrar("2019-07-01", "2019-07-07")
+    assert conn.execute(
+        "SELECT COUNT(*) FROM cierres_semanales_dia WHERE cierre_id = ?", (cierre_id,)
+    ).fetchone()[0] == 7
+
+    congelados = []
+    conn.set_trace_callback(congelados.append)
+    crear_detalle_cierres(conn)
+    conn.set_trace_callback(None)
+    assert not any("INSERT OR REPLACE" in sql for sql in congelados)
+
+
+# =========================
+# CIERRE DESDE LA RUTA
+# =========================
+def test_la_ruta_cierra_la_semana_pasada_una_sola_vez(dueno, conn):
+    producto_id = crear_producto(conn, "Cierre semana pasada", stock=10)
+    hoy = date.today()
+    lunes = hoy - timedelta(days=hoy.weekday() + 7)
+    semana = (lunes.isoformat(), (lunes + timedelta(days=6)).isoformat())
+
+    try:
+        assert dueno.post("/cierres/semana").status_code == 302
+        assert conn.execute(
+            "SELECT fecha_inicio, fecha_fin FROM cierres_semanales ORDER BY id DESC LIMIT 1"
+        ).fetchone() == semana
+
+        # la semana en curso sigue abierta
+        venta = {"producto_id": producto_id, "cantidad": 1}
+        assert dueno.post("/api/v1/ventas", json=venta).status_code == 201
+
+        # el segundo cierre se rechaza en vez de acumular filas
+        assert dueno.post("/cierres/semana").status_code == 409
+        assert conn.execute(
+            "SELECT COUNT(*) FROM cierres_semanales WHERE fecha_inicio = ? AND fecha_fin = ?",
+            semana
+        ).fetchone()[0] == 1
+    finally:
+        ids = [(fila[0],) for fila in conn.execute(
+            "SELECT id FROM cierres_semanales WHERE fecha_inicio = ? AND fecha_fin = ?", semana
+        )]
+        for tabla in ("cierres_semanales_dia", "cierres_semanales_producto"):
+            conn.executemany(f"DELETE FROM {tabla} WHERE cierre_id = ?", ids)
+        conn.executemany("DELETE FROM cierres_semanales WHERE id = ?", ids)
+        conn.commit()
@@ -0,0 +1,82 @@
+import re
+import sqlite3
+from datetime import date
+
+import pytest
+
+import backend.app as control
+from conftest import crear_producto
+
+# =========================
+# CONSULTAS POR REQUEST
+# =========================
+# Cada pantalla tiene un presupuesto de sentencias SQL (lo que informa el
+# perfil en Server-Timing). No depende de cuántas filas haya: una consulta
+# por fila (N+1) o un detalle sin límite lo rompe.
+
+HOY = date.today()
+MES = HOY.strftime("%Y-%m")
+RANGO = f"desde={MES}-01&hasta={HOY.isoformat()}"
+
+PRESUPUESTO = {
+    "/": 3,
+    "/productos": 1,
+    "/ventas": 1,
+    "/gastos": 1,
+    "/ventas/nueva": 1,
+    "/ventas/ticket": 1,
+    "/gastos/nuevo": 0,
+    "/reportes": 6,
+    "/reportes?producto=Consulta": 8,
+    f"/calendar/data?month={MES}": 4,
+    "/api/v1/ventas": 1,
+    "/api/v1/gastos": 1,
+    f"/api/v1/resumen?{RANGO}": 4,
+    "/api/v1/dashboard": 3,
+    f"/export/csv?from={MES}-01&to={HOY.isoformat()}": 1,
+}
+
+CONSULTAS = re.compile(r'desc="(\d+) consultas"')
+
+
+@pytest.fixture
+def perfilado(monkeypatch, dueno):
+    monkeypatch.setattr(control, "SQL_PERFIL_MUESTREO", 1)
+    return dueno
+
+
+@pytest.fixture(scope="module")
+def datos():
+    # más filas que cualquier página chica, repartidas en varios productos
+    conn = sqlite3.connect(control.DB_PATH)
+    productos = [crear_producto(conn, f"Consulta {n}", stock=1000) for n in range(10)]
+    ahora = f"{HOY.isoformat()} 10:00"
+    conn.executemany(
+        "INSERT INTO ventas (producto_id, cantidad, total, fecha, usuario_id) VALUES (?, 1, 10, ?, 1)",
+        [(productos[n % 10], ahora) for n in range(300)]
+    )
+    conn.executemany(
+        "INSERT INTO gastos (descripcion, monto, fecha, usuario_id) VALUES (?, 5, ?, 1)",
+        [(f"gasto {n}", HOY.isoformat()) for n in range(300)]
+    )
+    conn.commit()
+    conn.close()
+
+
+def consultas(respuesta):
+    return int(CONSULTAS.search(respuesta.headers["Server-Timing"]).group(1))
+
+
+@pytest.mark.parametrize("url", list(PRESUPUESTO))
+def test_presupuesto_de_consultas(perfilado, datos, url):
+    respuesta = perfilado.get(url)
+    assert respuesta.status_code == 200
+    assert consultas(respuesta) <= PRESUPUESTO[url]
+
+
+def test_reportes_recorta_el_detalle(perfilado, datos):
+    respuesta = perfilado.get(f"/reportes?{RANGO}")
+    html = respuesta.get_data(as_text=True)
+    assert f"Mostrando las {control.REPORTES_DETALLE_MAX} más recientes" in html
+    assert f"Mostrando los {control.REPORTES_DETALLE_MAX} más recientes" in html
+    assert html.count("(x1)") == control.REPORTES_DETALLE_MAX
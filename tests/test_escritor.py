@@ -0,0 +1,104 @@
+import sqlite3
+import threading
+
+import pytest
+
+import backend.app as control
+from backend.database import EscritorAgrupado, PoolConexiones
+from backend.ventas import aplicar_gasto
+
+# =========================
+# ESCRITOR AGRUPADO
+# =========================
+# Un lote que falla no mata al hilo ni a las operaciones de otros lotes, y un
+# request no se queda esperando para siempre un lote que no llega.
+
+
+@pytest.fixture
+def pool():
+    # busy_timeout corto: un lote que no consigue el lock falla rápido
+    pool = PoolConexiones(control.DB_PATH, tamano=2, pragmas={"busy_timeout": 50})
+    yield pool
+    pool.cerrar()
+
+
+def gasto(descripcion):
+    return aplicar_gasto, (descripcion, 1.0, "2026-01-01", 1)
+
+
+def contar(conn, descripcion):
+    return conn.execute(
+        "SELECT COUNT(*) FROM gastos WHERE descripcion = ?", (descripcion,)
+    ).fetchone()[0]
+
+
+def test_lote_fallido_no_detiene_al_escritor(pool, conn):
+    escritor = EscritorAgrupado(pool)
+    escritor.iniciar()
+    try:
+        # otra conexión tiene el lock de escritura: el lote no puede empezar
+        bloqueo = sqlite3.connect(control.DB_PATH)
+        bloqueo.execute("BEGIN IMMEDIATE")
+        aplicar, args = gasto("escritor bloqueado")
+        fallida = escritor.enviar(aplicar, *args)
+        with pytest.raises(sqlite3.OperationalError):
+            fallida.result(timeout=5)
+        bloqueo.rollback()
+        bloqueo.close()
+
+        aplicar, args = gasto("escritor despues")
+        assert escritor.enviar(aplicar, *args).result(timeout=5)
+        assert escritor.activo
+        assert contar(conn, "escritor bloqueado") == 0
+        assert contar(conn, "escritor despues") == 1
+    finally:
+        escritor.detener()
+
+
+def test_error_despues_del_commit_no_detiene_al_escritor(pool, conn):
+    # al_confirmar (métricas) falla con los Future ya resueltos
+    llamadas = []
+
+    def al_confirmar(operaciones, segundos):
+        llamadas.append(operaciones)
+        if len(llamadas) == 1:
+            raise RuntimeError("métricas caídas")
+
+    escritor = EscritorAgrupado(pool, al_confirmar=al_confirmar)
+    escritor.iniciar()
+    try:
+        for descripcion in ("confirmar uno", "confirmar dos"):
+            aplicar, args = gasto(descripcion)
+            assert escritor.enviar(aplicar, *args).result(timeout=5)
+        assert escritor.activo
+        assert contar(conn, "confirmar uno") == contar(conn, "confirmar dos") == 1
+    finally:
+        escritor.detener()
+
+
+def test_escribir_sin_lote_a_tiempo_escribe_directo(pool, conn, monkeypatch):
+    # el hilo queda trabado después de su primer lote: lo siguiente no sale
+    trabado, soltar = threading.Event(), threading.Event()
+
+    def al_confirmar(operaciones, segundos):
+        trabado.set()
+        soltar.wait(10)
+
+    escritor = EscritorAgrupado(pool, al_confirmar=al_confirmar)
+    escritor.iniciar()
+    monkeypatch.setattr(control, "escritor", escritor)
+    monkeypatch.setattr(control, "ESCRITURA_AGRUPADA_ESPERA", 0.2)
+    try:
+        aplicar, args = gasto("antes del atasco")
+        escritor.enviar(aplicar, *args)
+        assert trabado.wait(5)
+
+        with control.app.app_context():
+            aplicar, args = gasto("directo")
+            assert control.escribir(aplicar, *args)
+        assert contar(conn, "directo") == 1
+    finally:
+        soltar.set()
+        escritor.detener()
+    # la operación cancelada no se escribió además en el lote siguiente
+    assert contar(conn, "directo") == 1
@@ -0,0 +1,34 @@
+import base64
+import json
+
+import pytest
+
+from backend.paginacion import codificar_cursor, decodificar_cursor
+
+# =========================
+# CURSORES DE PAGINACIÓN
+# =========================
+# Un cursor viene de la URL: uno armado a mano se ignora (primera página),
+# nunca llega a la consulta con valores que SQLite no sabe enlazar.
+
+
+def cursor_de(valores):
+    texto = json.dumps(valores).encode()
+    return base64.urlsafe_b64encode(texto).decode().rstrip("=")
+
+
+def test_cursor_valido_vuelve_igual():
+    valores = [12, "2026-01-01 10:00"]
+    assert decodificar_cursor(codificar_cursor(valores), 2) == valores
+
+
+@pytest.mark.parametrize("valores", [[[1, 2]], [{"a": 1}], [None], [True]])
+def test_cursor_con_tipos_invalidos_se_ignora(valores):
+    assert decodificar_cursor(cursor_de(valores), 1) is None
+
+
+@pytest.mark.parametrize("url", ["/ventas", "/gastos", "/api/v1/ventas", "/api/v1/gastos"])
+@pytest.mark.parametrize("valores", [[[1, 2]], [{"a": 1}]])
+def test_rutas_con_cursor_armado_responden_la_primera_pagina(dueno, url, valores):
+    assert dueno.get(f"{url}?antes={cursor_de(valores)}").status_code == 200
+    assert dueno.get(f"{url}?despues={cursor_de(valores)}").status_code == 200
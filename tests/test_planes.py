@@ -0,0 +1,97 @@
+import re
+
+import pytest
+
+from backend.calendario import datos_mes
+from backend.reports.consultas import GASTOS_DETALLE, VENTAS_DETALLE, ReporteConsulta
+from backend.resumen import dashboard_totals
+
+from conftest import crear_producto
+
+# =========================
+# PLANES DE CONSULTA
+# =========================
+# Los filtros por fecha tienen que poder usar un índice: ningún recorrido
+# completo de ventas, gastos o resumen_diario (ni por sus alias v / g).
+
+RECORRIDO_COMPLETO = re.compile(r"^SCAN (ventas|gastos|resumen_diario|v|g)\b(?! USING)")
+
+DESDE, HASTA = "2026-01-01", "2026-03-31"
+
+
+def plan(conn, sql, params=()):
+    return [fila[3] for fila in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+
+def consultas_de(conn, funcion):
+    # las SELECT que ejecuta funcion(), con los parámetros ya expandidos
+    ejecutadas = []
+    conn.set_trace_callback(ejecutadas.append)
+    try:
+        funcion()
+    finally:
+        conn.set_trace_callback(None)
+    return [sql for sql in ejecutadas if sql.lstrip().upper().startswith(("SELECT", "WITH"))]
+
+
+@pytest.mark.parametrize("sql, indice", [
+    (VENTAS_DETALLE, "idx_ventas_fecha"),
+    (GASTOS_DETALLE, "idx_gastos_fecha"),
+])
+def test_detalle_del_periodo_usa_indice_de_fecha(conn, sql, indice):
+    detalle = " | ".join(plan(conn, sql, (DESDE, HASTA)))
+    assert f"USING INDEX {indice}" in detalle, detalle
+
+
+def test_historial_por_rango_usa_indice_de_fecha(conn):
+    consultas = consultas_de(conn, lambda: ReporteConsulta(conn, DESDE, HASTA).historial())
+    assert consultas
+    detalle = " | ".join(plan(conn, consultas[0]))
+    assert "idx_ventas_fecha" in detalle, detalle
+
+
+@pytest.mark.parametrize("nombre, funcion", [
+    ("dashboard", lambda conn: dashboard_totals(conn, DESDE, HASTA)),
+    ("reportes", lambda conn: ReporteConsulta(conn, DESDE, HASTA).totales),
+    ("productos", lambda conn: ReporteConsulta(conn, DESDE, HASTA).por_producto()),
+    ("ventas_detalle", lambda conn: list(ReporteConsulta(conn, DESDE, HASTA).ventas_detalle())),
+    ("gastos_detalle", lambda conn: list(ReporteConsulta(conn, DESDE, HASTA).gastos_detalle())),
+    ("historial", lambda conn: ReporteConsulta(conn, DESDE, HASTA).historial()),
+    ("exportar", lambda conn: ReporteConsulta(conn, DESDE, HASTA).exportar("ventas")[1].fetchall()),
+    ("calendario", lambda conn: datos_mes(conn, "2026-02")),
+])
+def test_sin_recorridos_completos(conn, nombre, funcion):
+    consultas = consultas_de(conn, lambda: funcion(conn))
+    assert consultas, f"{nombre} no ejecutó ninguna consulta"
+    for sql in consultas:
+        for linea in plan(conn, sql):
+            assert not RECORRIDO_COMPLETO.match(linea), f"{nombre}: {linea}\n{sql}"
+
+
+# el filtro por nombre elige el índice según cuántos productos coinciden
+@pytest.fixture
+def catalogo(conn):
+    for n in range(200):
+        crear_producto(conn, f"Amplio {n}")
+    crear_producto(conn, "Estrecho único")
+
+
+def plan_historial(conn, producto):
+    consultas = consultas_de(
+        conn, lambda: ReporteConsulta(conn).historial(producto=producto)
+    )
+    return " | ".join(plan(conn, [c for c in consultas if "FROM ventas" in c][0]))
+
+
+def test_historial_nombre_estrecho_usa_indice_de_producto(conn, catalogo):
+    detalle = plan_historial(conn, "Estrecho")
+    assert "idx_ventas_producto" in detalle, detalle
+
+
+def test_historial_nombre_amplio_recorre_por_fecha(conn, catalogo):
+    detalle = plan_historial(conn, "Amplio")
+    assert "idx_ventas_fecha" in detalle, detalle
+
+
+def test_historial_nombre_inexistente_no_lee_ventas(conn, catalogo):
+    assert ReporteConsulta(conn).historial(producto="zzqx").filas == []
@@ -0,0 +1,101 @@
+import sqlite3
+
+from backend.sincronizacion import OK, aplicar_idempotente, crear_tabla_operaciones
+from conftest import crear_producto
+
+# =========================
+# OPERACIONES IDEMPOTENTES
+# =========================
+# Una clave ya usada responde su resultado guardado, también cuando fue un
+# rechazo, por cualquiera de las rutas que escriben.
+
+CLAVE = "gasto-rechazado-0001"
+
+
+def contar_gastos(conn, descripcion):
+    return conn.execute(
+        "SELECT COUNT(*) FROM gastos WHERE descripcion = ?", (descripcion,)
+    ).fetchone()[0]
+
+
+def test_gasto_con_clave_rechazada_responde_409(dueno, conn, cerrar):
+    cerrar("2019-06-03", "2019-06-09")
+    respuesta = dueno.post("/sincronizar", json={"operaciones": [{
+        "clave": CLAVE,
+        "tipo": "gasto",
+        "fecha": "2019-06-05 10:00",
+        "datos": {"descripcion": "gasto en semana cerrada", "monto": 5},
+    }]})
+    assert respuesta.json["resultados"][0]["estado"] == "rechazada"
+
+    # el formulario reenviado con la misma clave muestra el rechazo
+    respuesta = dueno.post(
+        "/gastos/nuevo",
+        data={"descripcion": "gasto en semana cerrada", "monto": "5"},
+        headers={"Idempotency-Key": CLAVE},
+    )
+    assert respuesta.status_code == 409
+    assert "error-box" in respuesta.get_data(as_text=True)
+
+    respuesta = dueno.post(
+        "/api/v1/gastos",
+        json={"descripcion": "gasto en semana cerrada", "monto": 5},
+        headers={"Idempotency-Key": CLAVE},
+    )
+    assert respuesta.status_code == 409
+    assert contar_gastos(conn, "gasto en semana cerrada") == 0
+
+
+def test_gasto_con_monto_invalido_responde_400(dueno):
+    respuesta = dueno.post("/gastos/nuevo", data={"descripcion": "sin monto", "monto": "abc"})
+    assert respuesta.status_code == 400
+    assert "monto inválido" in respuesta.get_data(as_text=True)
+
+
+def test_la_clave_es_por_usuario(app, dueno, conn):
+    producto_id = crear_producto(conn, "Clave compartida", stock=10)
+    operadora_id = conn.execute(
+        "INSERT INTO usuarios (nombre, rol) VALUES ('operadora clave', 'operadora')"
+    ).lastrowid
+    conn.commit()
+    operadora = app.test_client()
+    with operadora.session_transaction() as sesion:
+        sesion["usuario_id"] = operadora_id
+        sesion["rol"] = "operadora"
+        sesion["negocio"] = "pruebas"
+
+    # la misma clave en dos sesiones son dos ventas; repetida en una, una sola
+    venta = {"producto_id": producto_id, "cantidad": 1}
+    cabecera = {"Idempotency-Key": "clave-compartida-01"}
+    primera = dueno.post("/api/v1/ventas", json=venta, headers=cabecera)
+    segunda = operadora.post("/api/v1/ventas", json=venta, headers=cabecera)
+    repetida = operadora.post("/api/v1/ventas", json=venta, headers=cabecera)
+
+    assert primera.status_code == segunda.status_code == 201
+    assert primera.json["id"] != segunda.json["id"]
+    assert repetida.json["id"] == segunda.json["id"]
+    assert conn.execute(
+        "SELECT COUNT(*) FROM ventas WHERE producto_id = ?", (producto_id,)
+    ).fetchone()[0] == 2
+
+
+def test_migra_la_tabla_con_clave_global(tmp_path):
+    vieja = sqlite3.connect(tmp_path / "vieja.db")
+    vieja.executescript("""
+        CREATE TABLE operaciones_sincronizadas (
+            clave TEXT PRIMARY KEY, tipo TEXT NOT NULL, estado TEXT NOT NULL,
+            respuesta TEXT NOT NULL, usuario_id INTEGER, fecha TEXT NOT NULL
+        ) WITHOUT ROWID;
+        INSERT INTO operaciones_sincronizadas VALUES
+            ('clave-vieja-0001', 'venta', 'ok', '{"resultado": 7}', 3, '2026-01-01 10:00');
+    """)
+
+    crear_tabla_operaciones(vieja)
+    crear_tabla_operaciones(vieja)   # la segunda vez no hace nada
+
+    primaria = [c[1] for c in sorted(vieja.execute("PRAGMA table_info(operaciones_sincronizadas)"),
+                                     key=lambda c: c[5]) if c[5]]
+    assert primaria == ["usuario_id", "clave"]
+    resultado = aplicar_idempotente(vieja.cursor(), "clave-vieja-0001", "venta", 3, None)
+    assert resultado == (OK, {"resultado": 7}, True)
+    vieja.close()
@@ -0,0 +1,112 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend.app import checkpoint, cola_exportaciones
+from backend.database import PoolConexiones, ProgramadorCheckpoint
+from backend.reports.trabajos import ERROR, LISTO, PENDIENTE, ColaExportaciones, crear_tabla_trabajos
+
+
+def test_mantenimiento_borra_exportaciones_vencidas(conn, tmp_path):
+    ruta = tmp_path / "viejo.xlsx"
+    ruta.write_bytes(b"xlsx")
+    viejo = (datetime.now() - cola_exportaciones.ttl - timedelta(minutes=5)).strftime(
+        "%Y-%m-%d %H:%M:%S"
+    )
+    conn.execute("""
+        INSERT INTO trabajos_exportacion
+        (id, usuario_id, formato, desde, hasta, estado, ruta, creado, terminado)
+        VALUES ('vencido', 1, 'xlsx', '2024-01-01', '2024-01-31', ?, ?, ?, ?)
+    """, (LISTO, str(ruta), viejo, viejo))
+    conn.commit()
+
+    # lo que hace el hilo del checkpoint en cada vuelta, sin crear otra exportación
+    checkpoint.mantenimiento()
+
+    assert not os.path.exists(ruta)
+    assert conn.execute(
+        "SELECT COUNT(*) FROM trabajos_exportacion WHERE id = 'vencido'"
+    ).fetchone()[0] == 0
+
+
+def test_checkpoint_sobrevive_al_pool_agotado(tmp_path):
+    pool = PoolConexiones(str(tmp_path / "checkpoint.db"), tamano=1, maximo=1, espera=0.05)
+    tareas = []
+    programador = ProgramadorCheckpoint(pool, intervalo=0.02, tareas=[tareas.append])
+    prestada = pool.obtener()
+    try:
+        programador.iniciar()
+        time.sleep(0.2)
+        # sin conexiones libres las pasadas se omiten, pero el hilo sigue
+        assert programador._hilo.is_alive()
+        assert tareas == []
+    finally:
+        pool.devolver(prestada)
+    try:
+        deadline = time.monotonic() + 5
+        while not tareas and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert tareas
+        assert programador._hilo.is_alive()
+    finally:
+        programador.detener()
+        pool.cerrar()
+
+
+@pytest.fixture
+def cola(tmp_path):
+    pool = PoolConexiones(str(tmp_path / "trabajos.db"), tamano=1, maximo=1, espera=0.05)
+    conn = pool.obtener()
+    crear_tabla_trabajos(conn)
+    pool.devolver(conn)
+    yield ColaExportaciones(pool, str(tmp_path / "exportaciones"), max_por_usuario=1)
+    pool.cerrar()
+
+
+def estado_de(cola, trabajo_id):
+    conn = cola.pool.obtener()
+    try:
+        return conn.execute(
+            "SELECT estado, error FROM trabajos_exportacion WHERE id = ?", (trabajo_id,)
+        ).fetchone()
+    finally:
+        cola.pool.devolver(conn)
+
+
+def test_submit_fallido_no_deja_el_trabajo_pendiente(cola, monkeypatch):
+    class Roto:
+        def submit(self, *args):
+            raise BrokenProcessPool("pool roto")
+
+    monkeypatch.setattr(cola, "_obtener_executor", Roto)
+    conn = cola.pool.obtener()
+    try:
+        with pytest.raises(BrokenProcessPool):
+            cola.crear(conn, 1, "xlsx", "2024-01-01", "2024-01-31")
+        (trabajo_id,) = conn.execute("SELECT id FROM trabajos_exportacion").fetchone()
+    finally:
+        cola.pool.devolver(conn)
+
+    assert estado_de(cola, trabajo_id) == (ERROR, "pool roto")
+
+
+def test_terminar_reintenta_con_el_pool_agotado(cola):
+    conn = cola.pool.obtener()
+    conn.execute("""
+        INSERT INTO trabajos_exportacion (id, usuario_id, formato, desde, hasta, estado, creado)
+        VALUES ('agotado', 1, 'xlsx', '2024-01-01', '2024-01-31', ?, '2024-02-01 00:00:00')
+    """, (PENDIENTE,))
+    conn.commit()
+
+    # la única conexión vuelve recién después del primer intento
+    threading.Timer(0.1, cola.pool.devolver, (conn,)).start()
+    futuro = Future()
+    futuro.set_result("listo.xlsx")
+    cola._terminar("agotado", futuro)
+
+    assert estado_de(cola, "agotado") == (LISTO, None)
@@ -0,0 +1,109 @@
+import sqlite3
+import threading
+from datetime import datetime
+
+from backend.app import DB_PATH, DB_PRAGMAS
+from backend.ventas import StockInsuficiente, registrar_ticket, registrar_venta
+from conftest import crear_producto
+
+# =========================
+# VENTAS CONCURRENTES
+# =========================
+# Cientos de operadoras vendiendo el mismo producto a la vez, cada una con su
+# conexión: el stock nunca queda negativo y cada unidad se vende una sola vez.
+
+OPERADORAS = 300
+STOCK = 100
+
+
+def en_paralelo(operacion, cantidad):
+    # arranca todas juntas; devuelve (aceptadas, rechazadas, errores)
+    largada = threading.Barrier(cantidad)
+    candado = threading.Lock()
+    resultados = {"aceptadas": 0, "rechazadas": 0, "errores": []}
+
+    def operadora(n):
+        conn = sqlite3.connect(DB_PATH)
+        for nombre, valor in DB_PRAGMAS.items():
+            conn.execute(f"PRAGMA {nombre} = {valor}")
+        # con 300 en cola la espera por el lock supera el busy_timeout de la app
+        conn.execute("PRAGMA busy_timeout = 60000")
+        try:
+            largada.wait()
+            operacion(conn, n)
+            clave = "aceptadas"
+        except StockInsuficiente:
+            clave = "rechazadas"
+        except Exception as e:
+            clave = None
+            with candado:
+                resultados["errores"].append(repr(e))
+        finally:
+            conn.close()
+        if clave:
+            with candado:
+                resultados[clave] += 1
+
+    hilos = [threading.Thread(target=operadora, args=(n,)) for n in range(cantidad)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    return resultados
+
+
+def ventas_de(conn, producto_id):
+    return conn.execute(
+        "SELECT COUNT(*), IFNULL(SUM(cantidad), 0) FROM ventas WHERE producto_id = ?",
+        (producto_id,)
+    ).fetchone()
+
+
+def test_ventas_concurrentes_no_sobrevenden(conn):
+    producto_id = crear_producto(conn, "Concurrente venta", precio=10.0, stock=STOCK)
+    fecha = datetime.now().strftime("%Y-%m-%d %H:%M")
+
+    resultados = en_paralelo(
+        lambda c, n: registrar_venta(c, producto_id, 1, 1, fecha), OPERADORAS
+    )
+
+    assert resultados["errores"] == []
+    assert resultados["aceptadas"] == STOCK
+    assert resultados["rechazadas"] == OPERADORAS - STOCK
+    assert conn.execute(
+        "SELECT stock FROM productos WHERE id = ?", (producto_id,)
+    ).fetchone()[0] == 0
+    assert ventas_de(conn, producto_id) == (STOCK, STOCK)
+    assert conn.execute(
+        "SELECT SUM(total) FROM ventas WHERE producto_id = ?", (producto_id,)
+    ).fetchone()[0] == STOCK * 10.0
+
+
+def test_tickets_y_ventas_concurrentes_comparten_stock(conn):
+    # mitad tickets de 2 unidades, mitad ventas sueltas de 1, sobre el mismo stock
+    producto_id = crear_producto(conn, "Concurrente ticket", precio=5.0, stock=STOCK)
+    otro_id = crear_producto(conn, "Concurrente acompañante", precio=1.0, stock=10_000)
+    fecha = datetime.now().strftime("%Y-%m-%d %H:%M")
+
+    def operacion(c, n):
+        if n % 2:
+            registrar_ticket(c, [(producto_id, 2), (otro_id, 1)], 1, fecha)
+        else:
+            registrar_venta(c, producto_id, 1, 1, fecha)
+
+    resultados = en_paralelo(operacion, OPERADORAS)
+
+    assert resultados["errores"] == []
+    restante = conn.execute(
+        "SELECT stock FROM productos WHERE id = ?", (producto_id,)
+    ).fetchone()[0]
+    _, vendidas = ventas_de(conn, producto_id)
+    assert restante >= 0
+    assert vendidas + restante == STOCK
+    # cada ticket aceptado descontó también su acompañante, y solo esos
+    tickets = conn.execute(
+        "SELECT COUNT(*) FROM ventas WHERE producto_id = ? AND ticket_id IS NOT NULL",
+        (producto_id,)
+    ).fetchone()[0]
+    assert ventas_de(conn, otro_id) == (tickets, tickets)
+    assert resultados["aceptadas"] == ventas_de(conn, producto_id)[0]